@@ -0,0 +1,243 @@
+import base64
+import binascii
+import hashlib
+import time
+
+import frappe
+
+from farm_management_system.config.caching import get_cached_value, set_cached_value
+
+AI_IMAGE_CACHE_NAMESPACE = "ai_image"
+
+# Defaults for the site_config.json keys read below
+DEFAULT_IMAGE_URL = "https://fast-open-source-ai.p.rapidapi.com/stabilityai/stable-diffusion-xl-base-1.0"
+DEFAULT_CONCURRENCY = 2
+DEFAULT_ATTEMPTS = 3
+REQUEST_TIMEOUT = 60
+
+# A slot held by a crashed worker is given back after this many seconds
+SLOT_TTL = REQUEST_TIMEOUT * 2
+
+
+class AIImageError(Exception):
+    pass
+
+
+class AIImageRetryableError(AIImageError):
+    """Rate limiting, server errors and timeouts: worth another attempt after a backoff."""
+    pass
+
+
+def _conf(key, default=None):
+    return frappe.conf.get(key) or default
+
+
+def _fix_base64_padding(s):
+    if isinstance(s, str) and s.startswith("data:"):
+        s = s.split(",", 1)[-1]
+    s = (s or "").strip()
+    mod4 = len(s) % 4
+    if mod4:
+        s += "=" * (4 - mod4)
+    return s
+
+
+def extract_image_bytes(response):
+    """Image bytes from an image/* response or from the base64 payloads the APIs return in JSON."""
+    content_type = response.headers.get("Content-Type", "").lower()
+    if content_type.startswith("image/"):
+        return response.content
+
+    try:
+        j = response.json()
+    except ValueError:
+        j = None
+
+    candidates = []
+    if isinstance(j, dict):
+        artifacts = j.get("artifacts") or j.get("images") or j.get("data") or j.get("output")
+        if isinstance(artifacts, list) and artifacts:
+            for a in artifacts:
+                if isinstance(a, dict):
+                    for key in ("base64", "b64_json", "b64", "image", "image_base64"):
+                        if key in a and a[key]:
+                            candidates.append(a[key])
+                elif isinstance(a, str):
+                    candidates.append(a)
+        for key in ("image", "image_base64", "base64", "b64_json", "output", "result"):
+            if key in j and j.get(key):
+                candidates.append(j.get(key))
+
+    if not candidates and isinstance(j, list):
+        for item in j:
+            if isinstance(item, str):
+                candidates.append(item)
+
+    text = (response.text or "").strip()
+    if text:
+        candidates.append(text)
+
+    for cand in candidates:
+        try:
+            return base64.b64decode(_fix_base64_padding(cand))
+        except (binascii.Error, TypeError):
+            continue
+    return None
+
+
+def stable_diffusion_backend(prompt):
+    """
+    Default backend: POST {"inputs": prompt} to farm_ai_image_url (site config) with the
+    farm_ai_image_api_key and return the image bytes. Point farm_ai_image_url at a local stub server to test without the API.
+    """
+    import requests
+
+    api_key = _conf("farm_ai_image_api_key")
+    if not api_key:
+        raise AIImageError("farm_ai_image_api_key is not set in site config")
+
+    url = _conf("farm_ai_image_url", DEFAULT_IMAGE_URL)
+    headers = {
+        "x-rapidapi-key": api_key,
+        "x-rapidapi-host": _conf("farm_ai_image_host", "fast-open-source-ai.p.rapidapi.com"),
+        "Content-Type": "application/json"
+    }
+    try:
+        response = requests.post(url, headers=headers, json={"inputs": prompt}, timeout=REQUEST_TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise AIImageRetryableError(str(e))
+
+    if response.status_code == 429 or response.status_code >= 500:
+        raise AIImageRetryableError(f"Image API Error: {response.status_code} - {response.text[:500]}")
+    if response.status_code != 200:
+        raise AIImageError(f"Image API Error: {response.status_code} - {response.text[:2000]}")
+
+    file_bytes = extract_image_bytes(response)
+    if not file_bytes:
+        raise AIImageError(
+            f"Image API returned 200 but no valid image data found. Headers: {response.headers}\nBody: {response.text[:2000]}"
+        )
+    return file_bytes
+
+
+def get_image_backend():
+    """The image backend callable(prompt) -> bytes; override with farm_ai_image_backend (dotted path)."""
+    backend = _conf("farm_ai_image_backend")
+    return frappe.get_attr(backend) if backend else stable_diffusion_backend
+
+
+def _slot_key():
+    return frappe.cache().make_key("farm_ai_image_slots")
+
+
+def _acquire_slot():
+    """
+    Wait for one of the farm_ai_image_concurrency slots (site-wide, counted in Redis) so a
+    burst of inserts never has more than that many requests in flight at the image API.
+    """
+    limit = int(_conf("farm_ai_image_concurrency", DEFAULT_CONCURRENCY))
+    cache = frappe.cache()
+    key = _slot_key()
+    delay = 1
+    while True:
+        held = cache.incr(key)
+        if held == 1:
+            # Only the first holder starts the TTL, so a steady stream of requests cannot
+            # keep a counter leaked by a crashed worker alive forever
+            cache.expire(key, SLOT_TTL)
+        if held <= limit:
+            return
+        _release_slot()
+        time.sleep(delay)
+        delay = min(delay * 2, 30)
+
+
+def _release_slot():
+    # The counter may have expired while the slot was held: never leave it below zero
+    if frappe.cache().decr(_slot_key()) < 0:
+        frappe.cache().incr(_slot_key())
+
+
+def _generate_with_retries(prompt):
+    backend = get_image_backend()
+    attempts = int(_conf("farm_ai_image_attempts", DEFAULT_ATTEMPTS))
+    for attempt in range(1, attempts + 1):
+        _acquire_slot()
+        try:
+            return backend(prompt)
+        except AIImageRetryableError:
+            if attempt == attempts:
+                raise
+        finally:
+            _release_slot()
+        # exponential backoff: 2s, 4s, 8s, ...
+        time.sleep(2 ** attempt)
+
+
+def _prompt_hash(prompt):
+    return hashlib.sha256(prompt.strip().lower().encode()).hexdigest()[:32]
+
+
+def _find_prompt_image(prompt_hash):
+    return frappe.db.get_value("File", {"file_name": f"ai_{prompt_hash}.png", "is_private": 0}, "file_url")
+
+
+def get_ai_image_url(prompt):
+    """
+    Public File URL of the image generated for `prompt`. Images are stored once per prompt
+    (by prompt hash), so identical prompts such as "... avatar for Broilers" reuse one File
+    and only the first one reaches the image backend.
+    """
+    prompt_hash = _prompt_hash(prompt)
+    file_url = get_cached_value(AI_IMAGE_CACHE_NAMESPACE, prompt_hash, lambda: _find_prompt_image(prompt_hash))
+    if file_url:
+        return file_url
+
+    file_bytes = _generate_with_retries(prompt)
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": f"ai_{prompt_hash}.png",
+        "content": base64.b64encode(file_bytes).decode("ascii"),
+        "decode": True,
+        "is_private": 0
+    })
+    file_doc.insert(ignore_permissions=True)
+    set_cached_value(AI_IMAGE_CACHE_NAMESPACE, prompt_hash, file_doc.file_url)
+    return file_doc.file_url
+
+
+def enqueue_ai_image(doctype, docname, image_field, prompt, label=None):
+    """Generate the image for `prompt` in a long-queue job once the current transaction commits."""
+    frappe.enqueue(
+        "farm_management_system.config.ai_images.run_ai_image_job",
+        doctype=doctype,
+        docname=docname,
+        image_field=image_field,
+        prompt=prompt,
+        label=label,
+        queue="long",
+        enqueue_after_commit=True,
+    )
+
+
+def run_ai_image_job(doctype, docname, image_field, prompt, label=None):
+    """
+    Background job: set `image_field` of the document to the (shared) image for `prompt`.
+    Only that field is written; the document is not re-saved.
+    """
+    try:
+        file_url = get_ai_image_url(prompt)
+        frappe.db.set_value(doctype, docname, image_field, file_url)
+        frappe.db.commit()
+
+        frappe.publish_realtime(
+            event="show_alert",
+            message={
+                "message": f"AI image generated successfully for {label or docname}!",
+                "indicator": "green"
+            },
+            user=frappe.session.user
+        )
+        return file_url
+    except Exception as e:
+        frappe.log_error(f"Error generating AI image for {label or docname}: {str(e)}", f"{doctype} AI Image Generation")
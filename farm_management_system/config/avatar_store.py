@@ -0,0 +1,83 @@
+import hashlib
+
+import frappe
+from multiavatar.multiavatar import multiavatar
+
+from farm_management_system.config.caching import get_cached_value
+
+AVATAR_CACHE_NAMESPACE = "avatar_store"
+
+# Cattle processed per background job run
+AVATAR_JOB_CHUNK_SIZE = 200
+
+
+def _store_avatar(svg_code):
+    """
+    Public File URL holding `svg_code`. Files are addressed by the md5 of their content
+    (File.content_hash), so an avatar that was generated before is reused instead of being
+    written again.
+    """
+    content_hash = hashlib.md5(svg_code.encode()).hexdigest()
+    file_url = frappe.db.get_value("File", {"content_hash": content_hash, "is_private": 0}, "file_url")
+    if file_url:
+        return file_url
+
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": f"avatar-{content_hash}.svg",
+        "content": svg_code,
+        "is_private": 0
+    })
+    file_doc.insert(ignore_permissions=True)
+    return file_doc.file_url
+
+
+def get_avatar_url(seed):
+    """
+    URL of the multiavatar generated from `seed` (e.g. a Cattle name), generating and storing
+    it only the first time that avatar is needed. Cached per seed.
+    """
+    return get_cached_value(AVATAR_CACHE_NAMESPACE, seed, lambda: _store_avatar(multiavatar(seed, None, None)))
+
+
+def _enqueue_pending_avatars():
+    names = getattr(frappe.local, "farm_pending_avatars", None) or []
+    frappe.local.farm_pending_avatars = None
+    for start in range(0, len(names), AVATAR_JOB_CHUNK_SIZE):
+        frappe.enqueue(
+            "farm_management_system.config.avatar_store.generate_cattle_avatars",
+            cattle_names=names[start:start + AVATAR_JOB_CHUNK_SIZE],
+            queue="long",
+        )
+
+
+def _drop_pending_avatars():
+    frappe.local.farm_pending_avatars = None
+
+
+def queue_cattle_avatar(cattle_name):
+    """
+    Give a Cattle an avatar in the background once the current transaction commits.
+    Every Cattle queued in the same transaction is handled by the same job(s).
+    """
+    pending = getattr(frappe.local, "farm_pending_avatars", None)
+    if pending is None:
+        pending = frappe.local.farm_pending_avatars = []
+        frappe.db.after_commit.add(_enqueue_pending_avatars)
+        frappe.db.after_rollback.add(_drop_pending_avatars)
+    pending.append(cattle_name)
+
+
+def generate_cattle_avatars(cattle_names):
+    """Background job: set image_of_animal for the given Cattle that still have no image."""
+    cattle = frappe.get_all(
+        "Cattle",
+        filters={"name": ["in", cattle_names], "image_of_animal": ["is", "not set"]},
+        pluck="name"
+    )
+    for name in cattle:
+        try:
+            frappe.db.set_value("Cattle", name, "image_of_animal", get_avatar_url(name), update_modified=False)
+        except Exception as e:
+            frappe.log_error(f"Error generating avatar for {name}: {e}", "Avatar Generation")
+    frappe.db.commit()
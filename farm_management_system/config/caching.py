@@ -0,0 +1,216 @@
+from contextlib import contextmanager
+
+import frappe
+
+
+# Process-wide cache: {(site, namespace): {"version": str, "values": {key: value}}}
+_process_cache = {}
+
+
+def _version_key(namespace):
+    return f"farm_suite_cache_version:{namespace}"
+
+
+def _hash_key(namespace):
+    return f"farm_suite_cache:{namespace}"
+
+
+def _make_field(key):
+    if isinstance(key, (tuple, list)):
+        return "::".join("" if k is None else str(k) for k in key)
+    return str(key)
+
+
+def _get_version(namespace):
+    """
+    Current version stamp of a namespace (read from Redis once per request; frappe keeps
+    it in the request-local cache afterwards). Bumping it makes every worker process drop
+    its in-memory copy of the namespace on its next request.
+    """
+    version = frappe.cache().get_value(_version_key(namespace))
+    if not version:
+        version = frappe.generate_hash(length=8)
+        frappe.cache().set_value(_version_key(namespace), version)
+    return version
+
+
+def _in_write_transaction():
+    return bool(getattr(frappe.db, "transaction_writes", 0))
+
+
+def _pending_cache_ops():
+    """
+    Invalidations (and refreshes) made inside the current write transaction, applied to
+    Redis only once it commits. Namespaces read or changed meanwhile are dropped from
+    process memory if it rolls back instead.
+    """
+    pending = getattr(frappe.local, "farm_cache_pending", None)
+    if pending is None:
+        pending = frappe.local.farm_cache_pending = {"ops": [], "namespaces": set(), "cleared": {}}
+        frappe.db.after_commit.add(_apply_pending_cache_ops)
+        frappe.db.after_rollback.add(_drop_pending_cache_ops)
+    return pending
+
+
+def _defer(op, namespace, key=None, value=None):
+    pending = _pending_cache_ops()
+    pending["ops"].append((op, namespace, key, value))
+    pending["namespaces"].add(namespace)
+    # Redis still holds the old values until the commit: this transaction must not read them
+    cleared = pending["cleared"].setdefault(namespace, set())
+    if cleared is not None:
+        if key is None:
+            pending["cleared"][namespace] = None
+        else:
+            cleared.add(_make_field(key))
+
+
+def _cleared_in_transaction(namespace, field):
+    pending = getattr(frappe.local, "farm_cache_pending", None)
+    if not pending or namespace not in pending["cleared"]:
+        return False
+    cleared = pending["cleared"][namespace]
+    return cleared is None or field in cleared
+
+
+def _apply_pending_cache_ops():
+    pending = getattr(frappe.local, "farm_cache_pending", None)
+    frappe.local.farm_cache_pending = None
+    for op, namespace, key, value in (pending or {}).get("ops", []):
+        if op == "clear":
+            _clear_now(namespace, key)
+        else:
+            _set_now(namespace, key, value)
+
+
+def _drop_pending_cache_ops():
+    pending = getattr(frappe.local, "farm_cache_pending", None)
+    frappe.local.farm_cache_pending = None
+    for namespace in (pending or {}).get("namespaces", ()):
+        _process_cache.pop((frappe.local.site, namespace), None)
+
+
+def _suspended_namespaces():
+    return getattr(frappe.local, "farm_cache_suspended", None)
+
+
+@contextmanager
+def suspended_cache_invalidation():
+    """
+    Bulk operations (e.g. import_cattle): inside the block, clears and refreshes only note
+    their namespace (and keep this process off Redis for it); each noted namespace is
+    cleared once, as a whole, when the block exits.
+    """
+    if _suspended_namespaces() is not None:
+        yield
+        return
+
+    suspended = frappe.local.farm_cache_suspended = set()
+    try:
+        yield
+    finally:
+        frappe.local.farm_cache_suspended = None
+        for namespace in sorted(suspended):
+            clear_cached_values(namespace)
+
+
+def get_cached_value(namespace, key, generator):
+    """
+    Two-tier cache lookup: process memory first, then the Redis hash for `namespace`,
+    and finally `generator()` (whose result is written to both tiers unless it is None).
+    Inside a write transaction a generated value may reflect uncommitted rows, so it is
+    only kept in process memory (and dropped again on rollback).
+
+    `key` may be a string or a tuple (e.g. (item_code, company)).
+    """
+    field = _make_field(key)
+    version = _get_version(namespace)
+
+    bucket = _process_cache.get((frappe.local.site, namespace))
+    if not bucket or bucket["version"] != version:
+        bucket = _process_cache[(frappe.local.site, namespace)] = {"version": version, "values": {}}
+
+    if field in bucket["values"]:
+        return bucket["values"][field]
+
+    suspended = namespace in (_suspended_namespaces() or ())
+    value = None
+    if not suspended and not _cleared_in_transaction(namespace, field):
+        value = frappe.cache().hget(_hash_key(namespace), field)
+    if value is None:
+        value = generator()
+        if value is None:
+            return None
+        if suspended or _in_write_transaction():
+            _pending_cache_ops()["namespaces"].add(namespace)
+        else:
+            frappe.cache().hset(_hash_key(namespace), field, value)
+
+    bucket["values"][field] = value
+    return value
+
+
+def _set_now(namespace, key, value):
+    field = _make_field(key)
+    _clear_now(namespace, key)
+    frappe.cache().hset(_hash_key(namespace), field, value)
+    _process_cache[(frappe.local.site, namespace)]["values"][field] = value
+
+
+def set_cached_value(namespace, key, value):
+    """
+    Write a freshly computed value into both tiers (used by doc-event refreshes); inside
+    a write transaction the write happens once it commits.
+    """
+    suspended = _suspended_namespaces()
+    if suspended is not None:
+        suspended.add(namespace)
+        _forget_in_process(namespace, key)
+    elif _in_write_transaction():
+        _defer("set", namespace, key, value)
+        bucket = _process_cache.get((frappe.local.site, namespace))
+        if bucket:
+            bucket["values"][_make_field(key)] = value
+    else:
+        _set_now(namespace, key, value)
+
+
+def _forget_in_process(namespace, key=None):
+    bucket = _process_cache.get((frappe.local.site, namespace))
+    if not bucket:
+        return
+    if key is None:
+        bucket["values"].clear()
+    else:
+        bucket["values"].pop(_make_field(key), None)
+
+
+def _clear_now(namespace, key=None):
+    if key is None:
+        frappe.cache().delete_key(_hash_key(namespace))
+    else:
+        frappe.cache().hdel(_hash_key(namespace), _make_field(key))
+
+    version = frappe.generate_hash(length=8)
+    frappe.cache().set_value(_version_key(namespace), version)
+    _process_cache[(frappe.local.site, namespace)] = {"version": version, "values": {}}
+
+
+def clear_cached_values(namespace, key=None):
+    """
+    Invalidate one key (or the whole namespace when key is None) in Redis, and bump the
+    namespace version so other worker processes drop their in-memory copies too.
+
+    Inside a write transaction only this process forgets the values right away; Redis and
+    the other workers are invalidated after the commit, so a concurrent reader cannot
+    regenerate and re-cache the pre-commit data in between.
+    """
+    suspended = _suspended_namespaces()
+    if suspended is not None:
+        suspended.add(namespace)
+        _forget_in_process(namespace, key)
+    elif _in_write_transaction():
+        _forget_in_process(namespace, key)
+        _defer("clear", namespace, key)
+    else:
+        _clear_now(namespace, key)
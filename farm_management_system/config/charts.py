@@ -0,0 +1,150 @@
+import frappe
+from frappe import _
+from frappe.utils import flt, getdate
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+CHART_INTERVALS = ("daily", "weekly", "monthly")
+TREATMENT_CHART_NAMESPACE = "treatment_chart"
+
+# Treatment and Vaccination Logs field pointing at each kind of treated subject
+TREATMENT_SUBJECT_FIELDS = ("poultry_batch_under_treatment", "specific_cattle_under_treatment")
+
+
+def week_start_sql(column):
+    """SQL expression for the Monday starting the week of `column`."""
+    if frappe.db.db_type == "postgres":
+        return f"cast(date_trunc('week', {column}) as date)"
+    # MariaDB weekday() is 0 for Monday, like Python's
+    return f"date_sub(date({column}), interval weekday({column}) day)"
+
+
+def period_start_sql(column, interval="daily"):
+    """SQL expression bucketing `column` into the first day of its day / week / month."""
+    if interval == "weekly":
+        return week_start_sql(column)
+    if interval == "monthly":
+        if frappe.db.db_type == "postgres":
+            return f"cast(date_trunc('month', {column}) as date)"
+        return f"date_sub(date({column}), interval dayofmonth({column}) - 1 day)"
+    if interval == "daily":
+        return f"date({column})" if frappe.db.db_type != "postgres" else f"cast({column} as date)"
+    frappe.throw(_("Chart interval must be one of {0}").format(", ".join(CHART_INTERVALS)), frappe.ValidationError)
+
+
+def get_collection_chart(parenttype, parent, parentfield, from_date=None, to_date=None, interval="daily"):
+    """
+    Stacked bar chart data for a Poultry Collections Table child table (Poultry Batches
+    product_inventory_log, Cattle production_log), grouped by (period, product) in SQL.
+
+    Only the rows of `parent` between the optional from_date / to_date are read; interval
+    is "daily", "weekly" or "monthly" and labels are the first date of each period.
+    Returns {labels, datasets, tooltip_data}.
+    """
+    period = period_start_sql("date_of_collection", interval or "daily")
+    conditions = [
+        "parenttype = %(parenttype)s",
+        "parentfield = %(parentfield)s",
+        "parent = %(parent)s",
+        "date_of_collection is not null",
+        "coalesce(product_collected, '') != ''",
+    ]
+    values = {"parenttype": parenttype, "parentfield": parentfield, "parent": parent}
+    if from_date:
+        conditions.append("date_of_collection >= %(from_date)s")
+        values["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("date_of_collection <= %(to_date)s")
+        values["to_date"] = getdate(to_date)
+
+    rows = frappe.db.sql(
+        f"""
+        select {period} as period, product_collected,
+            sum(coalesce(quantity_collected, 0)) as qty,
+            max(products_default_uom) as uom
+        from `tabPoultry Collections Table`
+        where {" and ".join(conditions)}
+        group by period, product_collected
+        order by period asc, product_collected asc
+        """,
+        values,
+        as_dict=True
+    )
+    if not rows:
+        return {"labels": [], "datasets": []}
+
+    labels = sorted({str(getdate(row.period)) for row in rows})
+    label_index = {label: i for i, label in enumerate(labels)}
+    products = sorted({row.product_collected for row in rows})
+
+    series = {product: [0] * len(labels) for product in products}
+    tooltip_data = {product: {} for product in products}
+    for row in rows:
+        label = str(getdate(row.period))
+        quantity = flt(row.qty)
+        series[row.product_collected][label_index[label]] = quantity
+        tooltip_data[row.product_collected][label] = f"{quantity} {row.uom or ''}"
+
+    return {
+        "labels": labels,
+        "datasets": [{"name": product, "values": series[product]} for product in products],
+        "tooltip_data": tooltip_data
+    }
+
+
+def _load_treatment_chart(subject_field, subject):
+    rows = frappe.db.sql(
+        f"""
+        select
+            {period_start_sql("coalesce(treatment_date, creation)")} as treatment_day,
+            coalesce(nullif(trim(vaccine_used), ''), '(unknown)') as vaccine,
+            sum(coalesce(qty_vaccine, 0)) as qty
+        from `tabTreatment and Vaccination Logs`
+        where `{subject_field}` = %s
+        group by treatment_day, vaccine
+        """,
+        (subject,),
+        as_dict=True
+    )
+    if not rows:
+        return {"dates": [], "vaccines": [], "series": {}}
+
+    # Dates sorted latest -> oldest, vaccines alphabetically
+    dates = sorted({str(getdate(row.treatment_day)) for row in rows}, reverse=True)
+    date_index = {d: i for i, d in enumerate(dates)}
+    vaccines = sorted({row.vaccine for row in rows})
+
+    series = {vac: [0.0] * len(dates) for vac in vaccines}
+    for row in rows:
+        series[row.vaccine][date_index[str(getdate(row.treatment_day))]] = round(flt(row.qty), 6)
+
+    return {"dates": dates, "vaccines": vaccines, "series": series}
+
+
+def get_treatment_chart(subject_field, subject):
+    """
+    Treatment / vaccination quantities of one subject (a Poultry Batch or a Cattle) per day
+    and vaccine, grouped in SQL over its full history:
+      { "dates": [latest -> oldest], "vaccines": [...], "series": {vaccine: [qty per date]} }
+    Cached per subject until one of its Treatment and Vaccination Logs changes.
+    """
+    if subject_field not in TREATMENT_SUBJECT_FIELDS:
+        frappe.throw(_("Unknown treatment subject field {0}").format(subject_field), frappe.ValidationError)
+    if not subject:
+        return {"dates": [], "vaccines": [], "series": {}}
+    return get_cached_value(
+        TREATMENT_CHART_NAMESPACE, (subject_field, subject), lambda: _load_treatment_chart(subject_field, subject)
+    )
+
+
+def clear_treatment_chart_cache(doc, method=None):
+    """
+    Treatment and Vaccination Logs doc event: drop the cached charts of the subjects the
+    log belongs (or belonged, before this save) to.
+    """
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    for subject_field in TREATMENT_SUBJECT_FIELDS:
+        for source in (doc, previous):
+            subject = source.get(subject_field) if source else None
+            if subject:
+                clear_cached_values(TREATMENT_CHART_NAMESPACE, (subject_field, subject))
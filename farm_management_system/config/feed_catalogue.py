@@ -0,0 +1,75 @@
+import frappe
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+from farm_management_system.config.stock_balance import BALANCE_DOCTYPE, get_stock_balance_name
+
+FEED_CATALOGUE_NAMESPACE = "feed_catalogue"
+
+
+def _load_feed_catalogue(specify_animal):
+    """
+    Every Animal Feeds whose formulation table mentions `specify_animal`, with its first UOM,
+    the Item matching its feed_name and that Item's first default warehouse, in one query.
+    """
+    return frappe.db.sql(
+        """
+        select
+            af.name,
+            af.feed_name,
+            (
+                select u.uom from `tabAnimal Feeds UOM` u
+                where u.parent = af.name and u.parenttype = 'Animal Feeds'
+                order by u.idx asc limit 1
+            ) as uom,
+            i.name as item_name,
+            (
+                select d.default_warehouse from `tabItem Default` d
+                where d.parent = i.name and d.parenttype = 'Item'
+                order by d.idx asc limit 1
+            ) as warehouse
+        from `tabAnimal Feeds` af
+        left join `tabItem` i on i.item_code = trim(af.feed_name)
+        where af.name in (
+            select f.parent from `tabAnimal and Feed Formulation` f
+            where f.parenttype = 'Animal Feeds' and f.select_type_of_animal like %(animal)s
+        )
+        order by af.name asc
+        """,
+        {"animal": f"%{specify_animal}%"},
+        as_dict=True
+    )
+
+
+def get_feed_catalogue(specify_animal):
+    """
+    Feeds for an animal type as a list of {name, feed_name, uom, item_name, warehouse}.
+    Cached per animal type until an Animal Feeds or Item document changes.
+    """
+    if not specify_animal:
+        return []
+    return get_cached_value(
+        FEED_CATALOGUE_NAMESPACE, specify_animal, lambda: _load_feed_catalogue(specify_animal)
+    ) or []
+
+
+def get_feed_stock(catalogue):
+    """{animal feed name: balance qty} at each feed's default warehouse, in one primary-key query."""
+    balance_names = {
+        get_stock_balance_name(feed["item_name"], feed["warehouse"]): feed["name"]
+        for feed in catalogue
+        if feed.get("item_name") and feed.get("warehouse")
+    }
+    if not balance_names:
+        return {}
+
+    rows = frappe.get_all(
+        BALANCE_DOCTYPE,
+        filters={"name": ["in", list(balance_names)]},
+        fields=["name", "actual_qty"]
+    )
+    return {balance_names[row.name]: row.actual_qty for row in rows}
+
+
+def clear_feed_catalogue_cache(doc=None, method=None):
+    """Animal Feeds / Item doc event: drop every cached catalogue."""
+    clear_cached_values(FEED_CATALOGUE_NAMESPACE)
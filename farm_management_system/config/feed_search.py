@@ -0,0 +1,134 @@
+import frappe
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+FEED_SEARCH_NAMESPACE = "feed_search"
+
+# Matches scoring below this (trigram similarity, 0..1) are not returned
+MIN_MATCH_SCORE = 0.3
+
+
+def _normalise(text):
+    return " ".join(str(text or "").lower().split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _empty_index():
+    return {"entries": {}, "trigrams": {}}
+
+
+def _remove_entry(index, feed):
+    entry = index["entries"].pop(feed, None)
+    if not entry:
+        return
+    for key in entry["keys"]:
+        for trigram in _trigrams(key):
+            postings = index["trigrams"].get(trigram)
+            if postings:
+                postings.discard(feed)
+                if not postings:
+                    del index["trigrams"][trigram]
+
+
+def _add_entry(index, feed, feed_name=None, item_code=None):
+    """(Re)index one Animal Feeds under its docname, feed_name and Item code."""
+    _remove_entry(index, feed)
+    keys = sorted({_normalise(k) for k in (feed, feed_name, item_code) if _normalise(k)})
+    index["entries"][feed] = {"feed_name": feed_name, "item_code": item_code, "keys": keys}
+    for key in keys:
+        for trigram in _trigrams(key):
+            index["trigrams"].setdefault(trigram, set()).add(feed)
+
+
+def _score(query, query_trigrams, key):
+    if key == query:
+        return 1.0
+    if key.startswith(query):
+        return 0.95
+    if query in key:
+        return 0.9
+    key_trigrams = _trigrams(key)
+    # Dice coefficient of the two trigram sets
+    return 2 * len(query_trigrams & key_trigrams) / (len(query_trigrams) + len(key_trigrams))
+
+
+def search_index(index, query, limit=10):
+    """
+    Ranked matches of `query` in an index: candidates are the feeds sharing a trigram with
+    it, scored by exact / prefix / substring match, then by trigram similarity.
+    """
+    query = _normalise(query)
+    if not query:
+        return []
+    query_trigrams = _trigrams(query)
+
+    candidates = set()
+    for trigram in query_trigrams:
+        candidates.update(index["trigrams"].get(trigram, ()))
+
+    matches = []
+    for feed in candidates:
+        entry = index["entries"][feed]
+        score = max(_score(query, query_trigrams, key) for key in entry["keys"])
+        if score >= MIN_MATCH_SCORE:
+            matches.append({
+                "name": feed,
+                "feed_name": entry["feed_name"],
+                "item_code": entry["item_code"],
+                "score": round(score, 3)
+            })
+
+    matches.sort(key=lambda m: (-m["score"], _normalise(m["feed_name"] or m["name"])))
+    return matches[:limit]
+
+
+def _load_feed_search_index():
+    """Index every Animal Feeds with the Item created for it (item_code = feed_name), in one query."""
+    index = _empty_index()
+    rows = frappe.db.sql(
+        """
+        select af.name, af.feed_name, i.name as item_code
+        from `tabAnimal Feeds` af
+        left join `tabItem` i on i.item_code = trim(af.feed_name)
+        """,
+        as_dict=True
+    )
+    for row in rows:
+        _add_entry(index, row.name, row.feed_name, row.item_code)
+    return index
+
+
+def get_feed_search_index():
+    return get_cached_value(FEED_SEARCH_NAMESPACE, "index", _load_feed_search_index)
+
+
+def search_feeds(query, limit=10):
+    """Ranked Animal Feeds matching `query` by docname, feed name or Item code (typo tolerant)."""
+    return search_index(get_feed_search_index(), query, limit)
+
+
+def match_feed(query):
+    """Best matching Animal Feeds for `query` as {name, feed_name, item_code, score}, or None."""
+    matches = search_feeds(query, limit=1)
+    return matches[0] if matches else None
+
+
+def clear_feed_search_index(doc=None, method=None):
+    """
+    Animal Feeds doc event (and Item trash / rename): rebuild the whole index on its next
+    use. The clear is applied once the transaction commits (see caching), so concurrent
+    saves never overwrite each other's copy of the index.
+    """
+    clear_cached_values(FEED_SEARCH_NAMESPACE)
+
+
+def clear_feed_search_index_for_item(doc, method=None):
+    """Item on_update: only Items created for an Animal Feeds (item_code = feed_name) are indexed."""
+    if frappe.db.sql(
+        "select name from `tabAnimal Feeds` where trim(feed_name) = %s limit 1", (doc.item_code or doc.name,)
+    ):
+        clear_feed_search_index()
@@ -0,0 +1,187 @@
+import hashlib
+
+import frappe
+from frappe.utils import flt, getdate, now_datetime
+
+SUMMARY_DOCTYPE = "Poultry Batch Feed Summary"
+SUMMARY_FIELDS = ["poultry_batch", "date_of_nourishment", "animal_feed_name", "default_uom"]
+LOG_FIELDS = ["poultry_batch", "date_of_nourishment", "animal_feed_name", "default_uom", "qty_issued", "water_consumed"]
+
+
+def get_feed_summary_name(poultry_batch, date_of_nourishment, animal_feed_name, default_uom):
+    """Primary key of the Poultry Batch Feed Summary row for one batch, day, feed and uom."""
+    return hashlib.md5(
+        f"{poultry_batch}::{date_of_nourishment}::{animal_feed_name}::{default_uom}".encode()
+    ).hexdigest()
+
+
+def _summary_key(log):
+    day = log.get("date_of_nourishment")
+    return (
+        log.get("poultry_batch"),
+        str(getdate(day)) if day else None,
+        (log.get("animal_feed_name") or "Unknown").strip(),
+        (log.get("default_uom") or "").strip(),
+    )
+
+
+def _upsert_summaries(deltas, now):
+    """Add {(batch, day, feed, uom): [qty, water, count]} onto the summary rows in one statement."""
+    user = frappe.session.user
+    values = []
+    for key, (qty, water, count) in deltas.items():
+        values.extend([get_feed_summary_name(*key), now, now, user, user, *key, qty, water, count])
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, 0, 0, %s, %s, %s, %s, %s, %s, %s)"] * len(deltas))
+    added = ["qty_issued", "water_consumed", "log_count"]
+    if frappe.db.db_type == "postgres":
+        on_conflict = "on conflict (name) do update set modified = excluded.modified, " + ", ".join(
+            f"{f} = `tab{SUMMARY_DOCTYPE}`.{f} + excluded.{f}" for f in added
+        )
+    else:
+        on_conflict = "on duplicate key update `modified` = values(`modified`), " + ", ".join(
+            f"`{f}` = `{f}` + values(`{f}`)" for f in added
+        )
+
+    frappe.db.sql(
+        f"""
+        insert into `tab{SUMMARY_DOCTYPE}`
+            (name, creation, modified, owner, modified_by, docstatus, idx,
+             poultry_batch, date_of_nourishment, animal_feed_name, default_uom,
+             qty_issued, water_consumed, log_count)
+        values {placeholders}
+        {on_conflict}
+        """,
+        values
+    )
+
+
+def apply_nourishment_logs(logs, sign=1):
+    """
+    Apply Nourishment Logs to their batches' running feed totals (sign=-1 reverses them).
+
+    Each log adds its qty_issued / water_consumed to the summary row of its (batch, day,
+    feed, uom) and its water to Poultry Batches.total_water_litres, with additive SQL so
+    concurrent logs never overwrite each other. Logs without a poultry_batch are ignored.
+    Returns the names of the touched batches.
+    """
+    deltas = {}
+    water_by_batch = {}
+    for log in logs:
+        if not log.get("poultry_batch"):
+            continue
+        qty = sign * flt(log.get("qty_issued"))
+        water = sign * flt(log.get("water_consumed"))
+        delta = deltas.setdefault(_summary_key(log), [0.0, 0.0, 0])
+        delta[0] += qty
+        delta[1] += water
+        delta[2] += sign
+        water_by_batch[log.get("poultry_batch")] = water_by_batch.get(log.get("poultry_batch"), 0.0) + water
+
+    if not deltas:
+        return []
+
+    now = now_datetime()
+    _upsert_summaries(deltas, now)
+    if sign < 0:
+        # Days / feeds whose last log was cancelled no longer count as fed
+        frappe.db.delete(SUMMARY_DOCTYPE, {
+            "name": ["in", [get_feed_summary_name(*key) for key in deltas]],
+            "log_count": ["<=", 0]
+        })
+
+    for batch_name, water in water_by_batch.items():
+        frappe.db.sql(
+            "update `tabPoultry Batches` set total_water_litres = coalesce(total_water_litres, 0) + %s where name = %s",
+            (water, batch_name)
+        )
+    return list(water_by_batch)
+
+
+def format_total_water(total_water_sum):
+    total_water_sum = flt(total_water_sum)
+    if float(total_water_sum).is_integer():
+        return f"{int(total_water_sum)} Litres"
+    return f"{round(total_water_sum, 3)} Litres"
+
+
+def format_feed_lines(feed_qty):
+    """{feed_name: {"qty_sum", "uom"}} -> "feed_name - <qty> <uom>" lines."""
+    total_feed_lines = []
+    for feed_name, vals in feed_qty.items():
+        qty_sum = flt(vals.get("qty_sum", 0.0))
+        uom = vals.get("uom") or ""
+        qty_str = str(int(qty_sum)) if qty_sum.is_integer() else str(round(qty_sum, 3)).rstrip('0').rstrip('.')
+        total_feed_lines.append(f"{feed_name} - {qty_str} {uom}".strip())
+    return "\n".join(total_feed_lines)
+
+
+def get_batch_feed_totals(batch_name):
+    """
+    Feed totals of a batch from its summary rows (independent of how many logs it has):
+      - total_feed: one line per feed fed on the latest day, "feed_name - <sum qty> <uom>"
+      - total_water: cumulative water consumed across all logs, "<sum> Litres"
+    """
+    latest_date = frappe.db.sql(
+        f"select max(date_of_nourishment) from `tab{SUMMARY_DOCTYPE}` where poultry_batch = %s",
+        (batch_name,)
+    )[0][0]
+
+    latest_rows = []
+    if latest_date:
+        latest_rows = frappe.get_all(
+            SUMMARY_DOCTYPE,
+            filters={"poultry_batch": batch_name, "date_of_nourishment": latest_date},
+            fields=["animal_feed_name", "default_uom", "qty_issued", "log_count"],
+            order_by="creation asc"
+        )
+
+    feed_qty_on_latest = {}
+    for r in latest_rows:
+        feed = r.animal_feed_name or "Unknown"
+        vals = feed_qty_on_latest.setdefault(feed, {"qty_sum": 0.0, "uom": r.default_uom or ""})
+        vals["qty_sum"] += flt(r.qty_issued)
+        if not vals["uom"] and r.default_uom:
+            vals["uom"] = r.default_uom
+
+    total_water_sum = frappe.db.get_value("Poultry Batches", batch_name, "total_water_litres")
+    return {
+        "total_feed": format_feed_lines(feed_qty_on_latest),
+        # Nothing logged yet: leave both totals blank
+        "total_water": format_total_water(total_water_sum) if latest_date or total_water_sum else "",
+        "latest_date": latest_date,
+        "status": "ok",
+        "rows_on_latest_date": sum(r.log_count or 0 for r in latest_rows),
+        "distinct_feeds_on_latest": list(feed_qty_on_latest.keys())
+    }
+
+
+def rebuild_batch_feed_totals(batch_name=None):
+    """
+    Recompute the summary rows and total_water_litres from the Nourishment Logs themselves
+    (repair / first install), for one batch or for every batch.
+    Run with: bench --site <site> execute farm_management_system.config.feed_totals.rebuild_batch_feed_totals
+    """
+    log_filters = {"docstatus": ["<", 2], "poultry_batch": batch_name or ["is", "set"]}
+    logs = frappe.get_all("Nourishment Log", filters=log_filters, fields=LOG_FIELDS)
+
+    if batch_name:
+        frappe.db.delete(SUMMARY_DOCTYPE, {"poultry_batch": batch_name})
+        frappe.db.set_value("Poultry Batches", batch_name, "total_water_litres", 0, update_modified=False)
+    else:
+        frappe.db.delete(SUMMARY_DOCTYPE)
+        frappe.db.sql("update `tabPoultry Batches` set total_water_litres = 0")
+
+    for start in range(0, len(logs), 500):
+        apply_nourishment_logs(logs[start:start + 500])
+
+    batch_names = [batch_name] if batch_name else list({log.poultry_batch for log in logs})
+    for name in batch_names:
+        totals = get_batch_feed_totals(name)
+        frappe.db.set_value(
+            "Poultry Batches", name,
+            {"total_feed": totals["total_feed"], "total_water": totals["total_water"]},
+            update_modified=False
+        )
+    frappe.db.commit()
+    return len(logs)
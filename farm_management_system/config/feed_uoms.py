@@ -0,0 +1,75 @@
+import frappe
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+FEED_UOM_NAMESPACE = "feed_uoms"
+DEFAULT_FEED_UOM = "units"
+
+# Child-table columns read as a feed's UOM
+UOM_FIELDS = ("uom", "uom_name", "unit", "unit_of_measure", "selected_uom")
+
+
+def _uom_tables():
+    """(child doctype, uom column) of each Animal Feeds table holding UOMs, in form order."""
+    tables = []
+    for df in frappe.get_meta("Animal Feeds").get_table_fields():
+        child_meta = frappe.get_meta(df.options)
+        uom_field = next((f for f in UOM_FIELDS if child_meta.has_field(f)), None)
+        if uom_field:
+            tables.append((df.options, uom_field))
+    return tables
+
+
+def _load_feed_uom_index():
+    """
+    Every feed's first UOM, read with one query per UOM table:
+      {"aliases": {docname / feed_name (lower case): docname},
+       "feeds": {docname: first uom or None}}
+    """
+    aliases = {}
+    feeds = {}
+    for feed in frappe.get_all("Animal Feeds", fields=["name", "feed_name"], order_by="name asc"):
+        feeds[feed.name] = None
+        aliases.setdefault(feed.name.strip().lower(), feed.name)
+        if feed.feed_name:
+            aliases.setdefault(feed.feed_name.strip().lower(), feed.name)
+
+    for child_doctype, uom_field in _uom_tables():
+        rows = frappe.db.sql(
+            f"""
+            select parent, `{uom_field}` as uom
+            from `tab{child_doctype}`
+            where parenttype = 'Animal Feeds' and coalesce(`{uom_field}`, '') != ''
+            order by parent asc, idx asc
+            """,
+            as_dict=True
+        )
+        for row in rows:
+            if row.parent in feeds and not feeds[row.parent]:
+                feeds[row.parent] = row.uom
+
+    return {"aliases": aliases, "feeds": feeds}
+
+
+def get_feed_uom_index():
+    """The feed UOM index, cached until an Animal Feeds document changes."""
+    return get_cached_value(FEED_UOM_NAMESPACE, "index", _load_feed_uom_index)
+
+
+def resolve_feed_alias(feed, index=None):
+    """Animal Feeds docname for a docname or feed_name (case-insensitive), or None."""
+    if not feed:
+        return None
+    index = index or get_feed_uom_index()
+    return index["aliases"].get(str(feed).strip().lower())
+
+
+def get_feed_uom(feed_docname, index=None):
+    """UOM of a feed: its first UOM row, else DEFAULT_FEED_UOM."""
+    index = index or get_feed_uom_index()
+    return index["feeds"].get(feed_docname) or DEFAULT_FEED_UOM
+
+
+def clear_feed_uom_index(doc=None, method=None):
+    """Animal Feeds doc event: rebuild the index on its next use."""
+    clear_cached_values(FEED_UOM_NAMESPACE)
@@ -0,0 +1,44 @@
+import frappe
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+ITEM_CACHE_NAMESPACE = "item_resolution"
+
+# Only the Item fields the posting paths actually read; never the full document
+# with its child tables.
+ITEM_FIELDS = ["name", "item_code", "item_name", "stock_uom", "valuation_rate", "standard_rate"]
+
+
+def _load_item(identifier):
+    items = frappe.get_all(
+        "Item",
+        or_filters={"item_code": identifier, "name": identifier},
+        fields=ITEM_FIELDS,
+        limit_page_length=2
+    )
+    if not items:
+        return None
+
+    # Prefer an item_code match (common pattern), then the Item whose name matches
+    for row in items:
+        if row.get("item_code") == identifier:
+            return row
+    return items[0]
+
+
+def resolve_item(identifier):
+    """
+    Resolve a product / feed / input name to its Item.
+
+    Returns frappe._dict with ITEM_FIELDS (name, item_code, stock_uom, valuation_rate, ...)
+    or None when no Item has that item_code or name. Results are cached per identifier in
+    process memory and Redis until an Item changes.
+    """
+    if not identifier:
+        return None
+    return get_cached_value(ITEM_CACHE_NAMESPACE, identifier, lambda: _load_item(identifier))
+
+
+def clear_item_cache(doc=None, method=None):
+    """Item doc event (on_update / on_trash / after_rename): drop every cached resolution."""
+    clear_cached_values(ITEM_CACHE_NAMESPACE)
@@ -0,0 +1,236 @@
+from datetime import date, timedelta
+
+import frappe
+import numpy as np
+from frappe.utils import flt, getdate, today
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+LACTATION_CACHE_NAMESPACE = "lactation_metrics"
+
+# Collections older than this (before the analysis date) are not loaded
+LACTATION_HISTORY_DAYS = 730
+
+# A break in collections longer than this ends a lactation; the next collection starts a new one
+DRY_PERIOD_DAYS = 45
+
+ROLLING_WINDOWS = (7, 30)
+
+# Days of yield a cow needs in its current lactation before Wood's curve is fitted
+WOOD_MIN_POINTS = 5
+
+STANDARD_LACTATION_DAYS = 305
+
+
+def get_milk_products():
+    """Animal Products counted as milk: site config farm_milk_products, else products named like "milk"."""
+    products = frappe.conf.get("farm_milk_products")
+    if products:
+        return [products] if isinstance(products, str) else list(products)
+    return frappe.get_all("Animal Products", filters={"name": ["like", "%milk%"]}, pluck="name", order_by="name asc")
+
+
+def _load_daily_yields(as_of, products, cattle=None):
+    """Daily yield per cow from the Cattle production_log rows, summed in one query."""
+    conditions = [
+        "parenttype = 'Cattle'",
+        "parentfield = 'production_log'",
+        "product_collected in %(products)s",
+        "date_of_collection between %(since)s and %(as_of)s",
+    ]
+    values = {
+        "products": tuple(products),
+        "since": as_of - timedelta(days=LACTATION_HISTORY_DAYS),
+        "as_of": as_of,
+    }
+    if cattle:
+        conditions.append("parent = %(cattle)s")
+        values["cattle"] = cattle
+
+    return frappe.db.sql(
+        f"""
+        select parent as cattle, date_of_collection as day, sum(coalesce(quantity_collected, 0)) as qty
+        from `tabPoultry Collections Table`
+        where {" and ".join(conditions)}
+        group by parent, date_of_collection
+        """,
+        values,
+        as_dict=True
+    )
+
+
+def _group_last(groups, *sort_keys):
+    """Index of the last row of each group once rows are sorted by (groups, *sort_keys)."""
+    order = np.lexsort((*reversed(sort_keys), groups))
+    sorted_groups = groups[order]
+    return order[np.r_[sorted_groups[1:] != sorted_groups[:-1], True]]
+
+
+def _fit_wood(groups, dim, qty, n):
+    """
+    Least-squares fit of Wood's curve y = a * t^b * e^(-c t) for every group at once, on
+    ln y = ln a + b ln t - c t. The 3x3 normal equations of each group are accumulated
+    with bincount and solved as one batch. Groups with too few points get NaN.
+    """
+    positive = qty > 0
+    groups, t, log_y = groups[positive], dim[positive].astype(float), np.log(qty[positive])
+    X = np.column_stack([np.ones_like(t), np.log(t), -t])
+
+    xtx = np.empty((n, 3, 3))
+    xty = np.empty((n, 3))
+    for i in range(3):
+        xty[:, i] = np.bincount(groups, weights=X[:, i] * log_y, minlength=n)
+        for j in range(i, 3):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(groups, weights=X[:, i] * X[:, j], minlength=n)
+
+    points = np.bincount(groups, minlength=n)
+    fits = points >= WOOD_MIN_POINTS
+    fits[fits] &= np.abs(np.linalg.det(xtx[fits])) > 1e-9
+
+    params = np.full((n, 3), np.nan)
+    if fits.any():
+        params[fits] = np.linalg.solve(xtx[fits], xty[fits][..., None])[..., 0]
+    return np.exp(params[:, 0]), params[:, 1], params[:, 2]
+
+
+def compute_lactation_metrics(cattle, days, qty, as_of):
+    """
+    Lactation metrics of every cow from one row per (cow, day), computed column-wise.
+
+    cattle: cow names, days: date ordinals, qty: that day's yield (equal-length sequences).
+    The current lactation of a cow starts at its first collection after the last break
+    longer than DRY_PERIOD_DAYS; days in milk count from that collection (day 1).
+    Returns one dict per cow, sorted by name.
+    """
+    if not len(cattle):
+        return []
+
+    names, cow = np.unique(np.asarray(cattle), return_inverse=True)
+    days = np.asarray(days, dtype=np.int64)
+    qty = np.asarray(qty, dtype=float)
+    n = len(names)
+    as_of_day = as_of.toordinal()
+
+    order = np.lexsort((days, cow))
+    cow, days, qty = cow[order], days[order], qty[order]
+
+    new_cow = np.r_[True, cow[1:] != cow[:-1]]
+    starts = new_cow | (np.r_[0, np.diff(days)] > DRY_PERIOD_DAYS)
+    start_day = np.zeros(n, dtype=np.int64)
+    np.maximum.at(start_day, cow[starts], days[starts])
+    last_day = np.zeros(n, dtype=np.int64)
+    np.maximum.at(last_day, cow, days)
+
+    metrics = {
+        "lactation_start": start_day,
+        "last_collection": last_day,
+        # A cow whose last collection is older than a dry period is not in milk
+        "days_in_milk": np.where(as_of_day - last_day <= DRY_PERIOD_DAYS, as_of_day - start_day + 1, 0),
+    }
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Average daily yield over the window: days without a collection count as 0, and a
+        # lactation younger than the window is averaged over its days in milk
+        for window in ROLLING_WINDOWS:
+            in_window = days > as_of_day - window
+            total = np.bincount(cow[in_window], weights=qty[in_window], minlength=n)
+            collected = np.bincount(cow[in_window], minlength=n) > 0
+            span = np.minimum(window, as_of_day - start_day + 1)
+            metrics[f"rolling_{window}_day_avg"] = np.where(collected, total / span, np.nan)
+
+        current = days >= start_day[cow]
+        c_cow, c_qty = cow[current], qty[current]
+        c_dim = days[current] - start_day[c_cow] + 1
+
+        peak = _group_last(c_cow, c_qty)
+        metrics["peak_yield"] = np.full(n, np.nan)
+        metrics["peak_yield"][c_cow[peak]] = c_qty[peak]
+        metrics["peak_dim"] = np.zeros(n, dtype=np.int64)
+        metrics["peak_dim"][c_cow[peak]] = c_dim[peak]
+        metrics["lactation_yield"] = np.bincount(c_cow, weights=c_qty, minlength=n)
+
+        a, b, c = _fit_wood(c_cow, c_dim, c_qty, n)
+        has_peak = (b > 0) & (c > 0)
+        fitted_peak_dim = np.where(has_peak, b / c, np.nan)
+        metrics.update({
+            "wood_a": a,
+            "wood_b": b,
+            "wood_c": c,
+            "fitted_peak_dim": fitted_peak_dim,
+            "fitted_peak_yield": np.where(has_peak, a * fitted_peak_dim ** b * np.exp(-b), np.nan),
+        })
+        t = np.arange(1, STANDARD_LACTATION_DAYS + 1)
+        metrics["projected_305_day_yield"] = (a[:, None] * t ** b[:, None] * np.exp(-c[:, None] * t)).sum(axis=1)
+
+    return [_metrics_row(name, i, metrics) for i, name in enumerate(names)]
+
+
+def _metrics_row(name, i, metrics):
+    row = {"cattle": str(name)}
+    for key, values in metrics.items():
+        value = values[i]
+        if key in ("lactation_start", "last_collection"):
+            row[key] = date.fromordinal(int(value)).isoformat()
+        elif np.issubdtype(values.dtype, np.integer):
+            row[key] = int(value)
+        else:
+            row[key] = None if np.isnan(value) else round(float(value), 6)
+    return row
+
+
+def _load_herd_metrics(as_of, products):
+    rows = _load_daily_yields(as_of, products)
+    return compute_lactation_metrics(
+        [r.cattle for r in rows], [getdate(r.day).toordinal() for r in rows], [r.qty for r in rows], as_of
+    )
+
+
+def get_herd_lactation_metrics(as_of=None, products=None):
+    """
+    Lactation metrics of every cow with milk collections, as of `as_of` (default today).
+    Cached per day and product set; production_log changes clear the cache.
+    """
+    as_of = getdate(as_of or today())
+    products = sorted(products or get_milk_products())
+    if not products:
+        return []
+    return get_cached_value(
+        LACTATION_CACHE_NAMESPACE, (as_of, *products), lambda: _load_herd_metrics(as_of, products)
+    )
+
+
+def get_cattle_lactation(cattle, as_of=None, products=None):
+    """
+    One cow's metrics with its current lactation as chart data: actual daily yield and
+    the fitted Wood curve, both by days in milk ({"metrics", "curve": {"dim", "actual", "fitted"}}).
+    """
+    as_of = getdate(as_of or today())
+    metrics = next((m for m in get_herd_lactation_metrics(as_of, products) if m["cattle"] == cattle), None)
+    if not metrics:
+        return {"metrics": None, "curve": {"dim": [], "actual": [], "fitted": []}}
+
+    start = getdate(metrics["lactation_start"])
+    last_dim = (getdate(metrics["last_collection"]) - start).days + 1
+    actual = [None] * last_dim
+    for row in _load_daily_yields(as_of, products or get_milk_products(), cattle):
+        dim = (getdate(row.day) - start).days + 1
+        if 1 <= dim <= last_dim:
+            actual[dim - 1] = flt(row.qty)
+
+    dims = np.arange(1, max(last_dim, STANDARD_LACTATION_DAYS) + 1)
+    fitted = [None] * len(dims)
+    if metrics["wood_a"] is not None:
+        a, b, c = metrics["wood_a"], metrics["wood_b"], metrics["wood_c"]
+        fitted = np.round(a * dims ** b * np.exp(-c * dims), 3).tolist()
+
+    return {
+        "metrics": metrics,
+        "curve": {"dim": dims.tolist(), "actual": actual + [None] * (len(dims) - last_dim), "fitted": fitted}
+    }
+
+
+def clear_lactation_cache(doc=None, method=None):
+    """Cattle doc event: production_log may have changed, drop the cached metrics."""
+    if doc is not None and doc.flags.bulk_onboarding:
+        return
+    clear_cached_values(LACTATION_CACHE_NAMESPACE)
@@ -0,0 +1,244 @@
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import cint, flt
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+PEDIGREE_NAMESPACE = "cattle_pedigree"
+
+LINEAGE_FIELDS = ["name", "add_nickname_optional", "animals__sex", "animals_birthdate", "parent_cattle", "lft", "rgt"]
+
+# Pairs at or above this coefficient (first cousins) are flagged by the breeding planner
+INBREEDING_THRESHOLD = 0.0625
+
+# Dams compared against every sire per numpy block (bounds the dams x generations x sires array)
+MATRIX_CHUNK_SIZE = 256
+
+
+def _get_node(cattle):
+    node = frappe.db.get_value("Cattle", cattle, ["name", "lft", "rgt", "parent_cattle"], as_dict=True)
+    if not node:
+        frappe.throw(_("Cattle {0} not found").format(cattle), frappe.DoesNotExistError)
+    if not node.lft:
+        frappe.throw(_("Cattle {0} is not placed in the herd tree yet").format(cattle))
+    return node
+
+
+def get_ancestors(cattle):
+    """Ancestors of a cattle, nearest first, with their generation (1 = parent), in one range scan."""
+    node = _get_node(cattle)
+    ancestors = frappe.get_all(
+        "Cattle",
+        filters={"lft": ["<", node.lft], "rgt": [">", node.rgt]},
+        fields=LINEAGE_FIELDS,
+        order_by="lft desc"
+    )
+    for generation, ancestor in enumerate(ancestors, start=1):
+        ancestor["generation"] = generation
+    return ancestors
+
+
+def get_descendants(cattle, max_generations=None):
+    """
+    Descendants of a cattle in tree order with their generation (1 = offspring), in one
+    range scan; max_generations limits how deep the result goes.
+    """
+    node = _get_node(cattle)
+    rows = frappe.get_all(
+        "Cattle",
+        filters={"lft": [">", node.lft], "rgt": ["<", node.rgt]},
+        fields=LINEAGE_FIELDS,
+        order_by="lft asc"
+    )
+
+    # In lft order, the open right edges on the stack are the current row's ancestors
+    max_generations = cint(max_generations)
+    descendants = []
+    open_rgt = []
+    for row in rows:
+        while open_rgt and open_rgt[-1] < row.lft:
+            open_rgt.pop()
+        row["generation"] = len(open_rgt) + 1
+        open_rgt.append(row.rgt)
+        if not max_generations or row["generation"] <= max_generations:
+            descendants.append(row)
+    return descendants
+
+
+def get_siblings(cattle):
+    """Other offspring of the same parent."""
+    node = _get_node(cattle)
+    if not node.parent_cattle:
+        return []
+    return frappe.get_all(
+        "Cattle",
+        filters={"parent_cattle": node.parent_cattle, "name": ["!=", node.name]},
+        fields=LINEAGE_FIELDS,
+        order_by="lft asc"
+    )
+
+
+def get_sibling_groups(cattle=None):
+    """
+    Offspring grouped by parent, for parents with more than one: [{parent, siblings}].
+    With `cattle`, only the groups inside its line of descent (one range scan).
+    """
+    filters = {"parent_cattle": ["is", "set"]}
+    if cattle:
+        node = _get_node(cattle)
+        filters.update({"lft": [">", node.lft], "rgt": ["<", node.rgt]})
+
+    groups = {}
+    for row in frappe.get_all("Cattle", filters=filters, fields=LINEAGE_FIELDS, order_by="lft asc"):
+        groups.setdefault(row.parent_cattle, []).append(row)
+    return [{"parent": parent, "siblings": rows} for parent, rows in groups.items() if len(rows) > 1]
+
+
+def build_pedigree(rows):
+    """
+    The herd tree as arrays, from (name, lft, rgt) rows in lft order:
+      names, index {name: position}, lft, rgt, depth (0 = root) and
+      ancestors: (herd size x max depth + 1) positions of each animal, its parent,
+      grandparent, ... padded with -1.
+    """
+    n = len(rows)
+    lft = np.array([r[1] for r in rows], dtype=np.int64)
+    rgt = np.array([r[2] for r in rows], dtype=np.int64)
+    depth = np.zeros(n, dtype=np.int64)
+
+    chains = []
+    stack = []
+    for i in range(n):
+        while stack and rgt[stack[-1]] < lft[i]:
+            stack.pop()
+        depth[i] = len(stack)
+        chains.append([i, *reversed(stack)])
+        stack.append(i)
+
+    ancestors = np.full((n, int(depth.max(initial=0)) + 1), -1, dtype=np.int64)
+    for i, chain in enumerate(chains):
+        ancestors[i, :len(chain)] = chain
+
+    names = [r[0] for r in rows]
+    return {
+        "names": names,
+        "index": {name: i for i, name in enumerate(names)},
+        "lft": lft,
+        "rgt": rgt,
+        "depth": depth,
+        "ancestors": ancestors,
+    }
+
+
+def _load_pedigree():
+    return build_pedigree(frappe.db.sql(
+        "select name, lft, rgt from `tabCattle` where coalesce(lft, 0) > 0 order by lft asc",
+        as_list=True
+    ))
+
+
+def get_pedigree():
+    """The cached pedigree of the whole herd (see build_pedigree); rebuilt after the tree changes."""
+    return get_cached_value(PEDIGREE_NAMESPACE, "pedigree", _load_pedigree)
+
+
+def _positions(pedigree, cattle):
+    missing = [c for c in cattle if c not in pedigree["index"]]
+    if missing:
+        frappe.throw(
+            _("Cattle not found in the herd tree: {0}").format(", ".join(missing)), frappe.DoesNotExistError
+        )
+    return np.array([pedigree["index"][c] for c in cattle], dtype=np.int64)
+
+
+def _relate(pedigree, dams, sires):
+    """
+    For every (dam, sire) pair: whether they share an ancestor (or one descends from the
+    other), the generations from each to the nearest one, and its position.
+    Arrays of shape (len(dams), len(sires)).
+    """
+    lft, rgt, depth = pedigree["lft"], pedigree["rgt"], pedigree["depth"]
+    chains = pedigree["ancestors"][dams]
+    known = chains >= 0
+    chain_lft = lft[np.where(known, chains, 0)]
+    chain_rgt = rgt[np.where(known, chains, 0)]
+
+    # contains[d, g, s]: the dam's ancestor g generations up is the sire or one of its ancestors
+    contains = (
+        known[:, :, None]
+        & (chain_lft[:, :, None] <= lft[sires][None, None, :])
+        & (chain_rgt[:, :, None] >= rgt[sires][None, None, :])
+    )
+    related = contains.any(axis=1)
+    dam_steps = contains.argmax(axis=1)
+    common = np.take_along_axis(chains, dam_steps, axis=1)
+    sire_steps = depth[sires][None, :] - (depth[dams][:, None] - dam_steps)
+    return related, dam_steps, sire_steps, common
+
+
+def _coefficients(related, dam_steps, sire_steps):
+    # Wright's coefficient of the offspring through the nearest common ancestor; the tree records
+    # one parent per animal, so that ancestor's own inbreeding is unknown and taken as 0
+    return np.where(related, 0.5 ** (dam_steps + sire_steps + 1), 0.0)
+
+
+def check_inbreeding(cattle, mate):
+    """
+    Inbreeding coefficient of an offspring of `cattle` and `mate`, with their nearest
+    common ancestor and the generations from each of them to it.
+    """
+    pedigree = get_pedigree()
+    related, dam_steps, sire_steps, common = _relate(
+        pedigree, _positions(pedigree, [cattle]), _positions(pedigree, [mate])
+    )
+    if not related[0, 0]:
+        return {"coefficient": 0.0, "common_ancestor": None, "generations": None}
+    return {
+        "coefficient": flt(_coefficients(related, dam_steps, sire_steps)[0, 0]),
+        "common_ancestor": pedigree["names"][common[0, 0]],
+        "generations": [int(dam_steps[0, 0]), int(sire_steps[0, 0])],
+    }
+
+
+def get_inbreeding_matrix(dams, sires, threshold=INBREEDING_THRESHOLD):
+    """
+    Offspring inbreeding coefficients for every dam x sire pairing, computed block-wise
+    on the cached pedigree: {"dams", "sires", "coefficients": [[per sire] per dam],
+    "flagged": [{dam, sire, coefficient}] at or above `threshold`}.
+    """
+    pedigree = get_pedigree()
+    dam_positions = _positions(pedigree, dams)
+    sire_positions = _positions(pedigree, sires)
+
+    coefficients = np.zeros((len(dams), len(sires)))
+    for start in range(0, len(dams), MATRIX_CHUNK_SIZE):
+        related, dam_steps, sire_steps, _common = _relate(
+            pedigree, dam_positions[start:start + MATRIX_CHUNK_SIZE], sire_positions
+        )
+        coefficients[start:start + MATRIX_CHUNK_SIZE] = _coefficients(related, dam_steps, sire_steps)
+
+    flagged = [
+        {"dam": dams[d], "sire": sires[s], "coefficient": flt(coefficients[d, s])}
+        for d, s in zip(*np.nonzero(coefficients >= flt(threshold)))
+    ]
+    return {
+        "dams": list(dams),
+        "sires": list(sires),
+        "coefficients": coefficients.round(6).tolist(),
+        "flagged": sorted(flagged, key=lambda f: -f["coefficient"]),
+    }
+
+
+def clear_pedigree_cache(doc=None, method=None):
+    """
+    Cattle doc event: drop the cached pedigree when an animal joins, leaves or moves in
+    the tree. Bulk onboarding clears it once at the end instead.
+    """
+    if doc is not None:
+        if doc.flags.bulk_onboarding:
+            return
+        previous = doc.get_doc_before_save() if method == "on_update" else None
+        if previous and previous.get("parent_cattle") == doc.get("parent_cattle"):
+            return
+    clear_cached_values(PEDIGREE_NAMESPACE)
@@ -0,0 +1,88 @@
+import frappe
+from frappe.utils import flt
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value, set_cached_value
+
+PRICE_CACHE_NAMESPACE = "item_price"
+
+
+def _load_price_rate(item_code, price_list=None, uom=None):
+    """
+    Latest price_list_rate for the item (valid_from desc, modified desc), or 0.0.
+    Without a price_list, any selling price list matches; without a uom, any uom matches.
+    """
+    filters = {"item_code": item_code}
+    if price_list:
+        filters["price_list"] = price_list
+    else:
+        filters["selling"] = 1
+    if uom:
+        filters["uom"] = uom
+
+    item_prices = frappe.get_all(
+        "Item Price",
+        filters=filters,
+        fields=["price_list_rate"],
+        order_by="valid_from desc, modified desc",
+        limit=1
+    )
+    if item_prices:
+        return flt(item_prices[0].price_list_rate)
+    return 0.0
+
+
+def get_price_rate(item_code, price_list=None, uom=None):
+    """
+    Cached Item Price rate keyed by (item_code, price_list, uom).
+    price_list=None means "any selling price list" (what harvest / collection postings use).
+    Returns 0.0 when the item has no matching price.
+    """
+    if not item_code:
+        return 0.0
+    return get_cached_value(
+        PRICE_CACHE_NAMESPACE,
+        (item_code, price_list, uom),
+        lambda: _load_price_rate(item_code, price_list, uom)
+    )
+
+
+def get_selling_rate(item_code):
+    """Latest selling rate of the item across selling price lists (cached)."""
+    return get_price_rate(item_code)
+
+
+def _price_keys(doc):
+    """Every cache key an Item Price row can be the answer for."""
+    if not doc or not doc.get("item_code"):
+        return set()
+    item_code, price_list, uom = doc.get("item_code"), doc.get("price_list"), doc.get("uom")
+    keys = {(item_code, price_list, uom), (item_code, price_list, None)}
+    if doc.get("selling"):
+        keys |= {(item_code, None, uom), (item_code, None, None)}
+    return keys
+
+
+def refresh_item_price_cache(doc, method=None):
+    """
+    Item Price doc event (on_update / on_trash).
+
+    Every key the price answers (its own price list and uom, "any uom" and, for selling
+    prices, "any selling price list") is recomputed with the loader's query, since the
+    saved row is not necessarily the latest valid_from one. Keys the row answered before
+    a change of item, price list, uom or selling are recomputed too. This covers the prices
+    maintained by AnimalProducts / CropProducts / CropSeedlings.on_update as well as
+    prices edited by hand.
+    """
+    if method == "on_trash":
+        # The row is still present during on_trash; recompute lazily on next read
+        for key in _price_keys(doc):
+            clear_cached_values(PRICE_CACHE_NAMESPACE, key)
+        return
+
+    for key in _price_keys(doc) | _price_keys(doc.get_doc_before_save()):
+        set_cached_value(PRICE_CACHE_NAMESPACE, key, _load_price_rate(*key))
+
+
+def clear_price_cache(doc=None, method=None):
+    """Drop every cached price (e.g. after a bulk price import)."""
+    clear_cached_values(PRICE_CACHE_NAMESPACE)
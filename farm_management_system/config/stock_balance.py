@@ -0,0 +1,160 @@
+import hashlib
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+BALANCE_DOCTYPE = "Farm Stock Balance"
+BALANCE_FIELDS = ["item_code", "warehouse", "company", "actual_qty", "valuation_rate", "stock_value", "last_sle"]
+
+
+def get_stock_balance_name(item_code, warehouse):
+    """Primary key of the Farm Stock Balance row for (item_code, warehouse)."""
+    return hashlib.md5(f"{item_code}::{warehouse}".encode()).hexdigest()
+
+
+def set_stock_balances(balances):
+    """
+    Upsert Farm Stock Balance rows in one statement.
+
+    `balances` is a list of (item_code, warehouse, state, last_sle) where `state` is a stock
+    state as returned by stock_posting.get_last_stock_state (qty_after_transaction,
+    valuation_rate, company, ...). Callers hold the pair's posting lock, so the state is
+    the authoritative latest balance and simply overwrites the row.
+    """
+    if not balances:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    values = []
+    for item_code, warehouse, state, last_sle in balances:
+        qty = flt(state.get("qty_after_transaction"))
+        rate = flt(state.get("valuation_rate"))
+        values.extend([
+            get_stock_balance_name(item_code, warehouse), now, now, user, user,
+            item_code, warehouse, state.get("company"), qty, rate, flt(qty * rate), last_sle
+        ])
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, 0, 0, %s, %s, %s, %s, %s, %s, %s)"] * len(balances))
+    updated = ["modified", "modified_by", "company", "actual_qty", "valuation_rate", "stock_value", "last_sle"]
+    if frappe.db.db_type == "postgres":
+        on_conflict = "on conflict (name) do update set " + ", ".join(f"{f} = excluded.{f}" for f in updated)
+    else:
+        on_conflict = "on duplicate key update " + ", ".join(f"`{f}` = values(`{f}`)" for f in updated)
+
+    frappe.db.sql(
+        f"""
+        insert into `tab{BALANCE_DOCTYPE}`
+            (name, creation, modified, owner, modified_by, docstatus, idx,
+             item_code, warehouse, company, actual_qty, valuation_rate, stock_value, last_sle)
+        values {placeholders}
+        {on_conflict}
+        """,
+        values
+    )
+
+
+def get_stock_balance(item_code, warehouse):
+    """Balance row of (item_code, warehouse) by primary key, or None when nothing was posted."""
+    return frappe.db.get_value(
+        BALANCE_DOCTYPE, get_stock_balance_name(item_code, warehouse), BALANCE_FIELDS, as_dict=True
+    )
+
+
+def get_item_stock_many(item_codes):
+    """
+    Current stock of several items across all their warehouses, in one query.
+
+    Returns {item_code: {"qty_after_transaction", "stock_value", "valuation_rate"}};
+    items with no balance row are left out.
+    """
+    item_codes = [i for i in dict.fromkeys(item_codes or []) if i]
+    if not item_codes:
+        return {}
+
+    rows = frappe.get_all(
+        BALANCE_DOCTYPE,
+        filters={"item_code": ["in", item_codes]},
+        fields=["item_code", "actual_qty", "valuation_rate", "stock_value"],
+        order_by="modified asc"
+    )
+
+    result = {}
+    for row in rows:
+        stock = result.setdefault(row.item_code, {"qty_after_transaction": 0.0, "stock_value": 0.0, "valuation_rate": 0.0})
+        stock["qty_after_transaction"] += flt(row.actual_qty)
+        stock["stock_value"] += flt(row.stock_value)
+        # most recently posted warehouse wins when there is no quantity to average over
+        stock["valuation_rate"] = flt(row.valuation_rate)
+
+    for stock in result.values():
+        if stock["qty_after_transaction"]:
+            stock["valuation_rate"] = flt(stock["stock_value"] / stock["qty_after_transaction"])
+    return result
+
+
+def get_item_stock(item_code):
+    """Current stock of one item across its warehouses ({} when nothing was posted)."""
+    return get_item_stock_many([item_code]).get(item_code, {})
+
+
+def refresh_stock_balance(item_code, warehouse):
+    """Recompute one balance row from the latest (non-cancelled) Stock Ledger Entry."""
+    latest = frappe.get_all(
+        "Stock Ledger Entry",
+        filters={"item_code": item_code, "warehouse": warehouse, "is_cancelled": 0},
+        fields=["name", "qty_after_transaction", "valuation_rate", "company"],
+        order_by="posting_datetime desc, creation desc",
+        limit_page_length=1
+    )
+    if not latest:
+        frappe.db.delete(BALANCE_DOCTYPE, {"name": get_stock_balance_name(item_code, warehouse)})
+        return
+    set_stock_balances([(item_code, warehouse, latest[0], latest[0].name)])
+
+
+def update_stock_balances_from_voucher(doc, method=None):
+    """
+    Stock voucher doc event (on_submit / on_cancel) for postings made outside the farm
+    posting engine (Purchase Receipts, Stock Entries, ...). Doc events run after the
+    voucher's controller, i.e. once ERPNext has reposted its Stock Ledger Entries (their
+    qty_after_transaction is final) or marked them cancelled with a plain UPDATE, so the
+    balance of every (item_code, warehouse) the voucher touched is re-read here.
+    """
+    pairs = frappe.get_all(
+        "Stock Ledger Entry",
+        filters={"voucher_type": doc.doctype, "voucher_no": doc.name},
+        fields=["item_code", "warehouse"],
+        distinct=True
+    )
+    for pair in pairs:
+        refresh_stock_balance(pair.item_code, pair.warehouse)
+
+
+def rebuild_stock_balances():
+    """
+    Rebuild every Farm Stock Balance row from the Stock Ledger (repair / first install).
+    Run with: bench --site <site> execute farm_management_system.config.stock_balance.rebuild_stock_balances
+    """
+    latest_rows = frappe.db.sql(
+        """
+        select name, item_code, warehouse, company, qty_after_transaction, valuation_rate
+        from (
+            select name, item_code, warehouse, company, qty_after_transaction, valuation_rate,
+                row_number() over (
+                    partition by item_code, warehouse order by posting_datetime desc, creation desc
+                ) as row_no
+            from `tabStock Ledger Entry`
+            where is_cancelled = 0
+        ) latest
+        where row_no = 1
+        """,
+        as_dict=True
+    )
+
+    frappe.db.delete(BALANCE_DOCTYPE)
+    balances = [(row.item_code, row.warehouse, row, row.name) for row in latest_rows]
+    for start in range(0, len(balances), 500):
+        set_stock_balances(balances[start:start + 500])
+    frappe.db.commit()
+    return len(balances)
@@ -0,0 +1,474 @@
+import hashlib
+import json
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.model.naming import parse_naming_series
+from frappe.utils import cint, flt, get_datetime, now_datetime, nowdate, nowtime, strip_html
+from erpnext.accounts.utils import get_fiscal_year
+
+from farm_management_system.config.item_resolver import resolve_item
+from farm_management_system.config.price_cache import get_selling_rate
+from farm_management_system.config.stock_balance import set_stock_balances
+from farm_management_system.config.warehouse_resolver import get_default_warehouse
+
+
+# Fields read from the latest Stock Ledger Entry of an (item_code, warehouse) pair.
+SLE_STATE_FIELDS = [
+    "name", "qty_after_transaction", "incoming_rate", "outgoing_rate",
+    "valuation_rate", "fiscal_year", "company", "posting_datetime", "creation"
+]
+
+# Seconds to wait for another transaction posting the same (item_code, warehouse)
+POSTING_LOCK_TIMEOUT = 30
+
+
+class StockPostingLockTimeout(frappe.ValidationError):
+    pass
+
+
+def _get_posting_lock_name(item_code, warehouse):
+    # MariaDB lock names are limited to 64 characters
+    digest = hashlib.md5(f"{frappe.local.site}::{item_code}::{warehouse}".encode()).hexdigest()
+    return f"farm_sle:{digest}"
+
+
+def _release_posting_locks():
+    held = getattr(frappe.local, "farm_posting_locks", None)
+    frappe.local.farm_posting_locks = None
+    if held and frappe.db.db_type != "postgres":
+        frappe.db.sql("select release_all_locks()")
+
+
+def acquire_posting_lock(item_code, warehouse):
+    """
+    Serialize postings for one (item_code, warehouse) pair across workers.
+
+    Takes a named advisory lock (MariaDB GET_LOCK / Postgres transaction advisory lock)
+    that is held until the current transaction commits or rolls back. Only postings of the
+    same pair wait on each other; other items keep posting in parallel. Re-entrant within
+    a transaction.
+    """
+    held = getattr(frappe.local, "farm_posting_locks", None)
+    if held is None:
+        held = frappe.local.farm_posting_locks = set()
+        frappe.db.after_commit.add(_release_posting_locks)
+        frappe.db.after_rollback.add(_release_posting_locks)
+
+    lock_name = _get_posting_lock_name(item_code, warehouse)
+    if lock_name in held:
+        return
+
+    if frappe.db.db_type == "postgres":
+        frappe.db.sql("select pg_advisory_xact_lock(hashtext(%s))", (lock_name,))
+    else:
+        acquired = frappe.db.sql("select get_lock(%s, %s)", (lock_name, POSTING_LOCK_TIMEOUT))
+        if not (acquired and cint(acquired[0][0]) == 1):
+            frappe.throw(
+                _("Stock for Item {0} at Warehouse {1} is being updated by another user. Please try again.").format(
+                    item_code, warehouse
+                ),
+                StockPostingLockTimeout
+            )
+    held.add(lock_name)
+
+
+def _get_balance_cache():
+    """
+    Return the per-transaction running balance cache (stored on frappe.local).
+
+    The cache is dropped as soon as the current transaction is committed or rolled back,
+    so a balance is never carried over into a transaction that could see other writers.
+    """
+    cache = getattr(frappe.local, "farm_stock_balances", None)
+    if cache is None:
+        cache = frappe.local.farm_stock_balances = {}
+        frappe.db.after_commit.add(clear_balance_cache)
+        frappe.db.after_rollback.add(clear_balance_cache)
+    return cache
+
+
+def clear_balance_cache():
+    """Forget every running balance held for the current transaction."""
+    frappe.local.farm_stock_balances = None
+
+
+def get_last_stock_state(item_code, warehouse):
+    """
+    Return the latest stock state for (item_code, warehouse) as a dict:
+      { qty_after_transaction, incoming_rate, outgoing_rate, valuation_rate, fiscal_year, company }
+    or None when the pair has no Stock Ledger Entry yet.
+
+    Only the first lookup in a transaction hits `tabStock Ledger Entry`; every entry posted
+    through this module afterwards updates the cached state in memory.
+
+    The pair's posting lock is taken before the read and kept until the transaction ends,
+    and the read is a locking read (so it sees the latest committed balance rather than
+    the transaction's snapshot). Two clerks posting the same item therefore chain on each
+    other's balance instead of both writing latest + qty.
+    """
+    cache = _get_balance_cache()
+    key = (item_code, warehouse)
+    if key in cache:
+        return cache[key]
+
+    acquire_posting_lock(item_code, warehouse)
+    sle_rows = frappe.db.sql(
+        """
+        select {fields}
+        from `tabStock Ledger Entry`
+        where item_code = %s and warehouse = %s
+        order by posting_datetime desc, creation desc
+        limit 1
+        for update
+        """.format(fields=", ".join(f"`{f}`" for f in SLE_STATE_FIELDS)),
+        (item_code, warehouse),
+        as_dict=True
+    )
+
+    state = None
+    if sle_rows:
+        latest = sle_rows[0]
+        state = {
+            "qty_after_transaction": flt(latest.get("qty_after_transaction") or 0.0),
+            "incoming_rate": flt(latest.get("incoming_rate") or 0.0),
+            "outgoing_rate": flt(latest.get("outgoing_rate") or 0.0),
+            "valuation_rate": flt(latest.get("valuation_rate") or 0.0),
+            "fiscal_year": latest.get("fiscal_year"),
+            "company": latest.get("company"),
+        }
+
+    cache[key] = state
+    return state
+
+
+def _get_current_fiscal_year():
+    try:
+        fy = get_fiscal_year(nowdate())
+        return fy[0] if fy else None
+    except Exception:
+        return None
+
+
+def _build_sle_values(
+    state,
+    item_code,
+    warehouse,
+    actual_qty,
+    voucher_type,
+    voucher_no,
+    voucher_detail_no=None,
+    selling_rate=None,
+    default_rate=0.0,
+    company=None,
+    require_previous=False
+):
+    """
+    Compute the Stock Ledger Entry values for one posting on top of `state` (the previous
+    stock state of the pair, or None). Returns (sle_values, new_state).
+
+    Rates:
+      - With a prior entry, incoming/outgoing/valuation rates and fiscal year/company are
+        carried over from it. Without one, `default_rate` is used as incoming and valuation
+        rate and `company` / the current fiscal year are used (or we throw if
+        `require_previous` is set).
+      - When `selling_rate` is given (collections and harvests), it replaces the outgoing and
+        valuation rate; a zero selling rate keeps the carried-over valuation rate and sets
+        the outgoing rate to 0.
+    """
+    actual_qty = flt(actual_qty)
+
+    if state:
+        latest_qty_after = state["qty_after_transaction"]
+        incoming_rate = state["incoming_rate"]
+        outgoing_rate = state["outgoing_rate"]
+        valuation_rate = state["valuation_rate"]
+        fiscal_year = state["fiscal_year"]
+        company = state["company"]
+    else:
+        if require_previous:
+            frappe.throw(
+                _("No Stock Ledger Entry found for Item {0} at Warehouse {1}.").format(item_code, warehouse),
+                frappe.ValidationError
+            )
+        frappe.logger("stock_posting").warning(
+            "No prior SLE found for Item %s at Warehouse %s: creating initial SLE with defaults",
+            item_code, warehouse
+        )
+        latest_qty_after = 0.0
+        incoming_rate = flt(default_rate)
+        outgoing_rate = 0.0
+        valuation_rate = incoming_rate
+        fiscal_year = _get_current_fiscal_year()
+
+    if selling_rate is not None:
+        selling_rate = flt(selling_rate)
+        if selling_rate:
+            outgoing_rate = valuation_rate = selling_rate
+        else:
+            outgoing_rate = 0.0
+
+    new_qty_after = flt(latest_qty_after + actual_qty)
+
+    sle_values = {
+        "item_code": item_code,
+        "warehouse": warehouse,
+        "posting_date": nowdate(),
+        "posting_time": nowtime(),
+        "voucher_type": voucher_type,
+        "voucher_no": voucher_no,
+        "voucher_detail_no": voucher_detail_no,
+        "actual_qty": actual_qty,
+        "qty_after_transaction": new_qty_after,
+        "incoming_rate": incoming_rate,
+        "outgoing_rate": outgoing_rate,
+        "valuation_rate": valuation_rate,
+        "fiscal_year": fiscal_year,
+        "company": company,
+        "stock_value": flt(valuation_rate * new_qty_after),
+        "stock_value_difference": flt(valuation_rate * actual_qty),
+        # One-line JSON for Long Text field
+        "stock_queue": json.dumps([[new_qty_after, valuation_rate]])
+    }
+    new_state = {
+        "qty_after_transaction": new_qty_after,
+        "incoming_rate": incoming_rate,
+        "outgoing_rate": outgoing_rate,
+        "valuation_rate": valuation_rate,
+        "fiscal_year": fiscal_year,
+        "company": company,
+    }
+    return sle_values, new_state
+
+
+def post_stock_ledger_entry(item_code, warehouse, actual_qty, voucher_type, voucher_no, **kwargs):
+    """
+    Insert and submit a Stock Ledger Entry moving `actual_qty` (positive = receipt,
+    negative = issue) for (item_code, warehouse), chained on the running balance.
+    See _build_sle_values for how rates are chosen (keyword args: voucher_detail_no,
+    selling_rate, default_rate, company, require_previous).
+
+    Returns {"sle_name": ..., "submitted": bool}
+    """
+    state = get_last_stock_state(item_code, warehouse)
+    sle_values, new_state = _build_sle_values(
+        state, item_code, warehouse, actual_qty, voucher_type, voucher_no, **kwargs
+    )
+
+    sle_doc = frappe.get_doc({"doctype": "Stock Ledger Entry", **sle_values})
+    sle_doc.insert(ignore_permissions=True)
+
+    # The inserted row is now the latest SLE for this pair (even if submit fails below,
+    # the draft row is what the ORDER BY lookup would return).
+    _get_balance_cache()[(item_code, warehouse)] = new_state
+    set_stock_balances([(item_code, warehouse, new_state, sle_doc.name)])
+
+    try:
+        sle_doc.submit()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), f"post_stock_ledger_entry: submit failed for {voucher_type} {voucher_no}")
+        return {"sle_name": sle_doc.name, "submitted": False}
+
+    return {"sle_name": sle_doc.name, "submitted": True}
+
+
+def _reserve_sle_names(count):
+    """
+    Reserve `count` Stock Ledger Entry names in one go.
+
+    For a naming-series autoname (e.g. MAT-SLE-.YYYY.-.#####) the series counter is bumped
+    by `count` with a single locked read + write instead of once per document; any other
+    autoname falls back to random hashes.
+    """
+    autoname = frappe.get_meta("Stock Ledger Entry").autoname or ""
+    if ".#" not in autoname:
+        return [frappe.generate_hash(length=10) for _i in range(count)]
+
+    prefix_part, hashes = autoname.rsplit(".", 1)
+    prefix = parse_naming_series(prefix_part)
+    digits = len(hashes)
+
+    current = frappe.db.sql("select `current` from `tabSeries` where `name`=%s for update", (prefix,))
+    if current and current[0][0] is not None:
+        start = cint(current[0][0])
+        frappe.db.sql("update `tabSeries` set `current` = `current` + %s where `name`=%s", (count, prefix))
+    else:
+        start = 0
+        frappe.db.sql("insert into `tabSeries` (`name`, `current`) values (%s, %s)", (prefix, count))
+
+    return [f"{prefix}{str(start + i).zfill(digits)}" for i in range(1, count + 1)]
+
+
+def post_stock_ledger_entries(entries):
+    """
+    Bulk variant of post_stock_ledger_entry for multi-row collections.
+
+    `entries` is a list of dicts carrying the arguments of post_stock_ledger_entry
+    (item_code, warehouse, actual_qty, voucher_type, voucher_no, and optionally
+    voucher_detail_no, selling_rate, default_rate, company, require_previous).
+
+    qty_after_transaction is chained in memory for repeated (item_code, warehouse) pairs,
+    every pair's previous state is read at most once, and all entries are written as
+    submitted rows with a single multi-row insert. The SLE controller's insert/submit hooks
+    are skipped; the values are computed exactly as post_stock_ledger_entry computes them.
+
+    Returns a list of {"sle_name": ..., "submitted": True} aligned with `entries`.
+    """
+    if not entries:
+        return []
+
+    meta = frappe.get_meta("Stock Ledger Entry")
+    now = now_datetime()
+    user = frappe.session.user
+    # States are staged here and only published to the running balance cache once the
+    # insert succeeds, so a failing entry cannot leave phantom balances behind.
+    pending = {}
+
+    # Take every pair's posting lock up front, in a fixed order, so two bulk postings
+    # touching the same pairs cannot deadlock each other.
+    for item_code, warehouse in sorted({(e["item_code"], e["warehouse"]) for e in entries}):
+        acquire_posting_lock(item_code, warehouse)
+
+    rows = []
+    for entry in entries:
+        entry = dict(entry)
+        item_code = entry.pop("item_code")
+        warehouse = entry.pop("warehouse")
+        actual_qty = entry.pop("actual_qty")
+        voucher_type = entry.pop("voucher_type")
+        voucher_no = entry.pop("voucher_no")
+
+        key = (item_code, warehouse)
+        state = pending[key] if key in pending else get_last_stock_state(item_code, warehouse)
+        sle_values, pending[key] = _build_sle_values(
+            state, item_code, warehouse, actual_qty, voucher_type, voucher_no, **entry
+        )
+        rows.append(sle_values)
+
+    names = _reserve_sle_names(len(rows))
+    fields = ["name", "owner", "modified_by", "creation", "modified", "docstatus", *rows[0].keys()]
+    if meta.has_field("posting_datetime"):
+        fields.append("posting_datetime")
+
+    values = []
+    for i, (name, sle_values) in enumerate(zip(names, rows)):
+        # Entries of one posting share posting_datetime: a distinct creation per row keeps
+        # the "posting_datetime desc, creation desc" latest-entry lookups deterministic
+        creation = now + timedelta(microseconds=i)
+        row = [name, user, user, creation, creation, 1, *sle_values.values()]
+        if meta.has_field("posting_datetime"):
+            row.append(get_datetime(f"{sle_values['posting_date']} {sle_values['posting_time']}"))
+        values.append(row)
+
+    frappe.db.bulk_insert("Stock Ledger Entry", fields, values)
+
+    # Last entry name per pair, for the Farm Stock Balance rows
+    last_sle = {}
+    for name, sle_values in zip(names, rows):
+        last_sle[(sle_values["item_code"], sle_values["warehouse"])] = name
+    set_stock_balances([
+        (item_code, warehouse, state, last_sle[(item_code, warehouse)])
+        for (item_code, warehouse), state in pending.items()
+    ])
+    _get_balance_cache().update(pending)
+    return [{"sle_name": name, "submitted": True} for name in names]
+
+
+def _resolve_collected_product(animal_product):
+    """SLE arguments shared by every collection of `animal_product`: its Item, warehouse and rates."""
+    item_doc = resolve_item(animal_product)
+    if not item_doc:
+        frappe.throw(_("No Item found with item_code or name '{0}'.").format(animal_product))
+
+    company = frappe.defaults.get_global_default("company") or frappe.db.get_default("company")
+    company = company or item_doc.get("company")
+    item_code = item_doc.get("item_code") or item_doc.name
+    return {
+        "item_code": item_code,
+        "warehouse": get_default_warehouse(item_doc.name, company),
+        "selling_rate": get_selling_rate(item_code),
+        "default_rate": item_doc.get("valuation_rate") or item_doc.get("standard_rate") or 0.0,
+        "company": company
+    }
+
+
+def _post_isolated(entry, savepoint):
+    """post_stock_ledger_entry under a savepoint: a failure is returned instead of raised."""
+    frappe.db.savepoint(savepoint)
+    try:
+        return post_stock_ledger_entry(**entry)
+    except Exception as e:
+        frappe.db.rollback(save_point=savepoint)
+        frappe.clear_messages()
+        # The running balance may already include the rolled back entry
+        _get_balance_cache().pop((entry["item_code"], entry["warehouse"]), None)
+        return {"sle_name": None, "submitted": False, "error": strip_html(str(e))}
+
+
+def create_stock_ledger_entries_collections(rows, reference_doctype):
+    """
+    Post the Stock Ledger Entries of a whole collection session (Cattle or Poultry Batches).
+
+    rows: list of dicts (or JSON string) like
+      [{ "animal_product": "Milk", "quantity_collected": 2.5, "reference_name": "COW-0001" }, ...]
+
+    Every row is validated before anything is written: each distinct animal_product is
+    resolved to its Item, warehouse and selling rate once, and a product that cannot be
+    resolved fails only its own rows. The rest go out in one post_stock_ledger_entries
+    insert; should that fail, each entry is posted on its own under a savepoint so one bad
+    row does not lose the others.
+
+    Returns {"row": position in rows, "sle_name", "submitted", "error"} for every row with a
+    product and quantity (the others are skipped).
+    """
+    if isinstance(rows, str):
+        rows = frappe.parse_json(rows)
+
+    resolved = {}
+    results = []
+    entries = []
+    for i, r in enumerate(rows or []):
+        product_collected = r.get("animal_product")
+        qty = flt(r.get("quantity_collected") or 0.0)
+        if not product_collected or qty == 0:
+            continue
+
+        if product_collected not in resolved:
+            try:
+                resolved[product_collected] = _resolve_collected_product(product_collected)
+            except Exception as e:
+                frappe.clear_messages()
+                frappe.log_error(
+                    f"Could not resolve Item/Warehouse for {product_collected}: {e}",
+                    "create_stock_ledger_entries_collections"
+                )
+                resolved[product_collected] = strip_html(str(e))
+
+        result = {"row": i, "sle_name": None, "submitted": False, "error": None}
+        results.append(result)
+        if isinstance(resolved[product_collected], str):
+            result["error"] = resolved[product_collected]
+            continue
+
+        entries.append((result, {
+            **resolved[product_collected],
+            "actual_qty": qty,  # positive addition
+            "voucher_type": reference_doctype,
+            "voucher_no": r.get("reference_name") or product_collected
+        }))
+
+    if not entries:
+        return results
+
+    frappe.db.savepoint("farm_collection_sles")
+    try:
+        posted = post_stock_ledger_entries([entry for _result, entry in entries])
+    except Exception:
+        frappe.db.rollback(save_point="farm_collection_sles")
+        frappe.log_error(frappe.get_traceback(), f"create_stock_ledger_entries_collections: batched insert failed for {reference_doctype}")
+        posted = [_post_isolated(entry, f"farm_collection_sle_{result['row']}") for result, entry in entries]
+
+    for (result, _entry), outcome in zip(entries, posted):
+        result.update(outcome)
+    return results
@@ -0,0 +1,100 @@
+# Copyright (c) 2025, Techsavanna Technology and Contributors
+# See license.txt
+
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from farm_management_system.config.ai_images import (
+	AI_IMAGE_CACHE_NAMESPACE,
+	AIImageError,
+	AIImageRetryableError,
+	get_ai_image_url,
+)
+from farm_management_system.config.caching import clear_cached_values
+
+# 1x1 transparent PNG
+STUB_PNG = base64.b64decode(
+	"iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+class _StubImageHandler(BaseHTTPRequestHandler):
+	# Status codes to answer with before succeeding; shared by every request
+	failures = []
+	requests = 0
+
+	def do_POST(self):
+		type(self).requests += 1
+		self.rfile.read(int(self.headers.get("Content-Length") or 0))
+		if type(self).failures:
+			self.send_response(type(self).failures.pop(0))
+			self.end_headers()
+			return
+		self.send_response(200)
+		self.send_header("Content-Type", "image/png")
+		self.end_headers()
+		self.wfile.write(STUB_PNG)
+
+	def log_message(self, *args):
+		pass
+
+
+class TestAIImages(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.server = HTTPServer(("127.0.0.1", 0), _StubImageHandler)
+		threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		super().tearDownClass()
+
+	def setUp(self):
+		_StubImageHandler.failures = []
+		_StubImageHandler.requests = 0
+		frappe.local.conf.farm_ai_image_url = f"http://127.0.0.1:{self.server.server_port}/"
+		frappe.local.conf.farm_ai_image_attempts = 2
+		frappe.local.conf.farm_ai_image_api_key = "_test_key"
+		clear_cached_values(AI_IMAGE_CACHE_NAMESPACE)
+
+	def tearDown(self):
+		frappe.local.conf.pop("farm_ai_image_url", None)
+		frappe.local.conf.pop("farm_ai_image_attempts", None)
+		frappe.local.conf.pop("farm_ai_image_api_key", None)
+
+	def test_identical_prompts_share_one_file(self):
+		prompt = f"_Test avatar for Broilers {frappe.generate_hash(length=6)}"
+		first = get_ai_image_url(prompt)
+		second = get_ai_image_url(prompt)
+
+		self.assertEqual(first, second)
+		self.assertEqual(_StubImageHandler.requests, 1)
+		self.assertEqual(frappe.db.count("File", {"file_url": first}), 1)
+
+	@patch("farm_management_system.config.ai_images.time.sleep")
+	def test_retries_server_errors_with_backoff(self, sleep):
+		_StubImageHandler.failures = [503]
+		get_ai_image_url(f"_Test avatar for Layers {frappe.generate_hash(length=6)}")
+
+		self.assertEqual(_StubImageHandler.requests, 2)
+		sleep.assert_called_with(2)
+
+	@patch("farm_management_system.config.ai_images.time.sleep")
+	def test_gives_up_after_the_last_attempt(self, sleep):
+		_StubImageHandler.failures = [429, 429]
+		with self.assertRaises(AIImageRetryableError):
+			get_ai_image_url(f"_Test avatar for Kienyeji {frappe.generate_hash(length=6)}")
+		self.assertEqual(_StubImageHandler.requests, 2)
+
+	def test_requires_an_api_key(self):
+		frappe.local.conf.pop("farm_ai_image_api_key", None)
+		with self.assertRaises(AIImageError):
+			get_ai_image_url(f"_Test avatar for Turkeys {frappe.generate_hash(length=6)}")
+		self.assertEqual(_StubImageHandler.requests, 0)
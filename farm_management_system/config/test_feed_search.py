@@ -0,0 +1,29 @@
+# Copyright (c) 2025, Techsavanna Technology and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from farm_management_system.config.feed_search import _add_entry, _empty_index, _remove_entry, search_index
+
+
+class TestFeedSearch(FrappeTestCase):
+	def setUp(self):
+		self.index = _empty_index()
+		_add_entry(self.index, "AF/001", "Dairy Meal", "Dairy Meal")
+		_add_entry(self.index, "AF/002", "Layers Mash", "Layers Mash")
+		_add_entry(self.index, "AF/003", "Dairy Cubes", None)
+
+	def test_prefix_matches_rank_before_fuzzy_ones(self):
+		names = [m["name"] for m in search_index(self.index, "dairy")]
+		self.assertEqual(names, ["AF/003", "AF/001"])
+
+	def test_tolerates_typos(self):
+		self.assertEqual(search_index(self.index, "diary meal")[0]["name"], "AF/001")
+
+	def test_reindexing_replaces_the_old_keys(self):
+		_add_entry(self.index, "AF/002", "Grower Pellets", None)
+		self.assertEqual(search_index(self.index, "layers mash"), [])
+		self.assertEqual(search_index(self.index, "grower")[0]["name"], "AF/002")
+
+		_remove_entry(self.index, "AF/002")
+		self.assertEqual(search_index(self.index, "grower"), [])
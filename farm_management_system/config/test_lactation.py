@@ -0,0 +1,56 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+from datetime import date, timedelta
+
+import numpy as np
+from frappe.tests.utils import FrappeTestCase
+
+from farm_management_system.config.lactation import compute_lactation_metrics
+
+AS_OF = date(2026, 10, 1)
+
+
+def _days_back(n):
+	return (AS_OF - timedelta(days=n)).toordinal()
+
+
+class TestLactation(FrappeTestCase):
+	def test_fits_woods_curve_on_the_current_lactation(self):
+		# An earlier lactation, a 100 day dry period, then 120 days on y = 15 t^0.25 e^(-0.004 t)
+		cattle, days, qty = [], [], []
+		for n in range(220, 420):
+			cattle.append("_Test Cow A")
+			days.append(_days_back(n))
+			qty.append(10.0)
+		for t in range(1, 121):
+			cattle.append("_Test Cow A")
+			days.append(_days_back(120 - t))
+			qty.append(15 * t**0.25 * np.exp(-0.004 * t))
+
+		(cow,) = compute_lactation_metrics(cattle, days, qty, AS_OF)
+
+		self.assertEqual(cow["lactation_start"], str(AS_OF - timedelta(days=119)))
+		self.assertEqual(cow["days_in_milk"], 120)
+		self.assertAlmostEqual(cow["wood_a"], 15, places=3)
+		self.assertAlmostEqual(cow["wood_b"], 0.25, places=4)
+		self.assertAlmostEqual(cow["wood_c"], 0.004, places=5)
+		self.assertIn(cow["peak_dim"], (62, 63))
+		self.assertAlmostEqual(cow["fitted_peak_dim"], 62.5, places=2)
+
+	def test_rolling_averages_and_short_lactations(self):
+		cattle = ["_Test Cow B"] * 3 + ["_Test Cow C"]
+		days = [_days_back(0), _days_back(1), _days_back(20), _days_back(200)]
+		qty = [20.0, 10.0, 6.0, 5.0]
+
+		cow_b, cow_c = compute_lactation_metrics(cattle, days, qty, AS_OF)
+
+		# Per day, not per collection: 30 over 7 days; 36 over the 21 days of the lactation
+		self.assertAlmostEqual(cow_b["rolling_7_day_avg"], 30 / 7, places=5)
+		self.assertAlmostEqual(cow_b["rolling_30_day_avg"], 36 / 21, places=5)
+		self.assertEqual(cow_b["peak_yield"], 20.0)
+		# Too few days for a curve
+		self.assertIsNone(cow_b["wood_a"])
+		# Dry: last collection is older than the dry period
+		self.assertEqual(cow_c["days_in_milk"], 0)
+		self.assertIsNone(cow_c["rolling_30_day_avg"])
@@ -0,0 +1,44 @@
+# Copyright (c) 2026, Techsavanna Technology and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from farm_management_system.config.lineage import _coefficients, _relate, build_pedigree
+
+#        A           F
+#      /   \
+#     B     C
+#    / \    |
+#   D   E   G
+HERD = [
+	("A", 1, 14),
+	("B", 2, 7),
+	("D", 3, 4),
+	("E", 5, 6),
+	("C", 8, 11),
+	("G", 9, 10),
+	("F", 15, 16),
+]
+
+
+class TestLineage(FrappeTestCase):
+	def setUp(self):
+		self.pedigree = build_pedigree(HERD)
+
+	def _coefficient(self, dam, sire):
+		index = self.pedigree["index"]
+		related, dam_steps, sire_steps, common = _relate(self.pedigree, [index[dam]], [index[sire]])
+		common_ancestor = self.pedigree["names"][common[0, 0]] if related[0, 0] else None
+		return _coefficients(related, dam_steps, sire_steps)[0, 0], common_ancestor
+
+	def test_depths_and_ancestor_chains(self):
+		self.assertEqual(self.pedigree["depth"].tolist(), [0, 1, 2, 2, 1, 2, 0])
+		g = self.pedigree["index"]["G"]
+		chain = [self.pedigree["names"][i] for i in self.pedigree["ancestors"][g] if i >= 0]
+		self.assertEqual(chain, ["G", "C", "A"])
+
+	def test_coefficients(self):
+		self.assertEqual(self._coefficient("D", "E"), (0.125, "B"))  # half siblings
+		self.assertEqual(self._coefficient("B", "D"), (0.25, "B"))  # parent and offspring
+		self.assertEqual(self._coefficient("D", "G"), (0.03125, "A"))  # half first cousins
+		self.assertEqual(self._coefficient("D", "F"), (0.0, None))  # unrelated
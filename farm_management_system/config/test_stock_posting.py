@@ -0,0 +1,149 @@
+# Copyright (c) 2025, Techsavanna Technology and Contributors
+# See license.txt
+
+import multiprocessing
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt
+
+from farm_management_system.config.stock_posting import (
+	create_stock_ledger_entries_collections,
+	post_stock_ledger_entries,
+	post_stock_ledger_entry,
+)
+
+TEST_ITEMS = ["_Test Farm Posting Milk", "_Test Farm Posting Eggs"]
+TEST_VOUCHER_TYPE = "Cattle"
+WORKERS = 4
+POSTINGS_PER_WORKER = 10
+
+
+def _post_from_worker(site, sites_path, item_code, warehouse, voucher_no, use_bulk):
+	"""Runs in a separate process: post POSTINGS_PER_WORKER receipts of 1 unit, one commit each."""
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	frappe.set_user("Administrator")
+	try:
+		for _i in range(POSTINGS_PER_WORKER):
+			if use_bulk:
+				post_stock_ledger_entries([
+					{
+						"item_code": item_code,
+						"warehouse": warehouse,
+						"actual_qty": 1,
+						"voucher_type": TEST_VOUCHER_TYPE,
+						"voucher_no": voucher_no,
+						"default_rate": 10.0,
+					}
+				])
+			else:
+				post_stock_ledger_entry(
+					item_code, warehouse, 1,
+					voucher_type=TEST_VOUCHER_TYPE, voucher_no=voucher_no, default_rate=10.0
+				)
+			frappe.db.commit()
+	finally:
+		frappe.destroy()
+
+
+class TestStockPosting(FrappeTestCase):
+	def setUp(self):
+		company = frappe.defaults.get_global_default("company") or frappe.db.get_default("company")
+		self.warehouse = frappe.db.get_value("Warehouse", {"company": company, "is_group": 0}, "name")
+		if not self.warehouse:
+			self.skipTest("No leaf Warehouse available for the default company")
+
+		for item_code in TEST_ITEMS:
+			if not frappe.db.exists("Item", item_code):
+				frappe.get_doc({
+					"doctype": "Item",
+					"item_code": item_code,
+					"item_name": item_code,
+					"item_group": "All Item Groups",
+					"stock_uom": "Nos",
+					"is_stock_item": 1
+				}).insert(ignore_permissions=True)
+		self._delete_test_entries()
+		frappe.db.commit()
+
+	def tearDown(self):
+		self._delete_test_entries()
+		frappe.db.commit()
+
+	def _delete_test_entries(self):
+		frappe.db.delete("Stock Ledger Entry", {"item_code": ["in", TEST_ITEMS], "warehouse": self.warehouse})
+
+	def _balances(self, item_code):
+		return sorted(flt(qty) for qty in frappe.get_all(
+			"Stock Ledger Entry",
+			filters={"item_code": item_code, "warehouse": self.warehouse},
+			pluck="qty_after_transaction"
+		))
+
+	def test_concurrent_postings_keep_balances(self):
+		"""Several processes posting the same items at once must not lose any quantity."""
+		ctx = multiprocessing.get_context("spawn")
+		processes = []
+		for worker in range(WORKERS):
+			for item_code in TEST_ITEMS:
+				processes.append(ctx.Process(
+					target=_post_from_worker,
+					args=(
+						frappe.local.site,
+						frappe.local.sites_path,
+						item_code,
+						self.warehouse,
+						f"_T-STRESS-{worker}",
+						bool(worker % 2),
+					)
+				))
+
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join(timeout=300)
+			self.assertEqual(process.exitcode, 0)
+
+		# Every posting must have chained on the previous one: balances 1, 2, ..., N
+		expected = WORKERS * POSTINGS_PER_WORKER
+		for item_code in TEST_ITEMS:
+			self.assertEqual(self._balances(item_code), [flt(i) for i in range(1, expected + 1)])
+
+	def test_bulk_postings_have_a_deterministic_latest_entry(self):
+		entry = {
+			"item_code": TEST_ITEMS[0],
+			"warehouse": self.warehouse,
+			"actual_qty": 1,
+			"voucher_type": TEST_VOUCHER_TYPE,
+			"voucher_no": "_T-BULK",
+			"default_rate": 10.0,
+		}
+		posted = post_stock_ledger_entries([entry, entry, entry])
+
+		latest = frappe.db.sql(
+			"""
+			select name, qty_after_transaction from `tabStock Ledger Entry`
+			where item_code = %s and warehouse = %s
+			order by posting_datetime desc, creation desc
+			limit 1
+			""",
+			(TEST_ITEMS[0], self.warehouse),
+			as_dict=True
+		)[0]
+		self.assertEqual(latest.name, posted[-1]["sle_name"])
+		self.assertEqual(flt(latest.qty_after_transaction), 3)
+
+	def test_unresolvable_products_fail_only_their_rows(self):
+		results = create_stock_ledger_entries_collections(
+			[
+				{"animal_product": "_Test Missing Farm Product", "quantity_collected": 2, "reference_name": "_T-1"},
+				{"animal_product": "_Test Missing Farm Product", "quantity_collected": 0, "reference_name": "_T-2"},
+			],
+			reference_doctype=TEST_VOUCHER_TYPE
+		)
+
+		self.assertEqual(len(results), 1)
+		self.assertEqual(results[0]["row"], 0)
+		self.assertFalse(results[0]["submitted"])
+		self.assertTrue(results[0]["error"])
@@ -0,0 +1,116 @@
+import frappe
+from frappe import _
+
+from farm_management_system.config.caching import clear_cached_values, get_cached_value
+
+WAREHOUSE_CACHE_NAMESPACE = "default_warehouse"
+
+
+def _get_warehouse_companies(names):
+    """Return {warehouse: company} for the given warehouse names that exist (one query)."""
+    names = [n for n in names if n]
+    if not names:
+        return {}
+    rows = frappe.get_all("Warehouse", filters={"name": ["in", names]}, fields=["name", "company"])
+    return {row.name: row.company for row in rows}
+
+
+def _load_default_warehouse(item_name, target_company):
+    """
+    Priority:
+      1) Item Default rows where company matches target_company
+      2) Warehouse named "Stores - {abbr}" using Company.abbr (if exists and belongs to target_company)
+      3) Global default warehouse (site / system)
+      4) First Warehouse that belongs to target_company
+    Returns None when nothing matches.
+    """
+    item_defaults = frappe.get_all(
+        "Item Default",
+        filters={"parent": item_name},
+        fields=["company", "default_warehouse"],
+        order_by="idx asc"
+    )
+
+    abbr = None
+    if target_company:
+        abbr = frappe.get_value("Company", target_company, "abbr")
+    stores_wh = f"Stores - {abbr}" if abbr else None
+    global_wh = frappe.defaults.get_global_default("warehouse") or frappe.db.get_default("warehouse")
+
+    # Existence and company of every candidate warehouse in a single query
+    wh_company = _get_warehouse_companies(
+        [row.get("default_warehouse") for row in item_defaults] + [stores_wh, global_wh]
+    )
+
+    # 1) Item Default rows (prefer a default that matches the target_company)
+    if target_company:
+        for row in item_defaults:
+            row_company = row.get("company")
+            row_wh = row.get("default_warehouse")
+            if row_wh in wh_company and (not row_company or row_company == target_company):
+                if not wh_company[row_wh] or wh_company[row_wh] == target_company:
+                    return row_wh
+    # fallback to any item_default with a warehouse (first one that exists)
+    for row in item_defaults:
+        row_wh = row.get("default_warehouse")
+        if row_wh in wh_company:
+            w_company = wh_company[row_wh]
+            if not w_company or (target_company and w_company == target_company):
+                return row_wh
+
+    # 2) Company-based warehouse "Stores - {abbr}"
+    if stores_wh in wh_company:
+        w_company = wh_company[stores_wh]
+        if not w_company or w_company == target_company:
+            return stores_wh
+        frappe.logger("warehouse_resolution").info(
+            "Warehouse %s exists but belongs to company %s (expected %s); skipping",
+            stores_wh, w_company, target_company
+        )
+
+    # 3) Global default warehouse (site / system)
+    if global_wh in wh_company:
+        w_company = wh_company[global_wh]
+        if not w_company or (target_company and w_company == target_company):
+            return global_wh
+
+    # 4) First warehouse that belongs to the company (best-effort)
+    if target_company:
+        whs = frappe.get_all("Warehouse", filters={"company": target_company}, fields=["name"], limit_page_length=1)
+        if whs:
+            return whs[0].name
+
+    return None
+
+
+def get_default_warehouse(item_name, target_company=None):
+    """
+    Resolve the warehouse to post `item_name` into for `target_company`.
+
+    The result is cached per (item, company) in process memory and Redis until an Item
+    (and so its Item Default rows), Warehouse, Company or the global defaults change.
+    Throws an actionable ValidationError when no warehouse can be determined.
+    """
+    if not item_name:
+        return None
+
+    warehouse = get_cached_value(
+        WAREHOUSE_CACHE_NAMESPACE,
+        (item_name, target_company),
+        lambda: _load_default_warehouse(item_name, target_company)
+    )
+    if warehouse:
+        return warehouse
+
+    msg = _("Could not determine a warehouse for Item {0}. Please ensure one of the following:").format(item_name)
+    msg += "<ul>"
+    msg += "<li>" + _("Create an Item Default row (Item → Item Default) with a default warehouse for the correct company.") + "</li>"
+    msg += "<li>" + _("Create a Warehouse named {0} where {1} is the Company abbreviation (Company.abbr).").format(f"<strong>Stores - {{abbr}}</strong>", "abbr") + "</li>"
+    msg += "<li>" + _("Set a global Default Warehouse in Setup → Settings (Site Defaults).") + "</li>"
+    msg += "</ul>"
+    frappe.throw(msg, frappe.ValidationError)
+
+
+def clear_warehouse_cache(doc=None, method=None):
+    """Item / Warehouse / Company / Global Defaults doc event: drop every cached resolution."""
+    clear_cached_values(WAREHOUSE_CACHE_NAMESPACE)
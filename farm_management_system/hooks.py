@@ -238,6 +238,103 @@ after_migrate = [
 # 		"on_trash": "method"
 # 	}
 # }
+doc_events = {
+    "Item": {
+        "on_update": [
+            "farm_management_system.config.item_resolver.clear_item_cache",
+            "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_search.clear_feed_search_index_for_item"
+        ],
+        "on_trash": [
+            "farm_management_system.config.item_resolver.clear_item_cache",
+            "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_search.clear_feed_search_index"
+        ],
+        "after_rename": [
+            "farm_management_system.config.item_resolver.clear_item_cache",
+            "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_search.clear_feed_search_index"
+        ]
+    },
+    "Animal Feeds": {
+        "on_update": [
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_uoms.clear_feed_uom_index",
+            "farm_management_system.config.feed_search.clear_feed_search_index"
+        ],
+        "on_trash": [
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_uoms.clear_feed_uom_index",
+            "farm_management_system.config.feed_search.clear_feed_search_index"
+        ],
+        "after_rename": [
+            "farm_management_system.config.feed_catalogue.clear_feed_catalogue_cache",
+            "farm_management_system.config.feed_uoms.clear_feed_uom_index",
+            "farm_management_system.config.feed_search.clear_feed_search_index"
+        ]
+    },
+    "Warehouse": {
+        "on_update": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+        "on_trash": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+        "after_rename": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache"
+    },
+    "Company": {
+        "on_update": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache",
+        "on_trash": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache"
+    },
+    "Global Defaults": {
+        "on_update": "farm_management_system.config.warehouse_resolver.clear_warehouse_cache"
+    },
+    "Item Price": {
+        "on_update": "farm_management_system.config.price_cache.refresh_item_price_cache",
+        "on_trash": "farm_management_system.config.price_cache.refresh_item_price_cache"
+    },
+    "Treatment and Vaccination Logs": {
+        "on_update": "farm_management_system.config.charts.clear_treatment_chart_cache",
+        "on_submit": "farm_management_system.config.charts.clear_treatment_chart_cache",
+        "on_update_after_submit": "farm_management_system.config.charts.clear_treatment_chart_cache",
+        "on_cancel": "farm_management_system.config.charts.clear_treatment_chart_cache",
+        "on_trash": "farm_management_system.config.charts.clear_treatment_chart_cache"
+    },
+    "Cattle": {
+        "on_update": [
+            "farm_management_system.config.lactation.clear_lactation_cache",
+            "farm_management_system.config.lineage.clear_pedigree_cache"
+        ],
+        "on_trash": [
+            "farm_management_system.config.lactation.clear_lactation_cache",
+            "farm_management_system.config.lineage.clear_pedigree_cache"
+        ],
+        "after_rename": "farm_management_system.config.lineage.clear_pedigree_cache"
+    },
+    "Purchase Receipt": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    },
+    "Purchase Invoice": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    },
+    "Delivery Note": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    },
+    "Sales Invoice": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    },
+    "Stock Entry": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    },
+    "Stock Reconciliation": {
+        "on_submit": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher",
+        "on_cancel": "farm_management_system.config.stock_balance.update_stock_balances_from_voucher"
+    }
+}
 
 # Scheduled Tasks
 # ---------------
@@ -0,0 +1,20 @@
+import frappe
+from frappe.utils.nestedset import rebuild_tree
+
+from farm_management_system.config.lineage import clear_pedigree_cache
+
+
+def execute():
+    # Cattle was saved as a plain document before, so lft / rgt were never set
+    rebuild_tree("Cattle")
+
+    # Animals with recorded offspring are tree groups
+    frappe.db.sql(
+        """
+        update `tabCattle` set is_group = 1
+        where name in (select parent_cattle from (
+            select distinct parent_cattle from `tabCattle` where coalesce(parent_cattle, '') != ''
+        ) as parents)
+        """
+    )
+    clear_pedigree_cache()
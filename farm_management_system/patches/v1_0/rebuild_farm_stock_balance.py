@@ -0,0 +1,6 @@
+from farm_management_system.config.stock_balance import rebuild_stock_balances
+
+
+def execute():
+    # Seed Farm Stock Balance from the existing Stock Ledger
+    rebuild_stock_balances()
@@ -0,0 +1,6 @@
+from farm_management_system.config.feed_totals import rebuild_batch_feed_totals
+
+
+def execute():
+    # Seed Poultry Batch Feed Summary and total_water_litres from the existing Nourishment Logs
+    rebuild_batch_feed_totals()
@@ -0,0 +1,6 @@
+from farm_management_system.savanna_farm_suite.doctype.cattle_shed.cattle_shed import recount_cattle_sheds
+
+
+def execute():
+    # Seed Cattle Shed.animal_count from the existing Cattle records
+    recount_cattle_sheds()
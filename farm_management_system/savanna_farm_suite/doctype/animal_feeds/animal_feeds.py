@@ -6,6 +6,9 @@ from frappe.model.document import Document
 
 import frappe
 from frappe import _
+from frappe.utils import cint
+
+from farm_management_system.config.feed_search import match_feed, search_feeds
 
 
 class AnimalFeeds(Document):
@@ -81,21 +84,38 @@ def get_animal_categories(doctype, txt, searchfield, start, page_len, filters):
     return categories
 
 
+def _get_feed_item_code(feed_name):
+    """
+    Item of a feed: the Item whose item_code is the feed name, else the Item of the
+    best fuzzy match among the indexed feeds.
+    """
+    item_code = frappe.db.get_value("Item", {"item_code": feed_name.strip()}, "name")
+    if item_code:
+        return item_code
+    match = match_feed(feed_name)
+    return match["item_code"] if match else None
+
+
+@frappe.whitelist()
+def search_animal_feeds(txt, limit=10):
+    """
+    Autocomplete for feeds: up to `limit` Animal Feeds matching `txt` by docname, feed name
+    or Item code, best match first, as [{name, feed_name, item_code, score}].
+    """
+    return search_feeds(txt, limit=min(cint(limit) or 10, 50))
+
+
 @frappe.whitelist()
 def get_purchase_history(feed_name):
     if not feed_name:
         return []
     
-    # Step 1: Find Items where item_code matches feed_name (%LIKE%)
-    items = frappe.get_all(
-        "Item",
-        filters=[["item_code", "like", f"%{feed_name}%"]],
-        fields=["name"]
-    )
-    if not items:
+    # Step 1: Find the feed's Item
+    item_code = _get_feed_item_code(feed_name)
+    if not item_code:
         return []
     
-    item_codes = [item.name for item in items]
+    item_codes = [item_code]
     
     # Step 2: Find Purchase Receipt Items where item_code matches
     pr_items = frappe.get_all(
@@ -124,18 +144,10 @@ def get_item_stock_history(feed_name):
     if not feed_name:
         return {}
 
-    # Find Items where item_code like feed_name
-    items = frappe.get_all(
-        "Item",
-        filters=[["item_code", "like", f"%{feed_name}%"]],
-        fields=["name"]
-    )
-    if not items:
+    item_code = _get_feed_item_code(feed_name)
+    if not item_code:
         return {}
 
-    # Use the first matched item (can be expanded later if you want multiple item series)
-    item_code = items[0].name
-
     # Fetch Stock Ledger Entry for that item, ordered ascending by posting_datetime (oldest -> newest)
     sle_list = frappe.get_all(
         "Stock Ledger Entry",
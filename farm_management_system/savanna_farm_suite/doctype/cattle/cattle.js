@@ -134,9 +134,8 @@ function renderFeedingChart(frm) {
     fetchUOMForFeeds(tooltipData).then(uomData => {
         // Update tooltipData with UOM information
         tooltipData.forEach(item => {
-            // Get the first UOM from the array or default to 'units'
-            const uoms = uomData[item.feed_code] || [];
-            item.uom = uoms.length > 0 ? uoms[0].uom : 'units';
+            // UOM of the feed or default to 'units'
+            item.uom = uomData[item.feed_code] || 'units';
         });
 
         // Render the chart with the updated data
@@ -161,7 +160,7 @@ function fetchUOMForFeeds(tooltipData) {
         frappe.call({
             method: 'farm_management_system.savanna_farm_suite.doctype.cattle.cattle.get_animal_feed_uoms',
             args: {
-                feeds: feedCodes.join(',')
+                feeds: JSON.stringify(feedCodes)
             },
             callback: function(response) {
                 if (response.message) {
@@ -2,108 +2,127 @@
 # For license information, please see license.txt
 
 # import frappe
-from frappe.model.document import Document
+from frappe.utils.nestedset import NestedSet
 import frappe
 from frappe import _
 from frappe.utils import getdate
-from multiavatar.multiavatar import multiavatar
-import base64
+from farm_management_system.config.avatar_store import queue_cattle_avatar
+from farm_management_system.savanna_farm_suite.doctype.cattle_shed.cattle_shed import adjust_shed_head_count
+
+CATTLE_ASSET_CATEGORY = "Default Livestock Category"
+CATTLE_ASSET_LOCATION = "Default"
+
+class Cattle(NestedSet):
+    nsm_parent_field = "parent_cattle"
 
-class Cattle(Document):
     def after_insert(self):
+        # import_cattle creates assets in batches and defers avatars / shed counts
+        if self.flags.bulk_onboarding:
+            return
+
         # Create Asset if marked as fixed asset
         if self.is_this_a_fixed_asset == 1:
             self.create_asset()
         
-        # Generate avatar if no image exists
+        # Generate avatar if no image exists (in a background job after commit)
         if not self.image_of_animal:
-            self.generate_avatar()
-        if self.cow_shed:
-            shed = frappe.get_doc("Cattle Shed", self.cow_shed)
-            current_count_str = shed.current_animal_count or "0 Cows"
-            try:
-                number = int(current_count_str.split()[0])
-            except (ValueError, IndexError):
-                number = 0
-
-            new_count = number + 1
-            shed.current_animal_count = f"{new_count} Cows"
-            shed.save(ignore_permissions=True)
+            queue_cattle_avatar(self.name)
+        if self._counts_in_shed():
+            adjust_shed_head_count(self.cow_shed, 1)
+
+    def on_update(self):
+        # Keep lft / rgt in step with parent_cattle; an animal with offspring is a tree group
+        super().on_update()
+        if self.parent_cattle:
+            frappe.db.set_value("Cattle", self.parent_cattle, "is_group", 1, update_modified=False)
+
+        previous = self.get_doc_before_save()
+        if not previous:
+            return
+        if previous.parent_cattle and previous.parent_cattle != self.parent_cattle:
+            update_cattle_is_group(previous.parent_cattle)
+
+        # Transfers between sheds and culls move the animal out of (or into) a head count
+        was_counted = previous.cow_shed if previous._counts_in_shed() else None
+        is_counted = self.cow_shed if self._counts_in_shed() else None
+        if was_counted != is_counted:
+            adjust_shed_head_count(was_counted, -1)
+            adjust_shed_head_count(is_counted, 1)
+
+    def on_trash(self):
+        # Every animal without a recorded parent is a root of the herd tree. An animal with
+        # recorded offspring cannot be deleted (its lineage would be lost); culling only
+        # sets has_been_culled, so culled animals stay in the tree.
+        super().on_trash(allow_root_deletion=True)
+        if self.parent_cattle:
+            update_cattle_is_group(self.parent_cattle, excluding=self.name)
+        if self._counts_in_shed():
+            adjust_shed_head_count(self.cow_shed, -1)
+
+    def _counts_in_shed(self):
+        """Whether this animal is part of its shed's head count (tied to a shed, not culled)."""
+        return bool(self.get("cow_shed")) and not self.get("has_been_culled")
 
     def create_asset(self):
         """Create Item and Asset records for the cattle"""
         try:
-            # Create Item first
-            item = frappe.get_doc({
-                "doctype": "Item",
-                "item_code": self.name,
-                "item_name": self.name,
-                "item_group": "All Item Groups",
-                "stock_uom": "Nos",
-                "is_stock_item": 0,
-                "is_fixed_asset": 1,
-                "asset_category": "Default Livestock Category"
-            })
-            item.insert(ignore_permissions=True)
-            
-            # Get company from Global Defaults
             company = frappe.db.get_single_value('Global Defaults', 'default_company')
-            
-            # Create Asset
-            asset = frappe.get_doc({
-                "doctype": "Asset",
-                "company": company,
-                "item_code": item.name,
-                "item_name": item.item_name,
-                "asset_owner": "Company",
-                "asset_owner_company": company,
-                "is_existing_asset": 1,
-                "asset_name": item.item_name,
-                "location": "Default",
-                "purchase_date": getdate(self.specify_the_date_of_purchase),
-                "available_for_use_date": getdate(self.specify_the_date_of_purchase),
-                "gross_purchase_amount": self.specify_net_purchase_amount,
-                "asset_quantity": 1
-            })
-            asset.insert(ignore_permissions=True)
-            asset.submit()
-            
+            asset_name = create_cattle_asset(
+                self.name, self.specify_the_date_of_purchase, self.specify_net_purchase_amount, company
+            )
+
             # Play success sound
             frappe.publish_realtime('play_sound', {'sound': 'success'})
             
-            return asset.name
+            return asset_name
             
         except Exception as e:
             frappe.log_error(_("Error creating asset for cattle {0}: {1}").format(self.name, str(e)))
             frappe.throw(_("Failed to create asset record. Please check error logs."))
-    
-    def generate_avatar(self):
-        """Generate a unique avatar for the cattle and attach it."""
-        try:
-            # Generate SVG code using multiavatar
-            svg_code = multiavatar("A cow", None, None)
-
-            # Create a File document for the SVG
-            file_doc = frappe.get_doc({
-                "doctype": "File",
-                "file_name": f"avatar-{self.name}.svg",
-                "attached_to_doctype": "Cattle",
-                "attached_to_name": self.name,
-                "content": svg_code,
-                "is_private": 0
-            })
-            file_doc.insert(ignore_permissions=True)
 
-            # Update the image_of_animal field with the new file's URL
-            self.db_set("image_of_animal", file_doc.file_url)
 
-            frappe.msgprint(_("Avatar generated for {0}").format(self.name))
+def update_cattle_is_group(cattle, excluding=None):
+    """Mark a Cattle as a tree group exactly while it has offspring (other than `excluding`)."""
+    filters = {"parent_cattle": cattle}
+    if excluding:
+        filters["name"] = ["!=", excluding]
+    has_offspring = frappe.db.exists("Cattle", filters)
+    frappe.db.set_value("Cattle", cattle, "is_group", 1 if has_offspring else 0, update_modified=False)
+
+
+def create_cattle_asset(cattle_name, purchase_date, purchase_amount, company):
+    """Create the fixed-asset Item and the submitted Asset of a cattle; returns the Asset name."""
+    # Create Item first
+    item = frappe.get_doc({
+        "doctype": "Item",
+        "item_code": cattle_name,
+        "item_name": cattle_name,
+        "item_group": "All Item Groups",
+        "stock_uom": "Nos",
+        "is_stock_item": 0,
+        "is_fixed_asset": 1,
+        "asset_category": CATTLE_ASSET_CATEGORY
+    })
+    item.insert(ignore_permissions=True)
 
-        except Exception as e:
-            frappe.log_error(
-                _("Error generating avatar for {0}: {1}").format(self.name, str(e)),
-                "Avatar Generation"
-            )
+    asset = frappe.get_doc({
+        "doctype": "Asset",
+        "company": company,
+        "item_code": item.name,
+        "item_name": item.item_name,
+        "asset_owner": "Company",
+        "asset_owner_company": company,
+        "is_existing_asset": 1,
+        "asset_name": item.item_name,
+        "location": CATTLE_ASSET_LOCATION,
+        "purchase_date": getdate(purchase_date),
+        "available_for_use_date": getdate(purchase_date),
+        "gross_purchase_amount": purchase_amount,
+        "asset_quantity": 1
+    })
+    asset.insert(ignore_permissions=True)
+    asset.submit()
+    return asset.name
 
 
 import json
@@ -114,31 +133,30 @@ from frappe.utils import getdate
 import json
 import frappe
 from frappe.utils import getdate
-
-def _resolve_feed_docname(feed):
-    """Try multiple strategies to resolve a feed identifier to an Animal Feeds docname."""
+from farm_management_system.config.feed_uoms import (
+    DEFAULT_FEED_UOM,
+    get_feed_uom,
+    get_feed_uom_index,
+    resolve_feed_alias,
+)
+from farm_management_system.config.feed_search import match_feed
+
+def _resolve_feed_docname(feed, index=None):
+    """Resolve a feed identifier (docname or feed name) to an Animal Feeds docname."""
     if not feed:
         return None
 
-    # 1) If the feed is already a docname, try fast path
-    try:
-        frappe.get_doc("Animal Feeds", feed)
-        return feed
-    except Exception:
-        pass
-
-    # 2) Try exact matches on common fields
-    for field in ("feed_name", "feed_code", "item_code", "name"):
-        val = frappe.db.get_value("Animal Feeds", {field: feed}, "name")
-        if val:
-            return val
-
-    # 3) Fuzzy search on feed_name (best effort)
-    rows = frappe.get_all("Animal Feeds", filters=[["feed_name", "like", f"%{feed}%"]], fields=["name"], limit_page_length=1)
-    if rows:
-        return rows[0].name
-
-    # 4) give up
+    # 1) Exact docname / feed_name from the feed UOM index
+    docname = resolve_feed_alias(feed, index)
+    if docname:
+        return docname
+
+    # 2) Best fuzzy match on docname / feed name / item code
+    match = match_feed(feed)
+    if match:
+        return match["name"]
+
+    # 3) give up
     frappe.log_error(message=f"Could not resolve Animal Feeds for: {feed}", title="get_animal_feed_uoms: unresolved feed")
     return None
 
@@ -146,92 +164,29 @@ def _resolve_feed_docname(feed):
 @frappe.whitelist()
 def get_animal_feed_uoms(feeds, fed_on=None):
     """
-    feeds: JSON string or list of feed identifiers (docname or human label)
-    fed_on: optional date string (used to pick the correct uom row)
+    feeds: JSON list, comma separated string or list of feed identifiers (docname or human label)
+    fed_on: accepted for existing callers; Animal Feeds UOMs are not dated, so it is unused
     Returns: dict { original_feed_input: uom_string }
+
+    UOMs come from the cached feed UOM index, so each feed costs a dictionary lookup.
     """
     if isinstance(feeds, str):
         try:
             feeds = json.loads(feeds)
         except Exception:
-            feeds = [feeds]
+            feeds = [f.strip() for f in feeds.split(",") if f.strip()]
 
+    if isinstance(feeds, str):
+        feeds = [feeds]
     if not isinstance(feeds, list):
         feeds = list(feeds)
 
-    fed_date = None
-    if fed_on:
-        try:
-            fed_date = getdate(fed_on)
-        except Exception:
-            fed_date = None
-
+    index = get_feed_uom_index()
     result = {}
     for feed in feeds:
-        uom = "units"  # fallback
-        try:
-            docname = _resolve_feed_docname(feed)
-            if not docname:
-                # unresolved: return default units for this feed key
-                result[feed] = uom
-                continue
-
-            doc = frappe.get_doc("Animal Feeds", docname)
-
-            # 1) try common single-field UOMs on the doc
-            for attr in ("default_uom", "uom", "unit_of_measure", "unit"):
-                if getattr(doc, attr, None):
-                    uom = getattr(doc, attr)
-                    break
-
-            # 2) if still not found, scan child tables and prefer one with date <= fed_on (if provided)
-            if uom == "units":
-                chosen_uom = None
-                best_date = None
-
-                for df in doc.meta.get("fields", []):
-                    if df.fieldtype == "Table":
-                        child_rows = doc.get(df.fieldname) or []
-                        if not child_rows:
-                            continue
-
-                        for row in child_rows:
-                            # try to locate a uom-like field on the child
-                            candidate_uom = None
-                            for candidate_field in ("uom", "uom_name", "unit", "unit_of_measure", "selected_uom"):
-                                if row.get(candidate_field):
-                                    candidate_uom = row.get(candidate_field)
-                                    break
-                            if not candidate_uom:
-                                continue
-
-                            # try to find a date on the child row
-                            row_date = None
-                            for date_field in ("valid_from", "from_date", "applicable_from", "start_date", "date"):
-                                if row.get(date_field):
-                                    try:
-                                        row_date = getdate(row.get(date_field))
-                                    except Exception:
-                                        row_date = None
-                                    break
-
-                            if fed_date and row_date:
-                                if row_date <= fed_date:
-                                    if best_date is None or row_date > best_date:
-                                        chosen_uom = candidate_uom
-                                        best_date = row_date
-                            elif not fed_date:
-                                chosen_uom = candidate_uom
-                                break
-
-                if chosen_uom:
-                    uom = chosen_uom
-
-        except Exception as e:
-            # defensive: log the exception and continue; return 'units' for this feed
-            frappe.log_error(message=f"Error resolving UOM for feed {feed}: {str(e)}", title="get_animal_feed_uoms: error")
-
-        result[feed] = uom or "units"
+        docname = _resolve_feed_docname(feed, index)
+        # unresolved feeds get the default units
+        result[feed] = get_feed_uom(docname, index) if docname else DEFAULT_FEED_UOM
 
     return result
 
@@ -289,9 +244,18 @@ def create_collection_entry(cattle=None, date_of_collection=None, rows=None):
         pb.save(ignore_permissions=True)
         return pb
 
+    # Helper: map a collection row to a batch SLE row referencing its cattle
+    def _sle_row(r, cattle_name):
+        return {
+            "animal_product": r.get("animal_product") or r.get("animal_products") or r.get("product"),
+            "quantity_collected": r.get("quantity_collected") or 0.0,
+            "reference_name": cattle_name
+        }
+
     # If a top-level cattle value was passed and rows do NOT contain per-row 'cattle',
     # assume rows belong to that single cattle.
     sle_results = []
+    sle_rows = []
 
     # Determine whether rows are grouped by 'cattle' key
     rows_have_cattle_key = any((isinstance(r, dict) and r.get("cattle")) for r in rows)
@@ -300,15 +264,9 @@ def create_collection_entry(cattle=None, date_of_collection=None, rows=None):
         # All rows belong to this single cattle
         pb = _append_rows_to_cattle(cattle, rows)
 
-        # Create SLEs for each row referencing this cattle
+        # Queue SLEs for each row referencing this cattle
         for r in rows:
-            try:
-                product_collected = r.get("animal_product") or r.get("animal_products") or r.get("product")
-                qty = flt(r.get("quantity_collected") or 0.0)
-                sle = create_stock_ledger_entry_collections(product_collected, qty, reference_doctype="Cattle", reference_name=cattle)
-                sle_results.append(sle)
-            except Exception as e:
-                frappe.log_error(f"create_stock_ledger_entry_collections failed for {product_collected}: {e}", "create_collection_entry")
+            sle_rows.append(_sle_row(r, cattle))
     else:
         # Group rows by cattle field: rows must include 'cattle'
         grouped = {}
@@ -331,44 +289,41 @@ def create_collection_entry(cattle=None, date_of_collection=None, rows=None):
                 continue
 
             for r in group_rows:
-                try:
-                    product_collected = r.get("animal_product") or r.get("animal_products") or r.get("product")
-                    qty = flt(r.get("quantity_collected") or 0.0)
-                    sle = create_stock_ledger_entry_collections(product_collected, qty, reference_doctype="Cattle", reference_name=cattle_name)
-                    sle_results.append(sle)
-                except Exception as e:
-                    frappe.log_error(f"create_stock_ledger_entry_collections failed for {product_collected}: {e}", "create_collection_entry")
+                sle_rows.append(_sle_row(r, cattle_name))
+
+    # Create the Stock Ledger Entries for every collected row in one batch
+    try:
+        sle_results = create_stock_ledger_entries_collections(sle_rows, reference_doctype="Cattle")
+    except Exception as e:
+        frappe.log_error(f"create_stock_ledger_entries_collections failed: {e}", "create_collection_entry")
 
     # commit once at the end (we already saved individual docs, but a final commit ensures consistency)
     frappe.db.commit()
     return {"updated": True, "sle_results": sle_results}
 
 
+from farm_management_system.config.item_resolver import resolve_item
+from farm_management_system.config.price_cache import get_selling_rate
+from farm_management_system.config.warehouse_resolver import get_default_warehouse
+
 # ---- Resolve Item from animal_product (returns item_code_value and item_name) ----
 def _resolve_item_from_animal_product(animal_product_name):
     """
     Return (item_code_value, item_name, item_doc)
     item_code_value -> what Stock Ledger Entry.item_code should contain
     item_name -> the Item doctype name (frappe.get_doc key)
-    item_doc -> the Item doc
+    item_doc -> cached Item fields (name, item_code, stock_uom, valuation_rate, standard_rate)
     """
     if not animal_product_name:
         frappe.throw(_("animal_product is required"), frappe.ValidationError)
 
-    # First try matching item_code (common pattern)
-    items = frappe.get_all("Item", filters={"item_code": animal_product_name},
-                           fields=["name", "item_code"], limit_page_length=1)
-    if not items:
-        # fallback: maybe the Item name equals the animal_product_name
-        items = frappe.get_all("Item", filters={"name": animal_product_name},
-                               fields=["name", "item_code"], limit_page_length=1)
-
-    if not items:
+    # Matches item_code first, then Item name (cached until an Item changes)
+    item_doc = resolve_item(animal_product_name)
+    if not item_doc:
         frappe.throw(_("No Item found with item_code or name '{0}'.").format(animal_product_name))
 
-    item_name = items[0]["name"]
-    item_code_value = items[0].get("item_code") or item_name
-    item_doc = frappe.get_doc("Item", item_name)
+    item_name = item_doc.name
+    item_code_value = item_doc.get("item_code") or item_name
     return item_code_value, item_name, item_doc
 
 
@@ -388,7 +343,7 @@ def _determine_target_company(item_doc=None):
 
 def _get_default_warehouse_for_item(item_name, item_doc=None):
     """
-    Resolve the warehouse to use for an Item.
+    Resolve the warehouse to use for an Item (cached per item and target company).
     Priority:
       1) Item Default rows where company matches target_company
       2) Warehouse named "Stores - {abbr}" using Company.abbr (if exists and belongs to target_company)
@@ -398,104 +353,21 @@ def _get_default_warehouse_for_item(item_name, item_doc=None):
     """
     if not item_name:
         return None
-
-    # ensure we have the item_doc
-    if item_doc is None:
-        try:
-            item_doc = frappe.get_doc("Item", item_name)
-        except Exception:
-            item_doc = None
-
-    target_company = _determine_target_company(item_doc)
-
-    # 1) Look at Item Default rows (prefer a default that matches the target_company)
-    item_defaults = frappe.get_all(
-        "Item Default",
-        filters={"parent": item_name},
-        fields=["company", "default_warehouse"],
-        order_by="idx asc"
-    )
-    # Try to find a row where company == target_company and default_warehouse present
-    if item_defaults:
-        if target_company:
-            for row in item_defaults:
-                row_company = row.get("company")
-                row_wh = row.get("default_warehouse")
-                if row_wh and (not row_company or row_company == target_company):
-                    # ensure warehouse exists and belongs to same company (or empty)
-                    if frappe.db.exists("Warehouse", row_wh):
-                        w_company = frappe.get_value("Warehouse", row_wh, "company")
-                        if not w_company or w_company == target_company:
-                            return row_wh
-        # fallback to any item_default with a warehouse (first one that exists)
-        for row in item_defaults:
-            row_wh = row.get("default_warehouse")
-            if row_wh and frappe.db.exists("Warehouse", row_wh):
-                w_company = frappe.get_value("Warehouse", row_wh, "company")
-                # accept if either no company set on Warehouse or it equals target_company
-                if not w_company or (target_company and w_company == target_company):
-                    return row_wh
-
-    # 2) Company-based warehouse "Stores - {abbr}"
-    if target_company:
-        abbr = frappe.get_value("Company", target_company, "abbr") or frappe.get_value("Company", target_company, "abbreviation")
-        if abbr:
-            warehouse_name = f"Stores - {abbr}"
-            if frappe.db.exists("Warehouse", warehouse_name):
-                w_company = frappe.get_value("Warehouse", warehouse_name, "company")
-                # accept if Warehouse has no company set OR matches target_company
-                if not w_company or w_company == target_company:
-                    return warehouse_name
-                else:
-                    # If the warehouse exists but belongs to a different company, do not use it.
-                    frappe.logger("warehouse_resolution").info(
-                        "Warehouse %s exists but belongs to company %s (expected %s); skipping",
-                        warehouse_name, w_company, target_company
-                    )
-
-    # 3) Global default warehouse (site / system)
-    global_wh = frappe.defaults.get_global_default("warehouse") or frappe.db.get_default("warehouse")
-    if global_wh and frappe.db.exists("Warehouse", global_wh):
-        w_company = frappe.get_value("Warehouse", global_wh, "company")
-        if not w_company or (target_company and w_company == target_company):
-            return global_wh
-
-    # 4) First warehouse that belongs to the company (best-effort)
-    if target_company:
-        whs = frappe.get_all("Warehouse", filters={"company": target_company}, fields=["name"], limit_page_length=1)
-        if whs:
-            return whs[0].name
-
-    # 5) Unable to resolve; raise clear actionable error
-    msg = _("Could not determine a warehouse for Item {0}. Please ensure one of the following:").format(item_name)
-    msg += "<ul>"
-    msg += "<li>" + _("Create an Item Default row (Item → Item Default) with a default warehouse for the correct company.") + "</li>"
-    msg += "<li>" + _("Create a Warehouse named {0} where {1} is the Company abbreviation (Company.abbr).").format(f"<strong>Stores - {{abbr}}</strong>", "abbr") + "</li>"
-    msg += "<li>" + _("Set a global Default Warehouse in Setup → Settings (Site Defaults).") + "</li>"
-    msg += "</ul>"
-    frappe.throw(msg, frappe.ValidationError)
+    return get_default_warehouse(item_name, _determine_target_company(item_doc))
 
 
 # ---- Main SLE creation function (uses the above helpers) ----
 import frappe
 from frappe.utils import flt, nowdate, nowtime
-from erpnext.accounts.utils import get_fiscal_year
+from farm_management_system.config.stock_posting import create_stock_ledger_entries_collections, post_stock_ledger_entry
 
 # Helper to get selling rate from Item Price
 def _get_selling_rate(item_code):
     """
     Fetch the price_list_rate from Item Price where selling=1, ordered by valid_from desc.
+    Served from the price cache, which Item Price saves keep up to date.
     """
-    item_prices = frappe.get_all(
-        "Item Price",
-        filters={"item_code": item_code, "selling": 1},
-        fields=["price_list_rate"],
-        order_by="valid_from desc, modified desc",
-        limit=1
-    )
-    if item_prices:
-        return flt(item_prices[0].price_list_rate)
-    return 0.0
+    return get_selling_rate(item_code)
 
 # ---- Main SLE creation function (uses the above helpers) ----
 @frappe.whitelist()
@@ -517,180 +389,46 @@ def create_stock_ledger_entry_collections(animal_product, qty_issued, reference_
     warehouse = _get_default_warehouse_for_item(item_name, item_doc)
     # _get_default_warehouse_for_item will throw a helpful error if it cannot find one
 
-    # Try to find the latest SLE for this item_code_value + warehouse
-    sle_rows = frappe.get_all(
-        "Stock Ledger Entry",
-        filters={"item_code": item_code_value, "warehouse": warehouse},
-        fields=[
-            "name", "qty_after_transaction", "incoming_rate", "outgoing_rate",
-            "valuation_rate", "fiscal_year", "company", "posting_datetime", "creation"
-        ],
-        order_by="posting_datetime desc, creation desc",
-        limit_page_length=1
+    # Post through the shared engine: it chains qty_after_transaction on the running
+    # balance for (item_code, warehouse) instead of re-reading the latest SLE every row.
+    # Selling rate (Item Price) drives outgoing/valuation rate, falling back to the
+    # previous valuation (or the Item's own rate for the first entry).
+    return post_stock_ledger_entry(
+        item_code_value,
+        warehouse,
+        qty_issued,  # positive addition
+        voucher_type=reference_doctype or "Cattle",
+        voucher_no=reference_name or animal_product,
+        selling_rate=_get_selling_rate(item_code_value),
+        default_rate=item_doc.get("valuation_rate") or item_doc.get("standard_rate") or 0.0,
+        company=_determine_target_company(item_doc)
     )
 
-    if sle_rows:
-        latest = sle_rows[0]
-        latest_qty_after = flt(latest.get("qty_after_transaction") or 0.0)
-        incoming_rate = flt(latest.get("incoming_rate") or 0.0)
-        fiscal_year = latest.get("fiscal_year")
-        company = latest.get("company")
-    else:
-        # No previous SLE: use sensible defaults (do NOT raise)
-        frappe.logger("create_stock_ledger_entry_collections").warning(
-            "No prior SLE found for Item %s (item_code %s) at Warehouse %s: creating initial SLE with defaults",
-            item_name, item_code_value, warehouse
-        )
-
-        latest_qty_after = 0.0
-        # Prefer item valuation_rate, then standard_rate, then 0.0
-        incoming_rate = flt(item_doc.get("valuation_rate") or item_doc.get("standard_rate") or 0.0)
-
-        # Determine fiscal year
-        try:
-            fy = get_fiscal_year(nowdate())
-            fiscal_year = fy[0] if fy else None
-        except Exception:
-            fiscal_year = None
-
-        # company fallback: prefer target company (determined from item_doc or defaults)
-        company = _determine_target_company(item_doc)
-
-    # Get selling rate from Item Price
-    selling_rate = _get_selling_rate(item_code_value)
-
-    # Use selling_rate for outgoing_rate and valuation_rate
-    outgoing_rate = selling_rate
-    valuation_rate = selling_rate
-
-    # If selling_rate is 0, fallback to original logic for valuation_rate
-    if valuation_rate == 0:
-        if sle_rows:
-            valuation_rate = flt(latest.get("valuation_rate") or 0.0)
-        else:
-            valuation_rate = incoming_rate
-        outgoing_rate = 0.0
-
-    # Compute quantities and values
-    actual_qty = flt(qty_issued)  # positive addition
-    new_qty_after = flt(latest_qty_after + actual_qty)
-    stock_value = flt(valuation_rate * new_qty_after)
-    stock_value_difference = flt(valuation_rate * actual_qty)
-    stock_queue_str = frappe.as_json([[new_qty_after, valuation_rate]])
-
-    # Build and insert SLE (use item_code_value in item_code)
-    sle_doc = frappe.get_doc({
-        "doctype": "Stock Ledger Entry",
-        "item_code": item_code_value,
-        "warehouse": warehouse,
-        "posting_date": nowdate(),
-        "posting_time": nowtime(),
-        "voucher_type": reference_doctype or "Cattle",
-        "voucher_no": reference_name or animal_product,
-        "actual_qty": actual_qty,
-        "qty_after_transaction": new_qty_after,
-        "incoming_rate": incoming_rate,
-        "outgoing_rate": outgoing_rate,
-        "valuation_rate": valuation_rate,
-        "fiscal_year": fiscal_year,
-        "company": company,
-        "stock_value": stock_value,
-        "stock_value_difference": stock_value_difference,
-        "stock_queue": stock_queue_str
-    })
-
-    sle_doc.insert(ignore_permissions=True)
-    try:
-        sle_doc.submit()
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "create_stock_ledger_entry_collections: submit failed")
-        return {"inserted": sle_doc.name, "submitted": False}
-
-    return {"sle_name": sle_doc.name, "submitted": True}
-
-
 import frappe
-from collections import defaultdict
-from frappe.utils import getdate
+from farm_management_system.config.charts import get_collection_chart
 
 @frappe.whitelist()
-def get_collection_data(cattle):
+def get_collection_data(cattle, from_date=None, to_date=None, interval="daily"):
     """
-    Fetches product collection data for a given batch from its child table,
+    Fetches product collection data for a given cattle from its child table,
     formatted for a stacked bar chart.
+    Quantities are summed per date (or week / month with interval="weekly" / "monthly")
+    and product directly on the child table, optionally between from_date and to_date.
     """
     if not cattle:
         return None
 
-    try:
-        # CORRECT APPROACH: Load the parent document first.
-        # The 'batch_name' is the unique ID of the 'Poultry Batches' document.
-        doc = frappe.get_doc("Cattle", cattle)
-
-        # Access the child table data directly from the document object.
-        # The fieldname for your child table is 'product_inventory_log'.
-        data = doc.get("production_log")
-
-    except frappe.DoesNotExistError:
-        frappe.log_error(f"Attempted to get collection data for non-existent batch: {cattle}")
+    if not frappe.db.exists("Cattle", cattle):
+        frappe.log_error(f"Attempted to get collection data for non-existent cattle: {cattle}")
         return {"labels": [], "datasets": []} # Return empty data if doc not found
 
-    if not data:
-        return {"labels": [], "datasets": []}
-
-    # --- The rest of your processing logic is correct and remains the same ---
-    # Structure: { date: { product: { qty: value, uom: value } } }
-    processed_data = defaultdict(lambda: defaultdict(lambda: {'qty': 0, 'uom': ''}))
-    all_products = set()
-
-    # The 'data' variable is now the list of child table rows
-    for row in data:
-        if not row.date_of_collection or not row.product_collected:
-            continue # Skip rows with missing essential data
-
-        date_str = getdate(row.date_of_collection).strftime("%Y-%m-%d")
-        product = row.product_collected
-        
-        # Sum quantities if multiple collections of the same product occur on the same day
-        processed_data[date_str][product]['qty'] += row.quantity_collected
-        # Assume the UOM is consistent for a product
-        processed_data[date_str][product]['uom'] = row.products_default_uom
-        all_products.add(product)
-
-    # --- Format data for Frappe Charts ---
-    sorted_products = sorted(list(all_products))
-    sorted_dates = sorted(processed_data.keys())
-    
-    tooltip_data = defaultdict(dict)
-    
-    datasets = []
-    for product in sorted_products:
-        values = []
-        for date_str in sorted_dates:
-            item = processed_data.get(date_str, {}).get(product)
-            if item:
-                quantity = item.get('qty', 0)
-                uom = item.get('uom', '')
-                values.append(quantity)
-                tooltip_data[product][date_str] = f"{quantity} {uom}"
-            else:
-                values.append(0)
-        
-        datasets.append({
-            "name": product,
-            "values": values
-        })
-
-    return {
-        "labels": sorted_dates,
-        "datasets": datasets,
-        "tooltip_data": tooltip_data
-    }
+    return get_collection_chart(
+        "Cattle", cattle, "production_log", from_date=from_date, to_date=to_date, interval=interval
+    )
 
 
 import frappe
-from frappe import _
-from datetime import datetime
+from farm_management_system.config.charts import get_treatment_chart
 
 @frappe.whitelist()
 def get_treatment_chart_data(cattle: str):
@@ -704,99 +442,367 @@ def get_treatment_chart_data(cattle: str):
       "series": { "Newcastle Vaccine": [10, 0, ...], ... }   # aligned with dates
     }
     """
-    if not cattle:
-        return {"dates": [], "vaccines": [], "series": {}}
-
-    # fetch relevant fields explicitly so we don't guess on client side
-    logs = frappe.get_all(
-        "Treatment and Vaccination Logs",
-        filters={"specific_cattle_under_treatment": cattle},
-        fields=[
-            "name",
-            "treatment_date",
-            "vaccine_used",
-            "qty_vaccine",
-            "creation"
-        ],
-        order_by="creation desc",
-        limit_page_length=2000
-    )
+    return get_treatment_chart("specific_cattle_under_treatment", cattle)
 
-    # helper to normalize date to YYYY-MM-DD
-    def norm_date(val):
-        if not val:
-            return None
-        if isinstance(val, str):
-            s = val.strip()
-            # prefer first 10 chars if ISO-like
-            cand = s[:10]
-            try:
-                if len(cand) == 10:
-                    datetime.strptime(cand, "%Y-%m-%d")
-                    return cand
-            except Exception:
-                pass
-            try:
-                d = datetime.fromisoformat(s)
-                return d.strftime("%Y-%m-%d")
-            except Exception:
-                pass
-            try:
-                d = frappe.utils.data.get_datetime(s)
-                return d.strftime("%Y-%m-%d")
-            except Exception:
-                return None
-        else:
-            # likely a datetime object
-            try:
-                return val.strftime("%Y-%m-%d")
-            except Exception:
-                return None
-
-    # Build grouped map date -> vaccine -> qty
-    grouped = {}
-    vaccine_set = set()
-
-    for r in logs:
-        # prefer human label if link field stores name in <field>_name
-        vac = (r.get("vaccine_used") or "") 
-        vac = vac.strip() if isinstance(vac, str) else str(vac)
-        if not vac:
-            vac = "(unknown)"
-
-        # normalize date preferring treatment_date, fallback creation
-        dt = norm_date(r.get("treatment_date")) or norm_date(r.get("creation")) or None
-        if not dt:
-            # ignore entries with no date at all (or you can choose to set to today)
-            continue
 
-        qty = r.get("qty_vaccine") or 0
+# ---- Bulk herd onboarding ----
+import frappe
+from frappe.utils import cint, flt, strip_html
+from frappe.utils.csvutils import read_csv_content
+from farm_management_system.config.avatar_store import AVATAR_JOB_CHUNK_SIZE, generate_cattle_avatars
+from farm_management_system.config.caching import suspended_cache_invalidation
+from farm_management_system.config.lineage import clear_pedigree_cache
+from farm_management_system.savanna_farm_suite.doctype.cattle_shed.cattle_shed import recount_cattle_sheds
+
+# Cattle fields a bulk import may set (CSV header / JSON keys)
+ONBOARDING_FIELDS = (
+    "add_nickname_optional", "animal", "specify_species", "animals_birthdate", "animals__sex",
+    "has_this_animal_been_castrated", "important_notes", "parent_cattle", "cow_shed",
+    "is_this_a_fixed_asset", "specify_net_purchase_amount", "specify_the_date_of_purchase",
+    "is_the_animal_tagged", "specify_the_type_of_tag", "tag_number", "additional_tag",
+    "specify_tag", "tag_number_if_any", "image_of_animal"
+)
+
+# Rows inserted (with their Items / Assets) per transaction
+ONBOARDING_CHUNK_SIZE = 100
+
+
+def _parse_onboarding_rows(rows=None, file_url=None):
+    """
+    Import rows as a list of dicts from a JSON list, CSV text or an uploaded File (.csv or
+    .json). CSV input has a header row of Cattle fieldnames.
+    """
+    if file_url:
+        rows = frappe.get_doc("File", {"file_url": file_url}).get_content()
+        if isinstance(rows, bytes):
+            rows = rows.decode("utf-8-sig")
+
+    if isinstance(rows, str):
         try:
-            qty = float(qty)
-        except Exception:
-            try:
-                qty = float(str(qty).strip() or 0)
-            except Exception:
-                qty = 0.0
+            rows = json.loads(rows)
+        except ValueError:
+            csv_rows = [r for r in read_csv_content(rows) if any(str(v).strip() for v in r)]
+            if not csv_rows:
+                return []
+            header = [str(h).strip() for h in csv_rows[0]]
+            rows = [dict(zip(header, r)) for r in csv_rows[1:]]
+
+    rows = rows or []
+    if isinstance(rows, dict):
+        rows = [rows]
 
-        grouped.setdefault(dt, {})
-        grouped[dt][vac] = grouped[dt].get(vac, 0.0) + qty
-        vaccine_set.add(vac)
+    unknown = sorted({key for row in rows for key in row if key not in ONBOARDING_FIELDS})
+    if unknown:
+        frappe.throw(
+            _("Unknown Cattle column(s) in import: {0}").format(", ".join(unknown)), frappe.ValidationError
+        )
+    return rows
 
-    if not grouped:
-        return {"dates": [], "vaccines": [], "series": {}}
 
-    # Dates sorted latest -> oldest
-    dates = sorted(list(grouped.keys()), reverse=True)
+def _clean_onboarding_row(row, meta):
+    """Strip the values of a row and coerce them to their Cattle field types; blanks are dropped."""
+    cleaned = {}
+    for fieldname, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ""):
+            continue
+        fieldtype = meta.get_field(fieldname).fieldtype
+        if fieldtype == "Check":
+            value = 1 if str(value).lower() in ("1", "yes", "true") else 0
+        elif fieldtype == "Currency":
+            value = flt(value)
+        cleaned[fieldname] = value
+    return cleaned
 
-    vaccines = sorted(list(vaccine_set))  # deterministically order vaccines (alphabetical)
 
-    # Build series: vaccine -> array of qty aligned with dates
-    series = {}
-    for vac in vaccines:
-        arr = []
-        for d in dates:
-            arr.append(round(grouped.get(d, {}).get(vac, 0.0), 6))
-        series[vac] = arr
+def _validate_onboarding_rows(rows):
+    """
+    Validate every row before anything is written. Linked records are looked up with one
+    query per linked DocType for the whole file; parent_cattle may also name another row of
+    the file by its nickname. Returns [(cleaned_row, result)] with parents before their
+    offspring (see _order_parents_first); each result lists the row's errors.
+    """
+    meta = frappe.get_meta("Cattle")
+    cleaned_rows = [_clean_onboarding_row(row, meta) for row in rows]
+
+    # Nickname -> file rows, for parents that are imported in the same file
+    nicknames = {}
+    for idx, row in enumerate(cleaned_rows, start=1):
+        if row.get("add_nickname_optional"):
+            nicknames.setdefault(row["add_nickname_optional"], []).append(idx)
+
+    existing = {}
+    for fieldname in ONBOARDING_FIELDS:
+        df = meta.get_field(fieldname)
+        if df.fieldtype != "Link":
+            continue
+        values = list({row[fieldname] for row in cleaned_rows if row.get(fieldname)})
+        existing[fieldname] = set(
+            frappe.get_all(df.options, filters={"name": ["in", values]}, pluck="name")
+        ) if values else set()
+
+    validated = []
+    for idx, row in enumerate(cleaned_rows, start=1):
+        errors = []
+        parent_row = None
+        for fieldname in ONBOARDING_FIELDS:
+            df = meta.get_field(fieldname)
+            value = row.get(fieldname)
+            if not value:
+                if df.reqd:
+                    errors.append(_("{0} is required").format(_(df.label)))
+                continue
+            if fieldname == "parent_cattle" and value not in existing[fieldname] and value in nicknames:
+                if len(nicknames[value]) > 1:
+                    errors.append(_("Parent {0} matches more than one row").format(value))
+                elif nicknames[value][0] == idx:
+                    errors.append(_("An animal cannot be its own parent"))
+                else:
+                    parent_row = nicknames[value][0]
+            elif df.fieldtype == "Link" and value not in existing[fieldname]:
+                errors.append(_("{0} {1} not found").format(_(df.options), value))
+            elif df.fieldtype == "Select" and value not in (df.options or "").split("\n"):
+                errors.append(_("{0} must be one of {1}").format(
+                    _(df.label), ", ".join(o for o in df.options.split("\n") if o)
+                ))
+            elif df.fieldtype == "Date":
+                try:
+                    row[fieldname] = getdate(value)
+                except Exception:
+                    errors.append(_("{0} is not a valid date: {1}").format(_(df.label), value))
+
+        if row.get("is_this_a_fixed_asset"):
+            if not row.get("specify_the_date_of_purchase"):
+                errors.append(_("Fixed assets need a purchase date"))
+            if flt(row.get("specify_net_purchase_amount")) <= 0:
+                errors.append(_("Fixed assets need a net purchase amount"))
+        if row.get("is_the_animal_tagged") and not row.get("specify_the_type_of_tag"):
+            errors.append(_("Tagged animals need a type of tag"))
+
+        validated.append((row, {
+            "row": idx,
+            "status": None,
+            "cattle": None,
+            "asset": None,
+            "parent_row": parent_row,
+            "errors": errors
+        }))
+
+    validated = _order_parents_first(validated)
+    for _row, result in validated:
+        result["status"] = "Invalid" if result["errors"] else "Valid"
+    return validated
+
+
+def _order_parents_first(validated):
+    """
+    Rows in insert order: each row after the file row it names as parent (then by row
+    number). Rows in a parent cycle, and rows whose parent row is invalid, get an error.
+    """
+    by_row = {result["row"]: result for _row, result in validated}
+    depth = {}
+    for _row, result in validated:
+        chain = []
+        idx = result["row"]
+        while idx is not None and idx not in depth:
+            if idx in chain:
+                for member in chain[chain.index(idx):]:
+                    by_row[member]["errors"].append(_("Parent rows form a cycle"))
+                    depth[member] = 0
+                break
+            chain.append(idx)
+            idx = by_row[idx]["parent_row"]
+
+        level = depth[idx] if idx is not None else -1
+        for member in reversed(chain):
+            if member in depth:
+                level = depth[member]
+            else:
+                level = depth[member] = level + 1
+
+    ordered = sorted(validated, key=lambda v: (depth[v[1]["row"]], v[1]["row"]))
+    for _row, result in ordered:
+        parent = by_row.get(result["parent_row"])
+        if parent and parent["errors"] and not result["errors"]:
+            result["errors"].append(_("Parent row {0} is invalid").format(parent["row"]))
+    return ordered
+
+
+def _get_onboarding_company():
+    """Company for the imported Assets, after checking the asset masters exist once for the file."""
+    company = frappe.db.get_single_value("Global Defaults", "default_company")
+    if not company:
+        frappe.throw(_("Set a Default Company in Global Defaults before importing fixed-asset cattle"))
+    if not frappe.db.exists("Asset Category", CATTLE_ASSET_CATEGORY):
+        frappe.throw(_("Asset Category {0} not found").format(CATTLE_ASSET_CATEGORY))
+    if not frappe.db.exists("Location", CATTLE_ASSET_LOCATION):
+        frappe.throw(_("Location {0} not found").format(CATTLE_ASSET_LOCATION))
+    return company
 
-    return {"dates": dates, "vaccines": vaccines, "series": series}
+
+@frappe.whitelist()
+def import_cattle(rows=None, file_url=None, skip_invalid=0):
+    """
+    Onboard a herd in one request.
+
+    rows: JSON list of dicts or CSV text (header row of Cattle fieldnames), or
+    file_url: an uploaded .csv / .json File with the same columns.
+    parent_cattle is an existing Cattle or the nickname of another row of the file.
+
+    Every row is validated before anything is written; unless skip_invalid is set, one
+    invalid row means nothing is imported. Cattle are then inserted parents first, with
+    their Items and Assets, in chunks of ONBOARDING_CHUNK_SIZE (one transaction each, a
+    failing row is rolled back on its own). The item, warehouse and feed caches are cleared
+    once at the end rather than per Item, and avatars and shed head counts are done
+    afterwards by one background job.
+
+    Returns {"created", "failed", "results": [{"row", "status", "cattle", "asset",
+    "parent_row", "errors"}]} in file order, with status Created, Failed, Invalid or
+    Not Imported.
+    """
+    frappe.has_permission("Cattle", "create", throw=True)
+
+    rows = _parse_onboarding_rows(rows, file_url)
+    if not rows:
+        frappe.throw(_("No cattle rows provided"), frappe.ValidationError)
+
+    validated = _validate_onboarding_rows(rows)
+    results = sorted((result for _row, result in validated), key=lambda r: r["row"])
+    pending = [(row, result) for row, result in validated if not result["errors"]]
+    if len(pending) < len(validated) and not cint(skip_invalid):
+        for _row, result in pending:
+            result["status"] = "Not Imported"
+        return {"created": 0, "failed": len(validated) - len(pending), "results": results}
+
+    company = None
+    if any(row.get("is_this_a_fixed_asset") for row, _result in pending):
+        company = _get_onboarding_company()
+
+    created = []
+    created_names = {}
+    with suspended_cache_invalidation():
+        for start in range(0, len(pending), ONBOARDING_CHUNK_SIZE):
+            for row, result in pending[start:start + ONBOARDING_CHUNK_SIZE]:
+                if result["parent_row"]:
+                    parent = created_names.get(result["parent_row"])
+                    if not parent:
+                        result.update(status="Failed", errors=[
+                            _("Parent row {0} was not imported").format(result["parent_row"])
+                        ])
+                        continue
+                    row = {**row, "parent_cattle": parent}
+
+                savepoint = f"cattle_onboarding_{result['row']}"
+                frappe.db.savepoint(savepoint)
+                try:
+                    cattle = frappe.get_doc({"doctype": "Cattle", **row})
+                    cattle.flags.bulk_onboarding = True
+                    cattle.insert()
+                    if cattle.is_this_a_fixed_asset:
+                        result["asset"] = create_cattle_asset(
+                            cattle.name, cattle.specify_the_date_of_purchase,
+                            cattle.specify_net_purchase_amount, company
+                        )
+                except Exception as e:
+                    frappe.db.rollback(save_point=savepoint)
+                    # The error is reported on the row instead of as a message
+                    frappe.clear_messages()
+                    result.update(status="Failed", cattle=None, asset=None, errors=[strip_html(str(e))])
+                    continue
+                result.update(status="Created", cattle=cattle.name)
+                created_names[result["row"]] = cattle.name
+                created.append(cattle)
+
+            frappe.db.commit()
+            done = min(start + ONBOARDING_CHUNK_SIZE, len(pending))
+            frappe.publish_progress(done * 100 / len(pending), title=_("Importing Cattle"), description=f"{done}/{len(pending)}")
+
+        if created:
+            frappe.enqueue(
+                "farm_management_system.savanna_farm_suite.doctype.cattle.cattle.finish_cattle_onboarding",
+                cattle_names=[c.name for c in created if not c.image_of_animal],
+                cattle_sheds=sorted({c.cow_shed for c in created if c._counts_in_shed()}),
+                queue="long",
+                enqueue_after_commit=True,
+            )
+            clear_pedigree_cache()
+            frappe.db.commit()
+
+    failed = len([r for r in results if r["status"] != "Created"])
+    return {"created": len(created), "failed": failed, "results": results}
+
+
+def finish_cattle_onboarding(cattle_names, cattle_sheds):
+    """Background job after import_cattle: generate the avatars and recount the touched sheds."""
+    for start in range(0, len(cattle_names), AVATAR_JOB_CHUNK_SIZE):
+        generate_cattle_avatars(cattle_names[start:start + AVATAR_JOB_CHUNK_SIZE])
+    for cattle_shed in cattle_sheds:
+        recount_cattle_sheds(cattle_shed)
+
+
+import frappe
+from farm_management_system.config.lactation import get_cattle_lactation, get_herd_lactation_metrics
+
+@frappe.whitelist()
+def get_lactation_metrics(cattle=None, as_of=None, product=None):
+    """
+    Milk analytics as of a date (default today): 7/30-day rolling averages, peak yield,
+    days in milk and the fitted Wood's lactation curve.
+    Without `cattle` returns the metrics of the whole herd; with it, that cow's metrics
+    plus its actual and fitted curve by days in milk. `product` narrows to one Animal
+    Product instead of every milk product.
+    """
+    products = [product] if product else None
+    if cattle:
+        return get_cattle_lactation(cattle, as_of, products)
+    return get_herd_lactation_metrics(as_of, products)
+
+
+import frappe
+from farm_management_system.config import lineage
+
+@frappe.whitelist()
+def get_cattle_ancestors(cattle):
+    """Ancestors of a cattle, nearest first, each with its generation (1 = parent)."""
+    return lineage.get_ancestors(cattle)
+
+
+@frappe.whitelist()
+def get_cattle_descendants(cattle, max_generations=None):
+    """Offspring, grand-offspring, ... of a cattle in tree order, each with its generation."""
+    return lineage.get_descendants(cattle, max_generations)
+
+
+@frappe.whitelist()
+def get_cattle_siblings(cattle):
+    """Other offspring of the cattle's parent."""
+    return lineage.get_siblings(cattle)
+
+
+@frappe.whitelist()
+def get_cattle_sibling_groups(cattle=None):
+    """Sibling groups of the herd, or of one cattle's line of descent: [{parent, siblings}]."""
+    return lineage.get_sibling_groups(cattle)
+
+
+@frappe.whitelist()
+def check_cattle_inbreeding(cattle, mate):
+    """
+    Inbreeding coefficient of an offspring of `cattle` and `mate`:
+    {"coefficient", "common_ancestor", "generations": [from cattle, from mate]}
+    """
+    return lineage.check_inbreeding(cattle, mate)
+
+
+@frappe.whitelist()
+def get_breeding_inbreeding_matrix(dams, sires, threshold=None):
+    """
+    Breeding planner: inbreeding coefficients for every dam x sire pairing (JSON lists of
+    Cattle names), with the pairings at or above `threshold` (default 6.25%) flagged.
+    """
+    dams = frappe.parse_json(dams) if isinstance(dams, str) else dams
+    sires = frappe.parse_json(sires) if isinstance(sires, str) else sires
+    if threshold in (None, ""):
+        threshold = lineage.INBREEDING_THRESHOLD
+    return lineage.get_inbreeding_matrix(list(dams or []), list(sires or []), threshold)
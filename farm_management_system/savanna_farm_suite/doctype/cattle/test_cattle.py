@@ -1,9 +1,44 @@
 # Copyright (c) 2025, Techsavanna Technology and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from farm_management_system.savanna_farm_suite.doctype.cattle.cattle import (
+	_parse_onboarding_rows,
+	_validate_onboarding_rows,
+	import_cattle,
+)
+
 
 class TestCattle(FrappeTestCase):
-	pass
+	def test_onboarding_reads_csv_header_as_fieldnames(self):
+		rows = _parse_onboarding_rows("add_nickname_optional,animals__sex\nDaisy,Female\n,\n")
+		self.assertEqual(rows, [{"add_nickname_optional": "Daisy", "animals__sex": "Female"}])
+
+	def test_onboarding_rejects_unknown_columns(self):
+		with self.assertRaises(frappe.ValidationError):
+			_parse_onboarding_rows([{"nickname": "Daisy"}])
+
+	def test_one_invalid_row_imports_nothing(self):
+		before = frappe.db.count("Cattle")
+		result = import_cattle([
+			{"add_nickname_optional": "_Test Bessie", "animals__sex": "Cow"},
+			{"add_nickname_optional": "_Test Daisy", "specify_species": "_Test Missing Species", "animals__sex": "Female"},
+		])
+
+		self.assertEqual(result["created"], 0)
+		self.assertEqual([r["status"] for r in result["results"]], ["Invalid", "Invalid"])
+		self.assertEqual(len(result["results"][0]["errors"]), 2)
+		self.assertEqual(frappe.db.count("Cattle"), before)
+
+	def test_onboarding_inserts_parents_named_in_the_file_first(self):
+		validated = _validate_onboarding_rows([
+			{"add_nickname_optional": "_Test Calf", "parent_cattle": "_Test Dam"},
+			{"add_nickname_optional": "_Test Dam"},
+		])
+
+		self.assertEqual([result["row"] for _row, result in validated], [2, 1])
+		calf = validated[1][1]
+		self.assertEqual(calf["parent_row"], 2)
+		self.assertFalse([e for e in calf["errors"] if "_Test Dam" in e])
@@ -1,9 +1,63 @@
 # Copyright (c) 2025, Techsavanna Technology and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class CattleShed(Document):
 	pass
+
+
+def head_count_label(count):
+	"""Display string for Cattle Shed.current_animal_count, e.g. "12 Cows"."""
+	return f"{int(count or 0)} Cows"
+
+
+def adjust_shed_head_count(cattle_shed, delta):
+	"""
+	Add `delta` (may be negative) to a shed's animal_count with one atomic UPDATE, so
+	concurrent registrations, transfers and culls never overwrite each other. The display
+	string current_animal_count is derived in the same statement.
+	"""
+	if not cattle_shed or not delta:
+		return
+
+	# current_animal_count is assigned first: MariaDB applies SET clauses left to right, so
+	# it must still see the old animal_count (Postgres always does).
+	frappe.db.sql(
+		"""
+		update `tabCattle Shed`
+		set
+			current_animal_count = concat(greatest(coalesce(animal_count, 0) + %(delta)s, 0), ' Cows'),
+			animal_count = greatest(coalesce(animal_count, 0) + %(delta)s, 0)
+		where name = %(shed)s
+		""",
+		{"delta": int(delta), "shed": cattle_shed}
+	)
+
+
+def recount_cattle_sheds(cattle_shed=None):
+	"""
+	Recompute animal_count / current_animal_count from the Cattle records (repair / first
+	install), for one shed or every shed. Culled animals are not counted.
+	Run with: bench --site <site> execute farm_management_system.savanna_farm_suite.doctype.cattle_shed.cattle_shed.recount_cattle_sheds
+	"""
+	filters = {"cow_shed": cattle_shed or ["is", "set"], "has_been_culled": 0}
+	counts = {
+		row.cow_shed: row.head_count
+		for row in frappe.get_all(
+			"Cattle", filters=filters, fields=["cow_shed", "count(name) as head_count"], group_by="cow_shed"
+		)
+	}
+
+	sheds = [cattle_shed] if cattle_shed else frappe.get_all("Cattle Shed", pluck="name")
+	for shed in sheds:
+		count = int(counts.get(shed) or 0)
+		frappe.db.set_value(
+			"Cattle Shed", shed,
+			{"animal_count": count, "current_animal_count": head_count_label(count)},
+			update_modified=False
+		)
+	frappe.db.commit()
+	return len(sheds)
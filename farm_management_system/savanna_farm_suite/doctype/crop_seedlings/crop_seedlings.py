@@ -1,10 +1,14 @@
 # Copyright (c) 2025, Techsavanna Technology and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from farm_management_system.config.stock_balance import get_item_stock, get_item_stock_many
+
 
 class CropSeedlings(Document):
 	def on_update(self):
@@ -100,10 +104,18 @@ def get_purchase_history(seedling_name):
 
 @frappe.whitelist()
 def get_current_stock(item_code):
-    entries = frappe.get_all("Stock Ledger Entry",
-        filters={"item_code": item_code},
-        fields=["qty_after_transaction", "stock_value", "valuation_rate"],
-        order_by="creation DESC",
-        limit=1
-    )
-    return entries[0] if entries else {}
\ No newline at end of file
+    # Served from Farm Stock Balance (summed over the item's warehouses)
+    return get_item_stock(item_code)
+
+
+@frappe.whitelist()
+def get_current_stock_many(items):
+    """
+    Current stock for several items in one call.
+    items: list or JSON list / comma separated string of item codes.
+    Returns { item_code: { qty_after_transaction, stock_value, valuation_rate } }
+    """
+    if isinstance(items, str):
+        items = json.loads(items) if items.strip().startswith("[") else items.split(",")
+    items = [i.strip() for i in items or [] if i and i.strip()]
+    return get_item_stock_many(items)
\ No newline at end of file
@@ -119,7 +119,9 @@ def run_after_insert(docname):
 import frappe
 from frappe import _
 from frappe.utils import flt, nowdate, nowtime
-from erpnext.accounts.utils import get_fiscal_year
+from farm_management_system.config.item_resolver import resolve_item
+from farm_management_system.config.warehouse_resolver import get_default_warehouse
+from farm_management_system.config.stock_posting import post_stock_ledger_entry
 
 @frappe.whitelist()
 def create_stock_ledger_entry_collections(item_identifier, qty_issued, uom=None, reference_doctype=None, reference_name=None):
@@ -158,86 +160,18 @@ def create_stock_ledger_entry_collections(item_identifier, qty_issued, uom=None,
     # Determine warehouse for this item
     warehouse = _get_default_warehouse_for_item(item_name, item_doc)
 
-    # Find latest SLE for valuation data and latest qty_after_transaction
-    sle_rows = frappe.get_all(
-        "Stock Ledger Entry",
-        filters={"item_code": item_code_value, "warehouse": warehouse},
-        fields=[
-            "name", "qty_after_transaction", "incoming_rate", "outgoing_rate",
-            "valuation_rate", "fiscal_year", "company", "posting_datetime", "creation"
-        ],
-        order_by="posting_datetime desc, creation desc",
-        limit_page_length=1
-    )
-
-    if sle_rows:
-        latest = sle_rows[0]
-        latest_qty_after = flt(latest.get("qty_after_transaction") or 0.0)
-        incoming_rate = flt(latest.get("incoming_rate") or 0.0)
-        outgoing_rate = flt(latest.get("outgoing_rate") or 0.0)
-        valuation_rate = flt(latest.get("valuation_rate") or 0.0)
-        fiscal_year = latest.get("fiscal_year")
-        company = latest.get("company")
-    else:
-        # No prior SLE: use sensible defaults
-        frappe.logger("create_stock_ledger_entry_collections").warning(
-            "No prior SLE found for Item %s at Warehouse %s: creating initial SLE with defaults",
-            item_name, warehouse
-        )
-
-        latest_qty_after = 0.0
-        incoming_rate = flt(item_doc.get("valuation_rate") or item_doc.get("standard_rate") or 0.0)
-        outgoing_rate = 0.0
-        valuation_rate = incoming_rate
-
-        # Determine fiscal year (best-effort)
-        try:
-            fy = get_fiscal_year(nowdate())
-            fiscal_year = fy[0] if fy else None
-        except Exception:
-            fiscal_year = None
-
-        # company fallback
-        company = _determine_target_company(item_doc)
-
-    # Compute amounts (we are issuing qty -> actual_qty negative)
-    actual_qty = flt(-qty_issued)
-    new_qty_after = flt(latest_qty_after + actual_qty)
-    stock_value = flt(valuation_rate * new_qty_after)
-    stock_value_difference = flt(valuation_rate * actual_qty)
-    stock_queue_str = frappe.as_json([[new_qty_after, valuation_rate]])
-
-    # Build Stock Ledger Entry doc
-    sle_doc = frappe.get_doc({
-        "doctype": "Stock Ledger Entry",
-        "item_code": item_code_value,
-        "warehouse": warehouse,
-        "posting_date": nowdate(),
-        "posting_time": nowtime(),
+    # Issue qty (actual_qty negative) through the shared engine; rates and the running
+    # balance are carried over from the previous entry for this item/warehouse.
+    return post_stock_ledger_entry(
+        item_code_value,
+        warehouse,
+        -qty_issued,
         # voucher_type/voucher_no: prefer passed references but keep readable defaults
-        "voucher_type": reference_doctype or "Farm Operation Log",
-        "voucher_no": reference_name or item_identifier,
-        "actual_qty": actual_qty,
-        "qty_after_transaction": new_qty_after,
-        "incoming_rate": incoming_rate,
-        "outgoing_rate": outgoing_rate,
-        "valuation_rate": valuation_rate,
-        "fiscal_year": fiscal_year,
-        "company": company,
-        "stock_value": stock_value,
-        "stock_value_difference": stock_value_difference,
-        "stock_queue": stock_queue_str
-    })
-
-    # Insert and try submit
-    sle_doc.insert(ignore_permissions=True)
-    try:
-        sle_doc.submit()
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "create_stock_ledger_entry_collections: submit failed")
-        return {"sle_name": sle_doc.name, "submitted": False}
-
-    return {"sle_name": sle_doc.name, "submitted": True}
+        voucher_type=reference_doctype or "Farm Operation Log",
+        voucher_no=reference_name or item_identifier,
+        default_rate=item_doc.get("valuation_rate") or item_doc.get("standard_rate") or 0.0,
+        company=_determine_target_company(item_doc)
+    )
 
 
 # ---- Resolve Item from item_identifier (returns item_code_value and item_name) ----
@@ -246,25 +180,18 @@ def _resolve_item_from_identifier(item_identifier):
 	Return (item_code_value, item_name, item_doc)
 	item_code_value -> what Stock Ledger Entry.item_code should contain
 	item_name -> the Item doctype name (frappe.get_doc key)
-	item_doc -> the Item doc
+	item_doc -> cached Item fields (name, item_code, stock_uom, valuation_rate, standard_rate)
 	"""
 	if not item_identifier:
 		frappe.throw(_("item_identifier is required"), frappe.ValidationError)
 
-	# First try matching item_code (common pattern)
-	items = frappe.get_all("Item", filters={"item_code": item_identifier},
-						   fields=["name", "item_code"], limit_page_length=1)
-	if not items:
-		# fallback: maybe the Item name equals the item_identifier
-		items = frappe.get_all("Item", filters={"name": item_identifier},
-							   fields=["name", "item_code"], limit_page_length=1)
-
-	if not items:
+	# Matches item_code first, then Item name (cached until an Item changes)
+	item_doc = resolve_item(item_identifier)
+	if not item_doc:
 		frappe.throw(_("No Item found with item_code or name '{0}'.").format(item_identifier))
 
-	item_name = items[0]["name"]
-	item_code_value = items[0].get("item_code") or item_name
-	item_doc = frappe.get_doc("Item", item_name)
+	item_name = item_doc.name
+	item_code_value = item_doc.get("item_code") or item_name
 	return item_code_value, item_name, item_doc
 
 
@@ -284,7 +211,7 @@ def _determine_target_company(item_doc=None):
 
 def _get_default_warehouse_for_item(item_name, item_doc=None):
 	"""
-	Resolve the warehouse to use for an Item.
+	Resolve the warehouse to use for an Item (cached per item and target company).
 	Priority:
 	  1) Item Default rows where company matches target_company
 	  2) Warehouse named "Stores - {abbr}" using Company.abbr (if exists and belongs to target_company)
@@ -294,79 +221,4 @@ def _get_default_warehouse_for_item(item_name, item_doc=None):
 	"""
 	if not item_name:
 		return None
-
-	# ensure we have the item_doc
-	if item_doc is None:
-		try:
-			item_doc = frappe.get_doc("Item", item_name)
-		except Exception:
-			item_doc = None
-
-	target_company = _determine_target_company(item_doc)
-
-	# 1) Look at Item Default rows (prefer a default that matches the target_company)
-	item_defaults = frappe.get_all(
-		"Item Default",
-		filters={"parent": item_name},
-		fields=["company", "default_warehouse"],
-		order_by="idx asc"
-	)
-	# Try to find a row where company == target_company and default_warehouse present
-	if item_defaults:
-		if target_company:
-			for row in item_defaults:
-				row_company = row.get("company")
-				row_wh = row.get("default_warehouse")
-				if row_wh and (not row_company or row_company == target_company):
-					# ensure warehouse exists and belongs to same company (or empty)
-					if frappe.db.exists("Warehouse", row_wh):
-						w_company = frappe.get_value("Warehouse", row_wh, "company")
-						if not w_company or w_company == target_company:
-							return row_wh
-		# fallback to any item_default with a warehouse (first one that exists)
-		for row in item_defaults:
-			row_wh = row.get("default_warehouse")
-			if row_wh and frappe.db.exists("Warehouse", row_wh):
-				w_company = frappe.get_value("Warehouse", row_wh, "company")
-				# accept if either no company set on Warehouse or it equals target_company
-				if not w_company or (target_company and w_company == target_company):
-					return row_wh
-
-	# 2) Company-based warehouse "Stores - {abbr}"
-	if target_company:
-		abbr = frappe.get_value("Company", target_company, "abbr") or frappe.get_value("Company", target_company, "abbreviation")
-		if abbr:
-			warehouse_name = f"Stores - {abbr}"
-			if frappe.db.exists("Warehouse", warehouse_name):
-				w_company = frappe.get_value("Warehouse", warehouse_name, "company")
-				# accept if Warehouse has no company set OR matches target_company
-				if not w_company or w_company == target_company:
-					return warehouse_name
-				else:
-					# If the warehouse exists but belongs to a different company, do not use it.
-					frappe.logger("warehouse_resolution").info(
-						"Warehouse %s exists but belongs to company %s (expected %s); skipping",
-						warehouse_name, w_company, target_company
-					)
-
-	# 3) Global default warehouse (site / system)
-	global_wh = frappe.defaults.get_global_default("warehouse") or frappe.db.get_default("warehouse")
-	if global_wh and frappe.db.exists("Warehouse", global_wh):
-		w_company = frappe.get_value("Warehouse", global_wh, "company")
-		if not w_company or (target_company and w_company == target_company):
-			return global_wh
-
-	# 4) First warehouse that belongs to the company (best-effort)
-	if target_company:
-		whs = frappe.get_all("Warehouse", filters={"company": target_company}, fields=["name"], limit_page_length=1)
-		if whs:
-			return whs[0].name
-
-	# 5) Unable to resolve; raise clear actionable error
-	msg = _("Could not determine a warehouse for Item {0}. Please ensure one of the following:").format(item_name)
-	msg += "<ul>"
-	msg += "<li>" + _("Create an Item Default row (Item → Item Default) with a default warehouse for the correct company.") + "</li>"
-	msg += "<li>" + _("Create a Warehouse named {0} where {1} is the Company abbreviation (Company.abbr).").format(f"<strong>Stores - {{abbr}}</strong>", "abbr") + "</li>"
-	msg += "<li>" + _("Set a global Default Warehouse in Setup → Settings (Site Defaults).") + "</li>"
-	msg += "</ul>"
-	frappe.throw(msg, frappe.ValidationError)
\ No newline at end of file
+	return get_default_warehouse(item_name, _determine_target_company(item_doc))
\ No newline at end of file
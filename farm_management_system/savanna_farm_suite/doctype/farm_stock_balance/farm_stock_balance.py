@@ -0,0 +1,11 @@
+# Copyright (c) 2025, Techsavanna Technology and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class FarmStockBalance(Document):
+	# Rows are keyed by config.stock_balance.get_stock_balance_name(item_code, warehouse)
+	# and maintained by the stock posting engine; they are never edited by hand.
+	pass
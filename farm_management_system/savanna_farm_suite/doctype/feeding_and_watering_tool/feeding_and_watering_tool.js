@@ -216,7 +216,8 @@ function process_record_action(frm) {
 		poultry_batch: frm.doc.poultry_batch || null,
 		poultry_house: frm.doc.poultry_house || null,
 		specify_cattle_shed : frm.doc.specify_cattle_shed || null,
-		incl_hydration: (frm.doc.incl_hydration ? true : false)
+		incl_hydration: (frm.doc.incl_hydration ? true : false),
+		batch_mode: 1
 	};
 
 	// Show confirmation dialog before proceeding
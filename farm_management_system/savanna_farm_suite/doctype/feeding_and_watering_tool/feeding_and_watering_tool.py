@@ -12,76 +12,40 @@ import frappe
 import json
 from frappe import _
 from frappe.utils import flt
+from farm_management_system.config.feed_catalogue import get_feed_catalogue, get_feed_stock
+from farm_management_system.config.item_resolver import resolve_item
+from farm_management_system.config.stock_balance import get_item_stock_many
+from farm_management_system.config.stock_posting import post_stock_ledger_entries
+from farm_management_system.savanna_farm_suite.doctype.nourishment_log.nourishment_log import (
+    throw_insufficient_stock,
+    update_feed_logs,
+)
 
 @frappe.whitelist()
 def get_animal_feeds_by_animal(specify_animal):
     """
     Returns list of Animal Feeds matching the specify_animal via the child table
     'Animal and Feed Formulation' (field: select_type_of_animal LIKE %specify_animal%).
-    Returns items like: [{ "name": "AF-001", "uom": "Kg", "feed_name": "ITEM_CODE", "stock_balance": 100.0 }, ...]
+    Returns items like: [{ "name": "AF-001", "uom": "Kg", "feed_name": "ITEM_CODE", "stock": 100.0 }, ...]
     If uom is a Table MultiSelect field, we return only the first UOM value.
-    Stock balance is fetched from the latest Stock Ledger Entry (by creation) for the Item matching feed_name.
+    The feeds, their first UOM, Item and default warehouse come from the cached feed catalogue;
+    stock balances are read from Farm Stock Balance in one query.
     """
     if not specify_animal:
         return []
 
-    child_doctype = "Animal and Feed Formulation"
-    child_rows = frappe.get_all(
-        child_doctype,
-        filters=[["select_type_of_animal", "like", f"%{specify_animal}%"]],
-        fields=["parent"]
-    )
+    catalogue = get_feed_catalogue(specify_animal)
+    stock = get_feed_stock(catalogue)
 
-    parent_names = list({r.parent for r in child_rows if r.parent})
-    if not parent_names:
-        return []
-
-    result = []
-    for parent_name in parent_names:
-        try:
-            animal_feed_doc = frappe.get_doc("Animal Feeds", parent_name)
-            feed_name = (animal_feed_doc.feed_name or "").strip()
-            uom_value = ""
-
-            # Extract UOM from Table MultiSelect field
-            if animal_feed_doc.uom and len(animal_feed_doc.uom) > 0:
-                first_uom_row = animal_feed_doc.uom[0]
-                if hasattr(first_uom_row, 'uom') and first_uom_row.uom:
-                    uom_value = first_uom_row.uom
-
-            # Fetch Item matching feed_name
-            stock_balance = 0.0
-            if feed_name:
-                items = frappe.get_all("Item", filters={"item_code": feed_name}, fields=["name"])
-                if items:
-                    item_name = items[0].get("name")
-                    # Fetch default warehouse from Item Defaults
-                    item_doc = frappe.get_doc("Item", item_name)
-                    item_defaults = item_doc.get("item_defaults") or []
-                    warehouse = item_defaults[0].get("default_warehouse") if item_defaults else None
-
-                    if warehouse:
-                        sle_rows = frappe.get_all(
-                            "Stock Ledger Entry",
-                            filters={"item_code": item_name, "warehouse": warehouse},
-                            fields=["qty_after_transaction"],
-                            order_by="creation desc",
-                            limit_page_length=1
-                        )
-                        if sle_rows:
-                            stock_balance = flt(sle_rows[0].get("qty_after_transaction") or 0.0)
-
-            result.append({
-                "name": parent_name,
-                "uom": uom_value,
-                "feed_name": feed_name,
-                "stock": stock_balance
-            })
-        except Exception as e:
-            frappe.log_error(f"Error processing Animal Feed {parent_name}: {str(e)}", "get_animal_feeds_by_animal")
-            continue
-
-    return result
+    return [
+        {
+            "name": feed["name"],
+            "uom": feed.get("uom") or "",
+            "feed_name": (feed.get("feed_name") or "").strip(),
+            "stock": flt(stock.get(feed["name"]))
+        }
+        for feed in catalogue
+    ]
 
 @frappe.whitelist()
 def create_nourishment_logs(
@@ -92,10 +56,13 @@ def create_nourishment_logs(
     poultry_house=None,
     specify_cattle_shed=None,
     incl_hydration=False,
-    water_amount=None
+    water_amount=None,
+    batch_mode=False
 ):
     """
     Create & submit one Nourishment Log per row provided in table_rows (JSON string).
+    With batch_mode, all rows are validated, inserted and posted together in the request's
+    single transaction (see _create_nourishment_logs_batched); any failure rolls back every row.
     Args:
         nourishment_date (str)
         user (str)
@@ -104,6 +71,7 @@ def create_nourishment_logs(
         poultry_house (optional)
         specify_cattle_shed (optional)
         incl_hydration (bool / "true"/"false")
+        batch_mode (bool / "true"/"false")
     Returns:
         list of created docnames
     """
@@ -138,7 +106,9 @@ def create_nourishment_logs(
         except Exception:
             denom = None
 
+    batch_mode = str(batch_mode).lower() in ("1", "true", "yes")
     created = []
+    docs = []
     # iterate rows and create Nourishment Log docs
     for row in rows:
         animal_feed = row.get("animal_feed")
@@ -180,6 +150,10 @@ def create_nourishment_logs(
             "hydration_was_confirmed": True if str(incl_hydration).lower() in ("1", "true", "yes") else False,
             "water_consumed": water_amount or 0.0
         })
+        if batch_mode:
+            docs.append(new_doc)
+            continue
+
         new_doc.insert(ignore_permissions=True)
         try:
             new_doc.submit()
@@ -188,9 +162,115 @@ def create_nourishment_logs(
 
         created.append(new_doc.name)
 
+    if batch_mode:
+        created = _create_nourishment_logs_batched(docs)
+
     return created
 
 
+def _resolve_feed_stock_targets(docs):
+    """
+    Resolve every distinct feed of `docs` to its Item and the Item's first default warehouse.
+    Returns {animal_feed: {"feed_name", "item_name", "warehouse"}} using one Animal Feeds
+    query, the cached Item resolution and one Item Default query.
+    """
+    feeds = list({d.feed_issued for d in docs if d.feed_issued})
+    if not feeds:
+        frappe.throw(_("Cannot validate stock: field 'feed_issued' is empty."), frappe.ValidationError)
+
+    feed_names = {
+        r.name: (r.feed_name or "").strip()
+        for r in frappe.get_all("Animal Feeds", filters={"name": ["in", feeds]}, fields=["name", "feed_name"])
+    }
+
+    targets = {}
+    for feed in feeds:
+        feed_name = feed_names.get(feed) or ""
+        item = resolve_item(feed_name)
+        if not item:
+            frappe.throw(
+                _("No Item found with item_code '{0}'. Cannot validate stock availability.").format(feed),
+                frappe.ValidationError
+            )
+        targets[feed] = {"feed_name": feed_name, "item_name": item.name, "warehouse": None}
+
+    item_names = list({t["item_name"] for t in targets.values()})
+    warehouses = {}
+    for row in frappe.get_all(
+        "Item Default",
+        filters={"parent": ["in", item_names], "parenttype": "Item"},
+        fields=["parent", "default_warehouse"],
+        order_by="idx asc"
+    ):
+        warehouses.setdefault(row.parent, row.default_warehouse)
+
+    for target in targets.values():
+        target["warehouse"] = warehouses.get(target["item_name"])
+        if not target["warehouse"]:
+            frappe.throw(_("Item {0} is missing Item Default → Default Warehouse.").format(target["item_name"]))
+    return targets
+
+
+def _create_nourishment_logs_batched(docs):
+    """
+    Insert and submit the given (unsaved) Nourishment Log docs as one batch:
+      - stock is validated for all rows against Farm Stock Balance in one query, summing
+        rows that draw on the same feed;
+      - each log is inserted directly as submitted (one write per log) with the per-row
+        stock check, Poultry Batches update and Stock Ledger Entry hooks switched off;
+      - all feed issues are posted with one post_stock_ledger_entries call;
+      - every touched Poultry Batches document is updated and its totals recomputed once.
+    Returns the list of created docnames.
+    """
+    if not docs:
+        return []
+
+    targets = _resolve_feed_stock_targets(docs)
+    stock = get_item_stock_many([t["item_name"] for t in targets.values()])
+
+    needed = {}
+    for d in docs:
+        item_name = targets[d.feed_issued]["item_name"]
+        needed[item_name] = needed.get(item_name, 0.0) + flt(d.qty_issued)
+
+    for feed, target in targets.items():
+        item_name = target["item_name"]
+        if item_name not in stock:
+            frappe.throw(
+                _("No Stock Ledger Entry found for Item '{0}'. Cannot validate stock availability.").format(item_name),
+                frappe.ValidationError
+            )
+        available_qty = flt(stock[item_name].get("qty_after_transaction") or 0.0)
+        if available_qty < needed[item_name]:
+            uom = next((d.default_uom for d in docs if d.feed_issued == feed and d.default_uom), None)
+            throw_insufficient_stock(target["feed_name"], needed[item_name], available_qty, uom)
+
+    # Logs stay single-row inserts: a session has one log per feed row, and insert() still
+    # fetches animal_feed_name, validates the links, names the log from its dated series and
+    # runs on_submit (Cattle Shed feeding log and per-cow fan-out). The per-row costs (stock
+    # reads, SLEs, batch totals) are the batched ones.
+    for d in docs:
+        d.docstatus = 1
+        d.flags.batch_posting = True
+        d.insert(ignore_permissions=True)
+
+    post_stock_ledger_entries([
+        {
+            "item_code": targets[d.feed_issued]["item_name"],
+            "warehouse": targets[d.feed_issued]["warehouse"],
+            "actual_qty": -flt(d.qty_issued),
+            "voucher_type": "Nourishment Log",
+            "voucher_no": d.name,
+            "voucher_detail_no": d.get("poultry_batch") or d.get("log_for_poultry_shed") or None,
+            "require_previous": True
+        }
+        for d in docs
+    ])
+
+    update_feed_logs(docs)
+    return [d.name for d in docs]
+
+
 import frappe
 import re
 from frappe.utils import flt, getdate
@@ -1,14 +1,21 @@
 # Copyright (c) 2025, Techsavanna Technology and contributors
 # For license information, please see license.txt
 from __future__ import unicode_literals
+import hashlib
 import frappe
 from frappe import _
 from frappe.model.document import Document
 import json
-from frappe.utils import flt, nowdate, nowtime, get_datetime, now_datetime
+from frappe.utils import cint, flt, get_fullname, getdate, nowdate, nowtime, get_datetime, now_datetime
+from farm_management_system.config.feed_totals import apply_nourishment_logs, get_batch_feed_totals
+from farm_management_system.config.stock_balance import get_item_stock
+from farm_management_system.config.stock_posting import post_stock_ledger_entry
 
 class NourishmentLog(Document):
     def before_insert(self):
+        # Batched inserts (Feeding and Watering Tool) validate stock for all rows up front
+        if self.flags.get("batch_posting"):
+            return
         self.validate_stock_before_insert()
         
     def validate_stock_before_insert(self):
@@ -31,59 +38,63 @@ class NourishmentLog(Document):
         # Use first matching Item
         item_name = items[0].get("name")
 
-        # Fetch the latest Stock Ledger Entry for this item (ordered by creation desc)
-        sle_rows = frappe.get_all(
-            "Stock Ledger Entry",
-            filters={"item_code": item_name},
-            fields=["name", "qty_after_transaction", "creation"],
-            order_by="creation desc",
-            limit_page_length=1
-        )
+        # Current balance of this item from Farm Stock Balance
+        stock = get_item_stock(item_name)
 
-        if not sle_rows:
+        if not stock:
             frappe.throw(
                 _("No Stock Ledger Entry found for Item '{0}'. Cannot validate stock availability.").format(item_name),
                 frappe.ValidationError
             )
 
-        latest_sle = sle_rows[0]
-        available_qty = flt(latest_sle.get("qty_after_transaction") or 0.0)
+        available_qty = flt(stock.get("qty_after_transaction") or 0.0)
 
         # Compare available vs needed
         if available_qty < qty_needed:
-            # Build helpful error message with values and unit if available
-            unit_text = f" {uom}" if uom else ""
-            msg = _(
-                "Insufficient stock for <strong>{feed_name}</strong> to create Nourishment Log.\n\n"
-                "Requested: {requested}{unit}\n"
-                "Available (latest Stock Ledger Entry): {available}\n\n"
-                "Action: replenish stock or reduce requested quantity."
-            ).format(requested=qty_needed, unit=unit_text, available=available_qty, feed_name=feed_name )
-
-            frappe.throw(msg, frappe.ValidationError)
+            throw_insufficient_stock(feed_name, qty_needed, available_qty, uom)
         return
     
     def after_insert(self):
         """
         Called after a Nourishment Log is inserted.
-        Appends a row into the related Poultry Batches.nourishment_table (if poultry_batch present).
+        Adds the log to its batch's running feed totals and appends a row into the related
+        Poultry Batches.nourishment_table (if poultry_batch present).
+        Batched inserts update the touched batches once at the end (see update_feed_logs).
         """
+        if self.flags.get("batch_posting"):
+            return
         try:
+            apply_nourishment_logs([self])
             update_feed_log(self.name)
         except Exception as e:
             # log full traceback for debugging then throw a user friendly message
             frappe.log_error(frappe.get_traceback(), "Nourishment Log: update_feed_log failed")
             frappe.throw(_("Failed to update Poultry Batch's feed log: {0}").format(str(e)))
+
+    def on_cancel(self):
+        self.reverse_feed_totals()
+
+    def on_trash(self):
+        # Cancelled logs were already taken out of the totals on cancel
+        if self.docstatus == 0:
+            self.reverse_feed_totals()
+
+    def reverse_feed_totals(self):
+        """Take this log back out of its batch's running feed totals."""
+        if apply_nourishment_logs([self], sign=-1):
+            compute_batch_totals_and_update(self.poultry_batch, save=True)
         
     def on_submit(self):
         """
         After a Nourishment Log is submitted, create the corresponding Stock Ledger Entry.
         We call the helper above to perform the insertion/submission.
+        Batched inserts post all their entries with one bulk call instead.
         """
-        try:
-            create_stock_ledger_entry_for_nourishment(self.name)
-        except Exception as e:
-            frappe.throw(_("Failed to create Stock Ledger Entry for Nourishment Log {0}: {1}").format(self.name, str(e)))
+        if not self.flags.get("batch_posting"):
+            try:
+                create_stock_ledger_entry_for_nourishment(self.name)
+            except Exception as e:
+                frappe.throw(_("Failed to create Stock Ledger Entry for Nourishment Log {0}: {1}").format(self.name, str(e)))
         
         if self.log_intended_for_cattle_shed:
             try:
@@ -97,29 +108,20 @@ class NourishmentLog(Document):
                 })
                 cattle_shed.save(ignore_permissions=True)
                 
-                # Update individual Cattle documents in this shed
-                cattle_list = frappe.get_all("Cattle", 
-                                            filters={"cow_shed": self.log_intended_for_cattle_shed},
-                                            fields=["name"])
-                
-                updated_count = 0
-                for cattle in cattle_list:
-                    cattle_doc = frappe.get_doc("Cattle", cattle.name)
-                    cattle_doc.append("feeding_log", {
-                        "date_fed": self.date_of_nourishment,
-                        "fed_on": self.feed_issued,
-                        "total_qty_issued": self.avg_consumption,  
-                        "fed_by_user": self.user
-                    })
-                    cattle_doc.save(ignore_permissions=True)
-                    updated_count += 1
-                
-                # Show success notification
+                # Per-cow feeding_log rows are written in bulk by a background job once this
+                # submit has committed (see fan_out_cattle_feeding_logs)
+                frappe.enqueue(
+                    "farm_management_system.savanna_farm_suite.doctype.nourishment_log.nourishment_log.fan_out_cattle_feeding_logs",
+                    nourishment_log=self.name,
+                    queue="long",
+                    enqueue_after_commit=True,
+                )
+
                 frappe.msgprint(
-                    _("Successfully updated feeding logs for {0} cattle in {1} cattle shed").format(
-                        updated_count, self.log_intended_for_cattle_shed
+                    _("Feeding logs for the cattle in {0} cattle shed are being updated in the background").format(
+                        self.log_intended_for_cattle_shed
                     ),
-                    title=_("Feeding Logs Updated"),
+                    title=_("Feeding Logs Queued"),
                     indicator="green"
                 )
                 
@@ -137,6 +139,110 @@ class NourishmentLog(Document):
                 )
 
 
+# Cattle handled per multi-row insert in fan_out_cattle_feeding_logs
+CATTLE_FAN_OUT_CHUNK_SIZE = 500
+
+
+def _cattle_feeding_log_name(nourishment_log, cattle):
+    # One row per (log, cow): a retried or duplicated job cannot add a second one
+    return hashlib.md5(f"{nourishment_log}::{cattle}".encode()).hexdigest()
+
+
+def fan_out_cattle_feeding_logs(nourishment_log):
+    """
+    Background job: add one Cattle.feeding_log row for every cow in the log's cattle shed.
+
+    Rows are inserted directly into `tabAnimal Batch Feed Log` with one multi-row insert per
+    CATTLE_FAN_OUT_CHUNK_SIZE cows (appended after each cow's existing rows) instead of
+    loading and saving every Cattle document. Rows are named after (log, cow) and inserted
+    ignoring duplicates, so running the job again for the same log adds nothing. Progress
+    is published to the submitting user.
+    """
+    nl = frappe.db.get_value(
+        "Nourishment Log",
+        nourishment_log,
+        ["log_intended_for_cattle_shed", "date_of_nourishment", "feed_issued", "animal_feed_name",
+         "avg_consumption", "user", "docstatus"],
+        as_dict=True
+    )
+    if not nl or nl.docstatus != 1 or not nl.log_intended_for_cattle_shed:
+        return 0
+
+    cattle_shed = nl.log_intended_for_cattle_shed
+    cattle_names = frappe.get_all("Cattle", filters={"cow_shed": cattle_shed}, pluck="name")
+    if not cattle_names:
+        return 0
+
+    users_full_name = frappe.db.get_value("User", nl.user, "full_name") if nl.user else None
+    date_fed = getdate(nl.date_of_nourishment) if nl.date_of_nourishment else None
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+        "parent", "parenttype", "parentfield",
+        "date_fed", "fed_on", "animal_feed_name", "total_qty_issued", "fed_by_user", "users_full_name"
+    ]
+    user = frappe.session.user
+    title = _("Updating cattle feeding logs")
+
+    for start in range(0, len(cattle_names), CATTLE_FAN_OUT_CHUNK_SIZE):
+        chunk = cattle_names[start:start + CATTLE_FAN_OUT_CHUNK_SIZE]
+        now = now_datetime()
+        last_idx = dict(frappe.db.sql(
+            """
+            select parent, max(idx)
+            from `tabAnimal Batch Feed Log`
+            where parenttype = 'Cattle' and parentfield = 'feeding_log' and parent in %(parents)s
+            group by parent
+            """,
+            {"parents": chunk}
+        ))
+
+        values = [
+            [
+                _cattle_feeding_log_name(nourishment_log, cattle), now, now, user, user, 0,
+                cint(last_idx.get(cattle)) + 1,
+                cattle, "Cattle", "feeding_log",
+                date_fed, nl.feed_issued, nl.animal_feed_name, flt(nl.avg_consumption), nl.user, users_full_name
+            ]
+            for cattle in chunk
+        ]
+        frappe.db.bulk_insert("Animal Batch Feed Log", fields, values, ignore_duplicates=True)
+        frappe.db.set_value("Cattle", {"name": ["in", chunk]}, "modified", now, update_modified=False)
+
+        done = start + len(chunk)
+        frappe.publish_progress(
+            done * 100 / len(cattle_names),
+            title=title,
+            description=_("{0} of {1} cattle in {2}").format(done, len(cattle_names), cattle_shed)
+        )
+
+    frappe.db.commit()
+    frappe.publish_realtime(
+        event="show_alert",
+        message={
+            "message": _("Successfully updated feeding logs for {0} cattle in {1} cattle shed").format(
+                len(cattle_names), cattle_shed
+            ),
+            "indicator": "green",
+        },
+        user=user,
+    )
+    return len(cattle_names)
+
+
+def throw_insufficient_stock(feed_name, qty_needed, available_qty, uom=None):
+    """Raise the user-facing 'Insufficient stock' error for a feed."""
+    # Build helpful error message with values and unit if available
+    unit_text = f" {uom}" if uom else ""
+    msg = _(
+        "Insufficient stock for <strong>{feed_name}</strong> to create Nourishment Log.\n\n"
+        "Requested: {requested}{unit}\n"
+        "Available: {available}\n\n"
+        "Action: replenish stock or reduce requested quantity."
+    ).format(requested=qty_needed, unit=unit_text, available=available_qty, feed_name=feed_name)
+
+    frappe.throw(msg, frappe.ValidationError)
+
+
 @frappe.whitelist()
 def create_stock_ledger_entry_for_nourishment(nourishment_log_name):
     if not nourishment_log_name:
@@ -168,70 +274,17 @@ def create_stock_ledger_entry_for_nourishment(nourishment_log_name):
     if not warehouse:
         frappe.throw(_("Item {0} is missing Item Default → Default Warehouse.").format(item_name))
 
-    # Get latest SLE for this item **and this warehouse**
-    sle_rows = frappe.get_all(
-        "Stock Ledger Entry",
-        filters={"item_code": item_name, "warehouse": warehouse},
-        fields=[
-            "name", "qty_after_transaction", "incoming_rate", "outgoing_rate",
-            "valuation_rate", "fiscal_year", "company", "posting_datetime", "creation"
-        ],
-        order_by="posting_datetime desc, creation desc", 
-        limit_page_length=1
+    # Issue the fed quantity (mandatory minus) on the running balance for this item
+    # **and this warehouse**; a prior entry is required to carry the valuation over.
+    return post_stock_ledger_entry(
+        item_name,
+        warehouse,
+        -flt(nl.get("qty_issued") or 0.0),
+        voucher_type="Nourishment Log",
+        voucher_no=nl.name,
+        voucher_detail_no=nl.get("poultry_batch") or nl.get("log_for_poultry_shed") or None,
+        require_previous=True
     )
-    if not sle_rows:
-        frappe.throw(_("No Stock Ledger Entry found for Item {0} at Warehouse {1}.").format(item_name, warehouse))
-
-    latest = sle_rows[0]
-    latest_qty_after = flt(latest.get("qty_after_transaction") or 0.0)
-    incoming_rate = flt(latest.get("incoming_rate") or 0.0)
-    outgoing_rate = flt(latest.get("outgoing_rate") or 0.0)
-    valuation_rate = flt(latest.get("valuation_rate") or 0.0)
-    fiscal_year = latest.get("fiscal_year")
-    company = latest.get("company")
-
-    # Build new SLE numbers
-    qty_issued = flt(nl.get("qty_issued") or 0.0)
-    actual_qty = -qty_issued                          # mandatory minus
-    new_qty_after = flt(latest_qty_after + actual_qty)  # same as latest - qty_issued
-
-    stock_value = flt(valuation_rate * new_qty_after)           # Balance Stock Value
-    stock_value_difference = flt(valuation_rate * actual_qty)   # NEGATIVE by design
-
-    # One-line JSON for Long Text field
-    stock_queue_str = json.dumps([[new_qty_after, valuation_rate]])
-
-    voucher_detail_no = nl.get("poultry_batch") or nl.get("log_for_poultry_shed") or None
-
-    sle_doc = frappe.get_doc({
-        "doctype": "Stock Ledger Entry",
-        "item_code": item_name,
-        "warehouse": warehouse,
-        "posting_date": nowdate(),
-        "posting_time": nowtime(),
-        "voucher_type": "Nourishment Log",
-        "voucher_no": nl.name,
-        "voucher_detail_no": voucher_detail_no,
-        "actual_qty": actual_qty,
-        "qty_after_transaction": new_qty_after,
-        "incoming_rate": incoming_rate,
-        "outgoing_rate": outgoing_rate,
-        "valuation_rate": valuation_rate,
-        "fiscal_year": fiscal_year,
-        "company": company,
-        "stock_value": stock_value,
-        "stock_value_difference": stock_value_difference,
-        "stock_queue": stock_queue_str
-    })
-
-    sle_doc.insert(ignore_permissions=True)
-    try:
-        sle_doc.submit()
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "create_sle_for_nourishment: submit failed")
-        return {"inserted": sle_doc.name, "submitted": False}
-
-    return {"sle_name": sle_doc.name, "submitted": True}
 
 
 @frappe.whitelist()
@@ -247,25 +300,64 @@ def update_feed_log(nourishment_name):
     batch_name = nourishment.get("poultry_batch")
     if not batch_name:
         return {"status": "skipped", "reason": "no poultry_batch on nourishment log"}
+    return append_feed_logs_to_batch(batch_name, [nourishment])
+
+
+def update_feed_logs(nourishment_logs):
+    """
+    Batch variant of update_feed_log for logs inserted together: adds them to the running
+    feed totals, then appends every touched batch's rows and totals in one go.
+    """
+    apply_nourishment_logs(nourishment_logs)
+
+    by_batch = {}
+    for nourishment in nourishment_logs:
+        if nourishment.get("poultry_batch"):
+            by_batch.setdefault(nourishment.get("poultry_batch"), []).append(nourishment)
+
+    for batch_name, logs in by_batch.items():
+        append_feed_logs_to_batch(batch_name, logs)
+
+
+def append_feed_logs_to_batch(batch_name, nourishment_logs):
+    """
+    Append one Poultry Batches.nourishment_table row per log and store the batch's
+    recomputed total_feed / total_water.
+
+    The child rows are inserted directly after the batch's existing rows and the totals are
+    written with one targeted UPDATE, so the (ever growing) batch document is never loaded,
+    re-validated or re-saved as a whole. Returns the compute result dict.
+    """
+    last_idx = frappe.db.sql(
+        """
+        select max(idx) from `tabAnimal Batch Feed Log`
+        where parent = %s and parenttype = 'Poultry Batches' and parentfield = 'nourishment_table'
+        """,
+        (batch_name,)
+    )[0][0]
+
     try:
-        batch = frappe.get_doc("Poultry Batches", batch_name)
-        qty = nourishment.get("qty_issued")
-        uom = (nourishment.get("default_uom") or "").strip()
-        total_qty_str = f"{qty} {uom}".strip() if qty not in (None, "") else ""
-
-        batch.append("nourishment_table", {
-            "date_fed": nourishment.get("date_of_nourishment"),
-            "fed_on": nourishment.get("animal_feed_name"),
-            "total_qty_issued": total_qty_str,
-            "fed_by_user": nourishment.get("owner") or frappe.session.user
-        })
-
-        batch.flags.ignore_validate_update_after_submit = True
-        batch.save(ignore_permissions=True)
+        for idx, nourishment in enumerate(nourishment_logs, start=cint(last_idx) + 1):
+            qty = nourishment.get("qty_issued")
+            uom = (nourishment.get("default_uom") or "").strip()
+            fed_by_user = nourishment.get("owner") or frappe.session.user
+            frappe.get_doc({
+                "doctype": "Animal Batch Feed Log",
+                "parent": batch_name,
+                "parenttype": "Poultry Batches",
+                "parentfield": "nourishment_table",
+                "idx": idx,
+                "date_fed": nourishment.get("date_of_nourishment"),
+                "fed_on": nourishment.get("animal_feed_name"),
+                "total_qty_issued": f"{qty} {uom}".strip() if qty not in (None, "") else "",
+                "fed_by_user": fed_by_user,
+                "users_full_name": get_fullname(fed_by_user)
+            }).db_insert()
     except Exception:
         frappe.log_error(frappe.get_traceback(), "update_feed_log: append failed or skipped")
-    result = compute_batch_totals_and_update(batch_name, save=True)
-    return result
+
+    return compute_batch_totals_and_update(batch_name, save=True)
+
 
 def compute_batch_totals(batch_name):
     """
@@ -274,88 +366,29 @@ def compute_batch_totals(batch_name):
             feed_name - <sum qty> <uom>
       - total_water: cumulative water consumed (to date) across ALL feeds:
             <sum water_consumed> Litres
+    Read from the batch's running totals (Poultry Batch Feed Summary), which every
+    Nourishment Log insert / cancel updates, so the cost does not grow with the flock's age.
+    If the totals ever drift, repair them with config.feed_totals.rebuild_batch_feed_totals.
     """
     if not batch_name:
         return {"total_feed": "", "total_water": "", "latest_date": None, "status": "error", "reason": "no batch_name"}
 
-    logs = frappe.get_all(
-        "Nourishment Log",
-        filters={"poultry_batch": batch_name},
-        fields=["date_of_nourishment", "animal_feed_name", "qty_issued", "default_uom", "water_consumed"],
-        order_by="date_of_nourishment asc",
-        limit_page_length=10000
-    )
-
-    if not logs:
-        return {"total_feed": "", "total_water": "", "latest_date": None, "status": "ok", "rows": 0}
-
-    dates = [l.get("date_of_nourishment") for l in logs if l.get("date_of_nourishment")]
-    latest_date = max(dates) if dates else None
-
-    # --- Compute feed quantities for latest date ---
-    feed_qty_on_latest = {}
-    latest_logs = [l for l in logs if l.get("date_of_nourishment") == latest_date] if latest_date else []
-
-    for r in latest_logs:
-        feed = (r.get("animal_feed_name") or "Unknown").strip()
-        uom = (r.get("default_uom") or "").strip()
-        qty_val = float(r.get("qty_issued") or 0)
-        if feed not in feed_qty_on_latest:
-            feed_qty_on_latest[feed] = {"qty_sum": 0.0, "uom": uom}
-        feed_qty_on_latest[feed]["qty_sum"] += qty_val
-        if not feed_qty_on_latest[feed]["uom"] and uom:
-            feed_qty_on_latest[feed]["uom"] = uom
-
-    # --- Compute cumulative water consumed (ALL TIME) ---
-    total_water_sum = 0.0
-    for r in logs:
-        try:
-            total_water_sum += float(r.get("water_consumed") or 0)
-        except Exception:
-            pass
-
-    # Format water total
-    if float(total_water_sum).is_integer():
-        total_water = f"{int(total_water_sum)} Litres"
-    else:
-        total_water = f"{round(total_water_sum, 3)} Litres"
-
-    # Build total_feed string
-    total_feed_lines = []
-    for feed_name, vals in feed_qty_on_latest.items():
-        qty_sum = vals.get("qty_sum", 0.0)
-        uom = vals.get("uom") or ""
-        qty_str = str(int(qty_sum)) if qty_sum.is_integer() else str(round(qty_sum, 3)).rstrip('0').rstrip('.')
-        total_feed_lines.append(f"{feed_name} - {qty_str} {uom}".strip())
-
-    total_feed = "\n".join(total_feed_lines) if total_feed_lines else ""
-
-    return {
-        "total_feed": total_feed,
-        "total_water": total_water,
-        "latest_date": latest_date,
-        "status": "ok",
-        "rows_total": len(logs),
-        "rows_on_latest_date": len(latest_logs) if latest_date else 0,
-        "distinct_feeds_on_latest": list(feed_qty_on_latest.keys()),
-        "distinct_feeds_all_time": list({r.get('animal_feed_name') for r in logs})
-    }
+    return get_batch_feed_totals(batch_name)
 
 
 def compute_batch_totals_and_update(batch_name, save=False):
     """
     Compute totals and optionally persist to Poultry Batches.total_feed and total_water.
-    If save=True, saves the batch doc (ignoring permission and submit validation flags).
+    If save=True, writes just those two fields (one UPDATE, no full document save).
     Returns the compute result dict.
     """
     result = compute_batch_totals(batch_name)
     if save and result.get("status") == "ok":
         try:
-            batch = frappe.get_doc("Poultry Batches", batch_name)
-            batch.total_feed = result.get("total_feed") or ""
-            batch.total_water = result.get("total_water") or ""
-            batch.flags.ignore_validate_update_after_submit = True
-            batch.save(ignore_permissions=True)
+            frappe.db.set_value("Poultry Batches", batch_name, {
+                "total_feed": result.get("total_feed") or "",
+                "total_water": result.get("total_water") or ""
+            })
         except Exception:
             frappe.log_error(frappe.get_traceback(), "compute_batch_totals_and_update: save failed")
             result["save_error"] = True
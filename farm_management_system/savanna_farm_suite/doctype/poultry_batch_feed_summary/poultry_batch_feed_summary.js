@@ -0,0 +1,8 @@
+// Copyright (c) 2025, Techsavanna Technology and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Poultry Batch Feed Summary", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,17 @@
+# Copyright (c) 2025, Techsavanna Technology and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class PoultryBatchFeedSummary(Document):
+	# One row per (poultry_batch, day, feed, uom), keyed by
+	# config.feed_totals.get_feed_summary_name and kept up to date by Nourishment Log
+	# inserts and cancellations; they are never edited by hand.
+	pass
+
+
+def on_doctype_update():
+	# get_batch_feed_totals reads the latest day of a batch
+	frappe.db.add_index("Poultry Batch Feed Summary", ["poultry_batch", "date_of_nourishment"])
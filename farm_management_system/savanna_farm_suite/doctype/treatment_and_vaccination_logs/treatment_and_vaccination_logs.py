@@ -8,6 +8,7 @@ from frappe.model.document import Document
 from datetime import datetime, timedelta
 from frappe.utils import today, getdate, add_days, add_months, nowdate, nowtime
 from frappe.utils.data import flt
+from farm_management_system.config.stock_posting import get_last_stock_state, post_stock_ledger_entry
 
 
 class TreatmentandVaccinationLogs(Document):
@@ -228,68 +229,25 @@ class TreatmentandVaccinationLogs(Document):
 				frappe.log_error(f"Item {item_name} is missing Item Default → Default Warehouse for vaccine")
 				return
 			
-			# Get latest SLE for this item and warehouse
-			sle_rows = frappe.get_all(
-				"Stock Ledger Entry",
-				filters={"item_code": item_name, "warehouse": warehouse},
-				fields=[
-					"name", "qty_after_transaction", "incoming_rate", "outgoing_rate",
-					"valuation_rate", "fiscal_year", "company", "posting_datetime", "creation"
-				],
-				order_by="posting_datetime desc, creation desc",
-				limit_page_length=1
-			)
-			
-			if not sle_rows:
+			# The running balance for this item and warehouse must already exist
+			if not get_last_stock_state(item_name, warehouse):
 				frappe.log_error(f"No Stock Ledger Entry found for Item {item_name} at Warehouse {warehouse} for vaccine")
 				return
 			
-			latest = sle_rows[0]
-			latest_qty_after = flt(latest.get("qty_after_transaction") or 0.0)
-			incoming_rate = flt(latest.get("incoming_rate") or 0.0)
-			outgoing_rate = flt(latest.get("outgoing_rate") or 0.0)
-			valuation_rate = flt(latest.get("valuation_rate") or 0.0)
-			fiscal_year = latest.get("fiscal_year")
-			company = latest.get("company")
-			
-			# Build new SLE values
-			qty_vaccine = flt(self.get("qty_vaccine") or 0.0)
-			actual_qty = -qty_vaccine  # Negative for consumption
-			new_qty_after = flt(latest_qty_after + actual_qty)
-			
-			stock_value = flt(valuation_rate * new_qty_after)
-			stock_value_difference = flt(valuation_rate * actual_qty)			
-			stock_queue_str = json.dumps([[new_qty_after, valuation_rate]])			
-			voucher_detail_no = self.get("poultry_batch_under_treatment")			
-			sle_doc = frappe.get_doc({
-				"doctype": "Stock Ledger Entry",
-				"item_code": item_name,
-				"warehouse": warehouse,
-				"posting_date": nowdate(),
-				"posting_time": nowtime(),
-				"voucher_type": "Treatment and Vaccination Logs",
-				"voucher_no": self.name,
-				"voucher_detail_no": voucher_detail_no,
-				"actual_qty": actual_qty,
-				"qty_after_transaction": new_qty_after,
-				"incoming_rate": incoming_rate,
-				"outgoing_rate": outgoing_rate,
-				"valuation_rate": valuation_rate,
-				"fiscal_year": fiscal_year,
-				"company": company,
-				"stock_value": stock_value,
-				"stock_value_difference": stock_value_difference,
-				"stock_queue": stock_queue_str
-			})
-			
-			sle_doc.insert(ignore_permissions=True)
+			# Issue the vaccine (negative for consumption) on that running balance
+			result = post_stock_ledger_entry(
+				item_name,
+				warehouse,
+				-flt(self.get("qty_vaccine") or 0.0),
+				voucher_type="Treatment and Vaccination Logs",
+				voucher_no=self.name,
+				voucher_detail_no=self.get("poultry_batch_under_treatment"),
+				require_previous=True
+			)
 			
-			# Try to submit the SLE
-			try:
-				sle_doc.submit()
+			if result.get("submitted"):
 				frappe.msgprint(f"Stock Ledger Entry created for vaccine: {self.vaccine_used}")
-			except Exception as e:
-				frappe.log_error(f"Error submitting SLE for vaccine: {str(e)}")
+			else:
 				frappe.msgprint(f"SLE created but submission failed for vaccine: {self.vaccine_used}", alert=True, indicator="orange")
 				
 		except Exception as e:
@@ -4,9 +4,11 @@
 # import frappe
 from __future__ import annotations
 import frappe
-from frappe.utils import getdate, today
+from frappe.utils import flt, getdate, today
 from datetime import date, timedelta
 
+from farm_management_system.config.stock_balance import get_item_stock_many
+
 def get_date_range_for_timeline(timeline: str):
     td_today = getdate(today())
     if timeline == "This Week":
@@ -31,23 +33,42 @@ def get_date_range_for_timeline(timeline: str):
         end = td_today
     return start, end
 
-def safe_get_current_stock(product_name):
+def get_production_rows(start_date, end_date, cow=None, product=None):
     """
-    Best-effort wrapper around your app's get_current_stock.
-    Returns dict with keys: qty_after_transaction, stock_value, valuation_rate (or None on failure).
+    Cattle production_log quantities summed per (cow, date, product, uom) in one query,
+    with the cow's nickname joined in.
     """
-    try:
-        fn = frappe.get_attr("farm_management_system.savanna_farm_suite.doctype.crop_seedlings.crop_seedlings.get_current_stock")
-        res = fn(product_name)
-        if isinstance(res, dict):
-            return {
-                "qty_after_transaction": res.get("qty_after_transaction"),
-                "stock_value": res.get("stock_value"),
-                "valuation_rate": res.get("valuation_rate")
-            }
-    except Exception:
-        pass
-    return {"qty_after_transaction": None, "stock_value": None, "valuation_rate": None}
+    conditions = [
+        "pc.parenttype = 'Cattle'",
+        "pc.parentfield = 'production_log'",
+        "pc.date_of_collection between %(start_date)s and %(end_date)s",
+    ]
+    values = {"start_date": start_date, "end_date": end_date}
+    if cow:
+        conditions.append("pc.parent = %(cow)s")
+        values["cow"] = cow
+    if product:
+        conditions.append("pc.product_collected = %(product)s")
+        values["product"] = product
+
+    return frappe.db.sql(
+        f"""
+        select
+            pc.parent as cow,
+            coalesce(max(c.add_nickname_optional), '') as nickname,
+            pc.date_of_collection,
+            coalesce(pc.product_collected, '') as product_collected,
+            coalesce(pc.products_default_uom, '') as uom,
+            sum(coalesce(pc.quantity_collected, 0)) as qty
+        from `tabPoultry Collections Table` pc
+        inner join `tabCattle` c on c.name = pc.parent
+        where {" and ".join(conditions)}
+        group by pc.parent, pc.date_of_collection, coalesce(pc.product_collected, ''), coalesce(pc.products_default_uom, '')
+        order by pc.parent asc, pc.date_of_collection asc
+        """,
+        values,
+        as_dict=True
+    )
 
 def execute(filters=None):
     if filters is None:
@@ -67,112 +88,23 @@ def execute(filters=None):
     timeline = (filters.get("timeline") or "").strip() or "This Month"
     start_date, end_date = get_date_range_for_timeline(timeline)
 
-    cow_filter = filters.get("cow")
-    product_filter = filters.get("product")
-
-    # aggregation: key = (cow_name, iso_date, product_collected, uom) -> total_qty
-    agg = {}
-
-    # Preload list of cattle (narrow by cow_filter if provided)
-    if cow_filter:
-        cattle_list = frappe.get_all("Cattle", filters={"name": cow_filter}, fields=["name"])
-    else:
-        cattle_list = frappe.get_all("Cattle", fields=["name"])
-
-    # We'll cache nicknames per cattle to avoid repeated fetches later
-    nickname_map = {}
-
-    for c in cattle_list:
-        try:
-            cattle_doc = frappe.get_doc("Cattle", c.name)
-        except Exception:
-            continue
-
-        # cache nickname
-        nickname_map[c.name] = (cattle_doc.get("add_nickname_optional") or "") if hasattr(cattle_doc, "get") else (getattr(cattle_doc, "add_nickname_optional", "") or "")
-
-        rows = getattr(cattle_doc, "production_log", []) or []
-        for row in rows:
-            # support both dict-like and object child rows
-            if isinstance(row, dict):
-                row_date = row.get("date_of_collection")
-                prod = row.get("product_collected")
-                qty = row.get("quantity_collected", 0)
-                uom = (row.get("products_default_uom") or "")
-            else:
-                row_date = getattr(row, "date_of_collection", None)
-                prod = getattr(row, "product_collected", None)
-                qty = getattr(row, "quantity_collected", 0)
-                uom = (getattr(row, "products_default_uom", "") or "")
-
-            if not row_date:
-                continue
-
-            try:
-                d = getdate(row_date)
-            except Exception:
-                continue
+    rows = get_production_rows(start_date, end_date, filters.get("cow"), filters.get("product"))
 
-            # date range filter (inclusive)
-            if d < start_date or d > end_date:
-                continue
+    # Current stock of every product in the report, in one query
+    stock = get_item_stock_many([row.product_collected for row in rows])
 
-            # product filter
-            if product_filter and prod != product_filter:
-                continue
-
-            try:
-                qty_f = float(qty or 0)
-            except Exception:
-                # skip rows with non-numeric qty
-                continue
-
-            key = (c.name, d.isoformat(), prod or "", uom or "")
-            agg[key] = agg.get(key, 0.0) + qty_f
-
-    # Build final result rows
     data = []
-    sorted_keys = sorted(agg.keys(), key=lambda k: (k[0] or "", k[1] or ""))
-
-    for key in sorted_keys:
-        cow_name, iso_date, product_collected, uom = key
-        total_qty = agg[key]
-
-        # fetch stock value & valuation_rate (best effort)
-        stock_info = safe_get_current_stock(product_collected)
-        stock_value = stock_info.get("stock_value")
-        valuation_rate = stock_info.get("valuation_rate")
-
-        # Prepare numeric values (float) for report columns
-        try:
-            qty_value = float(total_qty)
-        except Exception:
-            qty_value = 0.0
-
-        # Stock and valuation: ensure floats or None (Frappe will render blank for None)
-        try:
-            sv_value = float(stock_value) if stock_value is not None else None
-        except Exception:
-            sv_value = None
-
-        try:
-            vr_value = float(valuation_rate) if valuation_rate is not None else None
-        except Exception:
-            vr_value = None
-
-        # Cow nickname from cache (may be empty string)
-        nickname = nickname_map.get(cow_name, "")
-
-        # Append row in the same order as columns
+    for row in rows:
+        stock_info = stock.get(row.product_collected) or {}
         data.append([
-            cow_name,          # Cow (Link)
-            nickname,          # Cow Nickname (Data)
-            iso_date,          # Date of Collection (Date string iso)
-            product_collected, # Product Collected (Link)
-            qty_value,         # Quantity Collected (Float numeric)
-            uom or "",         # UOM (Data)
-            sv_value,          # Stock Value (Currency numeric or None)
-            vr_value           # Valuation Rate (Currency numeric or None)
+            row.cow,                                      # Cow (Link)
+            row.nickname,                                 # Cow Nickname (Data)
+            getdate(row.date_of_collection).isoformat(),  # Date of Collection (Date string iso)
+            row.product_collected,                        # Product Collected (Link)
+            flt(row.qty),                                 # Quantity Collected (Float numeric)
+            row.uom,                                      # UOM (Data)
+            stock_info.get("stock_value"),                # Stock Value (Currency numeric or None)
+            stock_info.get("valuation_rate")              # Valuation Rate (Currency numeric or None)
         ])
 
     return columns, data
@@ -0,0 +1,41 @@
+// Copyright (c) 2026, Techsavanna Technology and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Lactation Analytics"] = {
+	"filters": [
+		{
+			"fieldname": "as_of",
+			"label": __("As Of"),
+			"fieldtype": "Date",
+			"default": frappe.datetime.get_today(),
+			"reqd": 1
+		},
+		{
+			"fieldname": "product",
+			"label": __("Milk Product"),
+			"fieldtype": "Link",
+			"options": "Animal Products",
+			"reqd": 0,
+			"get_query": function() {
+				return {
+					filters: {
+						"product_tied_to_which_animal": "Cow"
+					}
+				};
+			}
+		},
+		{
+			"fieldname": "cow",
+			"label": __("Cow"),
+			"fieldtype": "Link",
+			"options": "Cattle",
+			"reqd": 0
+		},
+		{
+			"fieldname": "in_milk_only",
+			"label": __("Only Cows In Milk"),
+			"fieldtype": "Check",
+			"default": 1
+		}
+	]
+};
@@ -0,0 +1,65 @@
+# Copyright (c) 2026, Techsavanna Technology and contributors
+# For license information, please see license.txt
+
+import frappe
+
+from farm_management_system.config.lactation import get_herd_lactation_metrics
+
+def execute(filters=None):
+    filters = filters or {}
+
+    columns = [
+        "Cow:Link/Cattle:160",
+        "Cow Nickname:Data:140",
+        "Lactation Start:Date:110",
+        "Days in Milk:Int:100",
+        "7-Day Avg Daily Yield:Float:140",
+        "30-Day Avg Daily Yield:Float:140",
+        "Peak Yield:Float:100",
+        "Peak DIM:Int:90",
+        "Lactation Yield:Float:120",
+        "Wood a:Float:90",
+        "Wood b:Float:90",
+        "Wood c:Float:90",
+        "Fitted Peak DIM:Float:110",
+        "Fitted Peak Yield:Float:120",
+        "Projected 305-Day Yield:Float:150"
+    ]
+
+    products = [filters.get("product")] if filters.get("product") else None
+    metrics = get_herd_lactation_metrics(filters.get("as_of"), products)
+
+    if filters.get("cow"):
+        metrics = [m for m in metrics if m["cattle"] == filters.get("cow")]
+    if filters.get("in_milk_only"):
+        metrics = [m for m in metrics if m["days_in_milk"]]
+
+    nicknames = dict(frappe.get_all(
+        "Cattle",
+        filters={"name": ["in", [m["cattle"] for m in metrics]]},
+        fields=["name", "add_nickname_optional"],
+        as_list=True
+    )) if metrics else {}
+
+    data = [
+        [
+            m["cattle"],
+            nicknames.get(m["cattle"]) or "",
+            m["lactation_start"],
+            m["days_in_milk"],
+            m["rolling_7_day_avg"],
+            m["rolling_30_day_avg"],
+            m["peak_yield"],
+            m["peak_dim"],
+            m["lactation_yield"],
+            m["wood_a"],
+            m["wood_b"],
+            m["wood_c"],
+            m["fitted_peak_dim"],
+            m["fitted_peak_yield"],
+            m["projected_305_day_yield"]
+        ]
+        for m in metrics
+    ]
+
+    return columns, data